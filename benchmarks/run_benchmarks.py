@@ -0,0 +1,259 @@
+"""
+Benchmarks for the hot paths of the harmonizer.
+
+Times melody analysis, voicing, end-to-end harmonization and MIDI writing
+separately on synthetic melodies, and reports throughput and peak memory
+per stage. A report can be saved as a baseline and later runs compared
+against it, failing (exit status 1) when a stage got slower or uses more
+memory than the tolerance allows. Every report also times a fixed
+calibration workload, and baseline times are scaled by the ratio of the
+two calibrations, so a baseline recorded on another machine still applies.
+Timings drift between processes, so the suite can be run several times and
+the median of every measurement reported.
+
+Run from the repository root:
+
+    python -m benchmarks.run_benchmarks --sizes 500 5000 --output report.json
+    python -m benchmarks.run_benchmarks --baseline benchmarks/baseline.json
+
+benchmarks/baseline.json was recorded with:
+
+    python -m benchmarks.run_benchmarks --sizes 500 5000 --densities medium dense \
+        --styles pop jazz --runs 5 --output benchmarks/baseline.json
+"""
+import argparse
+import gc
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from melody_harmonizer.core.harmonizer import MelodyHarmonizer
+from melody_harmonizer.core.voice_leading import lattice_cache, transition_cache
+from melody_harmonizer.core.voicing import voicing_cache
+from melody_harmonizer.styles.progressions import get_style_progression
+from melody_harmonizer.utils.midi_utils import write_midi
+from melody_harmonizer.utils.synthetic import synthetic_melody
+
+# Medians of separate runs on one machine still differ by up to about 30%
+DEFAULT_TOLERANCE = 0.4
+
+# Growth below these amounts is never a regression: at a few milliseconds or
+# a few hundred KiB, run-to-run noise exceeds any relative tolerance
+MIN_EXCESS = {'seconds': 0.005, 'peak_kib': 1024.0}
+
+# Stages timed for every case
+STAGES = ('analyze_stream', 'analyze_midi', 'voicing', 'harmonize', 'harmonize_to_midi', 'write_midi')
+
+
+def calibrate(repeat: int = 5) -> float:
+    """Seconds (fastest of repeat runs) of a fixed pure-Python and numpy workload, to compare machines by."""
+    values = np.random.default_rng(0).integers(0, 128, 200_000)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        table: Dict[int, int] = {}
+        for value in values[:50_000].tolist():
+            table[value] = table.get(value, 0) + value % 12
+        np.sort(values)
+        np.bincount(values % 12)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def clear_caches() -> None:
+    """Empty the process-wide voicing caches, so every run starts cold."""
+    voicing_cache.clear()
+    transition_cache.clear()
+    lattice_cache.clear()
+
+
+def measure(run: Callable[[], object], repeat: int, count: int, unit: str) -> dict:
+    """
+    Time a stage and record its peak memory.
+
+    Args:
+        run: The stage; called repeat times for timing, then once more
+            under tracemalloc for memory
+        repeat: Number of timed runs (the fastest one is reported)
+        count: Items processed per run, for the throughput
+        unit: Name of the items ('notes', 'chords')
+    """
+    times = []
+    for _ in range(repeat):
+        clear_caches()
+        gc.collect()
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    clear_caches()
+    gc.collect()  # so the peak doesn't depend on when leftover cycles get collected
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    seconds = min(times)
+    return {
+        'seconds': seconds,
+        'throughput': count / seconds if seconds > 0 else float('inf'),
+        'unit': f'{unit}/s',
+        'peak_kib': peak / 1024,
+    }
+
+
+def benchmark_case(n_notes: int, density: str, style: str, complexity: str, repeat: int, workdir: str) -> Dict[str, dict]:
+    """Benchmark every stage on one synthetic melody."""
+    melody = synthetic_melody(n_notes, density, seed=n_notes)
+    melody_path = os.path.join(workdir, f'melody_{n_notes}_{density}.mid')
+    write_midi(melody_path, melody.note_array, [], melody.time_signature)
+    melody_stream = melody.to_stream()
+
+    harmonizer = MelodyHarmonizer()
+    analysis = harmonizer.analyzer.analyze_melody(melody)
+    progression = get_style_progression(style, analysis.key)
+    harmony = list(harmonizer._generate_harmony(analysis, progression, complexity))
+    n_chords = sum(1 for element in harmony if element.isChord)
+    voicings = harmonizer.voicing_generator.apply_voicing_midi(harmony, style)
+    events = [(float(el.offset), float(el.quarterLength), voicing)
+              for el, voicing in zip(harmony, voicings) if voicing is not None]
+
+    output_path = os.path.join(workdir, 'harmonized.mid')
+    return {
+        'analyze_stream': measure(lambda: harmonizer.analyzer.analyze_melody(melody_stream), repeat, n_notes, 'notes'),
+        'analyze_midi': measure(lambda: harmonizer.analyzer.analyze_melody(melody), repeat, n_notes, 'notes'),
+        'voicing': measure(lambda: harmonizer.voicing_generator.apply_voicing(harmony, style), repeat, n_chords, 'chords'),
+        'harmonize': measure(lambda: harmonizer.harmonize(melody_path, style, complexity, loader='mido'),
+                             repeat, n_notes, 'notes'),
+        'harmonize_to_midi': measure(lambda: harmonizer.harmonize_to_midi(melody_path, output_path, style,
+                                                                          complexity, loader='mido'),
+                                     repeat, n_notes, 'notes'),
+        'write_midi': measure(lambda: write_midi(io.BytesIO(), melody.note_array, events, melody.time_signature),
+                              repeat, n_notes + n_chords, 'events'),
+    }
+
+
+def run_benchmarks(sizes: List[int], densities: List[str], styles: List[str], complexity: str = 'medium',
+                   repeat: int = 5) -> dict:
+    """
+    Benchmark every combination of melody size, density and style.
+
+    Returns:
+        Report: {'cases': {'<size>-<density>-<style>-<complexity>': {stage: result}}}
+    """
+    cases = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in sizes:
+            for density in densities:
+                for style in styles:
+                    name = f'{size}-{density}-{style}-{complexity}'
+                    cases[name] = benchmark_case(size, density, style, complexity, repeat, workdir)
+    return {'python': sys.version.split()[0], 'calibration_seconds': calibrate(), 'cases': cases}
+
+
+def median_report(reports: List[dict]) -> dict:
+    """Combine reports of the same cases into one holding the median of every measurement."""
+    first = reports[0]
+    cases = {}
+    for case, stages in first['cases'].items():
+        cases[case] = {}
+        for stage, result in stages.items():
+            seconds = statistics.median(report['cases'][case][stage]['seconds'] for report in reports)
+            count = result['throughput'] * result['seconds']
+            cases[case][stage] = {
+                'seconds': seconds,
+                'throughput': count / seconds if seconds > 0 else float('inf'),
+                'unit': result['unit'],
+                'peak_kib': statistics.median(report['cases'][case][stage]['peak_kib'] for report in reports),
+            }
+    return {
+        'python': first['python'],
+        'calibration_seconds': statistics.median(report['calibration_seconds'] for report in reports),
+        'cases': cases,
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE) -> List[str]:
+    """
+    Find stages that regressed against a baseline report.
+
+    A stage regresses when its time or peak memory exceeds the baseline's by
+    more than the tolerance (a fraction) and by more than MIN_EXCESS. When
+    both reports carry a calibration time, the baseline's times are first
+    scaled to this machine by the ratio of the calibrations. Cases or stages
+    missing from the baseline are skipped.
+
+    Returns:
+        One message per regression (empty when there are none)
+    """
+    speed = 1.0
+    if report.get('calibration_seconds') and baseline.get('calibration_seconds'):
+        speed = report['calibration_seconds'] / baseline['calibration_seconds']
+
+    regressions = []
+    for case, stages in report['cases'].items():
+        for stage, result in stages.items():
+            reference = baseline.get('cases', {}).get(case, {}).get(stage)
+            if reference is None:
+                continue
+            for metric, scale in (('seconds', speed), ('peak_kib', 1.0)):
+                allowed = reference[metric] * scale
+                if result[metric] > max(allowed * (1 + tolerance), allowed + MIN_EXCESS[metric]):
+                    regressions.append(f'{case} {stage}: {metric} {result[metric]:.4g} > '
+                                       f'{allowed:.4g} (+{tolerance:.0%} allowed)')
+    return regressions
+
+
+def format_report(report: dict) -> str:
+    lines = []
+    for case, stages in report['cases'].items():
+        lines.append(case)
+        for stage, result in stages.items():
+            lines.append(f"  {stage:<18} {result['seconds'] * 1000:10.2f} ms {result['throughput']:14,.0f} "
+                         f"{result['unit']:<9} {result['peak_kib']:10,.0f} KiB peak")
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[500, 5000], help='melody lengths in notes')
+    parser.add_argument('--densities', nargs='+', default=['medium'], help='sparse, medium and/or dense')
+    parser.add_argument('--styles', nargs='+', default=['pop'], help='harmonization styles')
+    parser.add_argument('--complexity', default='medium', help='harmonization complexity')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per stage (fastest is reported)')
+    parser.add_argument('--runs', type=int, default=3,
+                        help='times to run the whole suite; the median of every measurement is reported')
+    parser.add_argument('--output', help='write the report as JSON to this path')
+    parser.add_argument('--baseline', help='compare against this saved report')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='allowed slowdown/memory growth as a fraction (default %(default)s)')
+    args = parser.parse_args(argv)
+
+    report = median_report([run_benchmarks(args.sizes, args.densities, args.styles, args.complexity, args.repeat)
+                            for _ in range(args.runs)])
+    print(format_report(report))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print('REGRESSION', regression)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,194 @@
+"""
+Harmonize every melody file under a directory.
+
+Outputs are written to a tree mirroring the input directory. Every
+finished file is recorded in a manifest in the output directory, so an
+interrupted run started again with the same arguments skips the files
+that are already done (unless they changed since).
+
+    melody-harmonizer melodies/ harmonized/ --style jazz --workers 8
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from .core.analysis_cache import AnalysisCache
+from .core.harmonizer import HarmonizationResult, MelodyHarmonizer
+from .styles.style_pack import style_names
+from .utils.corpus import find_files
+
+MANIFEST_NAME = 'manifest.jsonl'
+
+
+class Manifest:
+    """
+    Append-only record (one JSON object per line) of the files a run finished.
+
+    Every line is flushed as soon as it is written, so an interruption loses
+    at most the files that were in progress. A file counts as done when its
+    latest record succeeded with the same settings, the input still has the
+    recorded size and modification time, and the output still exists.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.records: Dict[str, dict] = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # a line cut short by an interruption
+                    self.records[record['input']] = record
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def is_done(self, name: str, input_path: str, settings: dict) -> bool:
+        record = self.records.get(name)
+        if record is None or not record['ok'] or record['settings'] != settings:
+            return False
+        info = os.stat(input_path)
+        return (record['size'] == info.st_size and record['mtime_ns'] == info.st_mtime_ns
+                and os.path.exists(record['output']))
+
+    def add(self, name: str, input_path: str, settings: dict, result: HarmonizationResult) -> dict:
+        info = os.stat(input_path)
+        record = {
+            'input': name,
+            'size': info.st_size,
+            'mtime_ns': info.st_mtime_ns,
+            'settings': settings,
+            'output': result.output_path,
+            'ok': result.ok,
+        }
+        if not result.ok:
+            record['error'] = result.error.strip().splitlines()[-1]
+        self.records[name] = record
+        self._file.write(json.dumps(record) + '\n')
+        self._file.flush()
+        return record
+
+    def close(self) -> None:
+        self._file.close()
+
+
+@dataclass
+class RunSummary:
+    """Counts and timings of one run."""
+    harmonized: int = 0
+    failed: int = 0
+    skipped: int = 0  # already done in an earlier run
+    seconds: float = 0.0
+    stages: Dict[str, float] = field(default_factory=dict)  # seconds per pipeline stage, summed over workers
+
+    def format(self) -> str:
+        """Throughput and per-stage timing as text."""
+        processed = self.harmonized + self.failed
+        lines = [f'{self.harmonized} harmonized, {self.failed} failed, {self.skipped} already done; '
+                 f'{self.seconds:.2f}s, {processed / self.seconds if self.seconds else 0.0:.1f} files/s']
+        total = sum(self.stages.values())
+        for name, seconds in sorted(self.stages.items(), key=lambda item: -item[1]):
+            share = 100 * seconds / total if total else 0.0
+            per_file = 1000 * seconds / processed if processed else 0.0
+            lines.append(f'  {name:<18} {seconds:9.2f}s {share:5.1f}% {per_file:9.2f} ms/file')
+        return '\n'.join(lines)
+
+
+def run(input_dir: str,
+        output_dir: str,
+        style: str = 'pop',
+        complexity: str = 'medium',
+        workers: Optional[int] = None,
+        loader: str = 'mido',
+        patterns: Tuple[str, ...] = ('*.mid', '*.midi'),
+        manifest_path: Optional[str] = None,
+        cache_dir: Optional[str] = None,
+        chunksize: int = 1) -> RunSummary:
+    """
+    Harmonize the melody files under input_dir that are not done yet.
+
+    Args:
+        input_dir: Directory searched recursively for melody files
+        output_dir: Directory the outputs (mirroring input_dir) and the manifest go to
+        style: Harmonization style
+        complexity: Harmonization complexity
+        workers: Number of worker processes (defaults to the CPU count)
+        loader: 'mido' or 'music21' (see MelodyHarmonizer.harmonize)
+        patterns: File name patterns of the files to harmonize
+        manifest_path: Manifest to resume from and record to
+        cache_dir: Optional analysis cache directory
+        chunksize: Number of files handed to a worker at a time
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = Manifest(manifest_path or os.path.join(output_dir, MANIFEST_NAME))
+    settings = {'style': style, 'complexity': complexity, 'loader': loader}
+
+    names = {}
+    pending: List[str] = []
+    for path in find_files(input_dir, patterns):
+        name = os.path.relpath(path, input_dir).replace(os.sep, '/')
+        names[path] = name
+        if not manifest.is_done(name, path, settings):
+            pending.append(path)
+    summary = RunSummary(skipped=len(names) - len(pending))
+
+    harmonizer = MelodyHarmonizer(analysis_cache=AnalysisCache(cache_dir) if cache_dir else None)
+    harmonizer.enable_profiling()
+    start = time.perf_counter()
+    try:
+        for result in harmonizer.harmonize_many(pending, style, complexity, output_dir, workers,
+                                                chunksize, loader, input_root=input_dir):
+            name = names[result.melody_path]
+            record = manifest.add(name, result.melody_path, settings, result)
+            if result.ok:
+                summary.harmonized += 1
+            else:
+                summary.failed += 1
+                print(f'FAILED {name}: {record["error"]}', file=sys.stderr)
+            for stage, seconds in (result.stages or {}).items():
+                summary.stages[stage] = summary.stages.get(stage, 0.0) + seconds
+    finally:
+        manifest.close()
+    summary.seconds = time.perf_counter() - start
+    return summary
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog='melody-harmonizer', description=__doc__.strip().splitlines()[0])
+    parser.add_argument('input_dir', help='directory searched recursively for melody files')
+    parser.add_argument('output_dir', help='directory the harmonized MIDI files are written to')
+    parser.add_argument('--style', default='pop', choices=style_names(),
+                        help='harmonization style (default %(default)s)')
+    parser.add_argument('--complexity', default='medium', choices=['simple', 'medium', 'complex'])
+    parser.add_argument('--workers', type=int, help='worker processes (default: one per CPU)')
+    parser.add_argument('--loader', default='mido', choices=['mido', 'music21'],
+                        help="'mido' for single-line MIDI files, 'music21' for anything music21 reads")
+    parser.add_argument('--pattern', dest='patterns', action='append',
+                        help='file name pattern to harmonize (repeatable; default *.mid and *.midi)')
+    parser.add_argument('--manifest', help=f'manifest path (default <output_dir>/{MANIFEST_NAME})')
+    parser.add_argument('--cache-dir', help='analysis cache directory shared across runs')
+    parser.add_argument('--chunksize', type=int, default=1, help='files handed to a worker at a time')
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.input_dir):
+        parser.error(f'not a directory: {args.input_dir}')
+    patterns = tuple(pattern.lower() for pattern in args.patterns) if args.patterns else ('*.mid', '*.midi')
+
+    start = time.perf_counter()
+    try:
+        summary = run(
+            args.input_dir, args.output_dir, args.style, args.complexity, args.workers, args.loader,
+            patterns, args.manifest, args.cache_dir, args.chunksize)
+    except KeyboardInterrupt:
+        print(f'interrupted after {time.perf_counter() - start:.1f}s; run again to resume', file=sys.stderr)
+        return 130
+    print(summary.format())
+    return 1 if summary.failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,19 +1,162 @@
+from __future__ import annotations
+from dataclasses import dataclass
+import multiprocessing
 import numpy as np
-from music21 import stream, note, meter, key
-import tkinter as tk
-from dataclass import dataclass
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple, Union
+from ..utils.note_array import REST_PITCH, note_array_from_stream
+from ..utils.chord_tables import chord_table
+from ..utils.midi_utils import MidiArrangement, MidiMelody, note_array_to_notes, read_midi, write_midi, chord_events
+from .chord_selection import ChordSelector
+from .segmentation import HARMONIC_RHYTHMS, segment_melody, window_length
+from ..utils.music_theory import KeyTracker, key_name, measure_histograms, pitch_class_histogram, windowed_keys
+from ..utils.lazy import lazy_import
+
+stream = lazy_import('music21.stream')
+note = lazy_import('music21.note')
+meter = lazy_import('music21.meter')
+key = lazy_import('music21.key')
+converter = lazy_import('music21.converter')
+
+# Bump whenever analyze_melody's output changes, so cached analyses
+# (see analysis_cache) from older versions are no longer used
+ANALYZER_VERSION = 1
 
-@dataclass
 class MelodyAnalysis:
-    key: key.key
-    time_signature : meter.TimeSignature
-    phrases : List[List[note.Note]]
-    rhythm_patterns: List[List[float]]
-    contour: List[int]
-    peak_notes: List[note.Note]
-    
-class MelodyAnalayzer:
+    """
+    Result of analyze_melody, backed by the melody's note array.
+
+    Phrases and peaks are stored as indices into the note array and the
+    contour as an int8 array. The music21 views (notes, phrases,
+    peak_notes) are only built when they are first accessed, so an
+    analysis that never needs them never holds any music21 notes.
+    """
+    __slots__ = ('key', 'time_signature', 'note_array', 'phrase_bounds', 'contour', 'peak_indices', '_notes')
+
+    def __init__(self,
+                 key: key.Key,
+                 time_signature: meter.TimeSignature,
+                 note_array: np.ndarray,
+                 phrase_bounds: np.ndarray,
+                 contour: np.ndarray,
+                 peak_indices: np.ndarray,
+                 notes: Optional[List[note.GeneralNote]] = None):
+        """
+        Args:
+            key: Key of the melody
+            time_signature: Time signature of the melody
+            note_array: One NOTE_DTYPE record per note or rest
+            phrase_bounds: (n_phrases, 2) array of [start, end) note indices
+            contour: int8 direction of motion between consecutive pitched notes
+            peak_indices: Note indices of the melodic peaks
+            notes: music21 notes matching the note array, if the melody came
+                as a stream (otherwise they are built on first access)
+        """
+        self.key = key
+        self.time_signature = time_signature
+        self.note_array = note_array
+        self.phrase_bounds = phrase_bounds
+        self.contour = contour
+        self.peak_indices = peak_indices
+        self._notes = notes
+
+    @property
+    def notes(self) -> List[note.GeneralNote]:
+        """music21 notes and rests of the melody (built from the note array once, when needed)."""
+        if self._notes is None:
+            self._notes = note_array_to_notes(self.note_array)
+        return self._notes
+
+    @property
+    def phrases(self) -> List[List[note.GeneralNote]]:
+        """music21 notes of each phrase."""
+        notes = self.notes
+        return [notes[start:end] for start, end in self.phrase_bounds.tolist()]
+
+    @property
+    def rhythm_patterns(self) -> List[np.ndarray]:
+        """Note durations (float32 quarter lengths) of each phrase, as views of the note array."""
+        durations = self.note_array['duration']
+        return [durations[start:end] for start, end in self.phrase_bounds.tolist()]
+
+    @property
+    def peak_notes(self) -> List[note.GeneralNote]:
+        """music21 notes at the melodic peaks."""
+        notes = self.notes
+        return [notes[i] for i in self.peak_indices.tolist()]
+
+    def __repr__(self) -> str:
+        return (f"<MelodyAnalysis {self.key} {self.time_signature.ratioString}: "
+                f"{len(self.note_array)} notes, {len(self.phrase_bounds)} phrases>")
+
+
+@dataclass
+class ArrangementAnalysis:
+    """Result of analyze_arrangement."""
+    melody: MelodyAnalysis             # the melody line, in the key of the whole arrangement
+    melody_parts: List[int]            # parts the melody line was taken from
+    context: np.ndarray                # every note of the other parts (a note array, chords and all)
+    parts: Dict[int, MelodyAnalysis]   # highest line of each part, analyzed on its own
+
+
+class IncrementalMelodyAnalysis:
+    """
+    Key and phrase state of a melody that arrives one note at a time.
+
+    The key is re-estimated from a running duration-weighted pitch-class
+    histogram after every note, which costs one small matrix product, so
+    updates stay cheap enough for live input. With a window, only the last
+    ``window`` measures count, so the key follows modulations.
+    """
+
+    def __init__(self, phrase_gap: float = 1.0, provisional_duration: float = 1.0,
+                 bar_length: float = 4.0, window: Optional[int] = None):
+        self.phrase_gap = phrase_gap                      # silence (quarter lengths) that ends a phrase
+        self.provisional_duration = provisional_duration  # weight of a note until its end is known
+        self.bar_length = bar_length
+        self.window = window
+        self.tracker = KeyTracker()
+        self.measures = {}                                # measure index -> KeyTracker, when windowed
+        self.key: Tuple[int, str] = (0, 'major')          # (tonic pitch class, mode)
+        self.note_count = 0
+        self.phrase_count = 0
+        self.phrase_start = None
+        self.last_end = None
+
+    @property
+    def histogram(self) -> np.ndarray:
+        return self.tracker.histogram
+
+    def add_note(self, pitch: int, onset: float) -> bool:
+        """Record a note starting at onset (quarter lengths); returns True if it starts a new phrase."""
+        new_phrase = self.last_end is None or onset - self.last_end >= self.phrase_gap
+        if new_phrase:
+            self.phrase_count += 1
+            self.phrase_start = onset
+        self.note_count += 1
+        self.last_end = max(self.last_end or onset, onset + self.provisional_duration)
+        self._add(pitch, onset, self.provisional_duration)
+        return new_phrase
+
+    def finish_note(self, pitch: int, onset: float, duration: float) -> None:
+        """Replace the provisional weight of a note with its real duration once it ends."""
+        self._add(pitch, onset, duration - self.provisional_duration)
+        self.last_end = onset + duration
+
+    def _add(self, pitch: int, onset: float, duration: float) -> None:
+        self.tracker.add(pitch, duration)
+        if self.window is None:
+            self.key = self.tracker.key
+            return
+
+        measure = int(onset // self.bar_length)
+        self.measures.setdefault(measure, KeyTracker()).add(pitch, duration)
+        latest = max(self.measures)
+        for old in [m for m in self.measures if m <= latest - self.window]:
+            del self.measures[old]
+        self.key = KeyTracker(sum(t.histogram for t in self.measures.values())).key
+
+
+class MelodyAnalyzer:
     def __init__(self):
         # Define common chord progressions in different keys
         self.style_progressions= {
@@ -28,123 +171,295 @@ class MelodyAnalayzer:
                 ['i', 'iv', 'v', 'i']
             ]
         }
-        
+
+        self._chord_selectors = {}
+
         self.chord_structures = {
             'major': [0, 4, 7],      # Major triad
             'minor': [0, 3, 7],      # Minor triad
             'dominant': [0, 4, 7, 10] # Dominant seventh
         }
 
-    def analyze_melody(self, melody: stream.Stream) -> MelodyAnalysis:
-        
-        """Perform comprehensive analysis of the melody"""
-        
-        key_sig = self.get_key(melody)
-        time_sig = self.get_time_signature(melody)
-        
-        
-        notes = melody.flatten().notesAndRests
-        phrases = self.detect_phrases(notes)
-        rhythm_patterns = self.analyze_rhythm(notes)
-        countour = self.analyze_contour(notes)
-        peak_notes = self.detect_peak_notes(notes)
-        
-        return MelodyAnalysis(key_sig, time_sig, phrases, rhythm_patterns, countour, peak_notes)
-    
-    
+    def analyze_melody(self, melody: Union[stream.Stream, MidiMelody]) -> MelodyAnalysis:
+
+        """Perform comprehensive analysis of the melody (a music21 stream or a MidiMelody from read_midi)"""
+
+        if isinstance(melody, MidiMelody):
+            return self._analyze_midi_melody(melody)
+
+        time_sig = self._get_time_signature(melody)
+
+        # one pass over the music21 objects; everything after works on the array
+        notes = list(melody.flatten().notesAndRests)
+        note_array = note_array_from_stream(notes, time_sig.beatCount, time_sig.beatDuration.quarterLength)
+        key_sig = self._get_key_from_note_array(note_array)
+
+        return self._analyze_note_array(key_sig, time_sig, notes, note_array)
+
+    def analyze_arrangement(self,
+                            arrangement: MidiArrangement,
+                            melody: Union[str, int] = 'auto',
+                            analyze_parts: bool = True,
+                            workers: int = 1) -> ArrangementAnalysis:
+        """
+        Analyze a multi-part arrangement without merging its parts into one line.
+
+        Only the melody is analyzed as a melody; the other parts become its
+        harmonic context (they count towards the key, and can be added to
+        the harmonic windows with segmentation.add_context). Each part can
+        also be analyzed on its own, in parallel.
+
+        Args:
+            arrangement: Parts of a MIDI file (read_arrangement) or score (stream_arrangement)
+            melody: Which part holds the melody: 'auto' (MidiArrangement.melody_part),
+                'skyline' (the highest voice of all parts, like read_midi),
+                a part index or a track name
+            analyze_parts: Whether to analyze the highest line of every part
+            workers: Number of worker processes for the per-part analyses
+
+        Returns:
+            ArrangementAnalysis
+        """
+        if melody == 'skyline':
+            melody_parts = list(range(len(arrangement.parts)))
+        elif melody == 'auto':
+            melody_parts = [arrangement.melody_part()]
+        elif isinstance(melody, str):
+            melody_parts = [arrangement.find_part(melody)]
+        else:
+            melody_parts = [int(melody)]
+        others = [i for i in range(len(arrangement.parts)) if i not in melody_parts]
+
+        line = arrangement.skyline(melody_parts).note_array
+        context = arrangement.notes(others)
+        key_sig = self._get_key_from_note_array(np.concatenate((line, context)))
+        time_sig = meter.TimeSignature('%d/%d' % arrangement.time_signature)
+        analysis = ArrangementAnalysis(self._analyze_note_array(key_sig, time_sig, None, line),
+                                       melody_parts, context, {})
+
+        if analyze_parts:
+            lines = [arrangement.skyline([i]) for i in range(len(arrangement.parts))]
+            if workers <= 1 or len(lines) <= 1:
+                results = [self.analyze_melody(part_line) for part_line in lines]
+            else:
+                with multiprocessing.Pool(min(workers, len(lines))) as pool:
+                    results = pool.map(_analyze_part, lines)
+            analysis.parts = dict(enumerate(results))
+        return analysis
+
+    def _analyze_midi_melody(self, melody: MidiMelody) -> MelodyAnalysis:
+        """Analyze a melody read by read_midi without building a stream for it."""
+        time_sig = meter.TimeSignature('%d/%d' % melody.time_signature)
+        key_sig = self._get_key_from_note_array(melody.note_array)
+        return self._analyze_note_array(key_sig, time_sig, None, melody.note_array)
+
+    def _analyze_note_array(self, key_sig: key.Key, time_sig: meter.TimeSignature,
+                            notes: Optional[List[note.GeneralNote]], note_array: np.ndarray) -> MelodyAnalysis:
+        phrase_bounds = self.detect_phrases(note_array)
+        countour = self.analyze_contour(note_array)
+        peak_indices = self.detect_peak_notes(note_array)
+
+        return MelodyAnalysis(key_sig, time_sig, note_array, phrase_bounds, countour, peak_indices, notes)
+
+
+    def incremental(self, phrase_gap: float = 1.0, bar_length: float = 4.0,
+                    window: Optional[int] = None) -> IncrementalMelodyAnalysis:
+        """Start incremental (note by note) analysis of a live melody."""
+        return IncrementalMelodyAnalysis(phrase_gap, bar_length=bar_length, window=window)
+
     def _get_key(self, melody: stream.Stream) -> key.Key:
-        return melody.analyze('key')
-    
+        return self._get_key_from_note_array(note_array_from_stream(melody.flatten().notesAndRests))
+
+    def _get_key_from_note_array(self, note_array: np.ndarray) -> key.Key:
+        """
+        Same result as melody.analyze('key'), from a note array.
+
+        music21's key finding only uses the duration-weighted pitch-class
+        distribution, so the same Aarden-Essen correlation is computed
+        directly on the note array's histogram.
+        """
+        return _key_object(*KeyTracker(pitch_class_histogram(note_array)).key)
+
+    def measure_keys(self, analysis: MelodyAnalysis, window: int = 4) -> List[key.Key]:
+        """
+        Local key of every measure, estimated over a sliding window of measures.
+
+        Args:
+            analysis: Result of analyze_melody
+            window: Number of measures around each measure to take into account
+
+        Returns:
+            One music21 Key per measure
+        """
+        bar_length = analysis.time_signature.barDuration.quarterLength
+        tonics, minor = windowed_keys(measure_histograms(analysis.note_array, bar_length), window)
+        keys = {}  # at most 24 distinct Key objects to build
+        for tonic, is_minor in set(zip(tonics.tolist(), minor.tolist())):
+            keys[tonic, is_minor] = _key_object(tonic, 'minor' if is_minor else 'major')
+        return [keys[tonic, is_minor] for tonic, is_minor in zip(tonics.tolist(), minor.tolist())]
+
     def _get_time_signature(self, melody: stream.Stream) -> meter.TimeSignature:
-        time_sigs = melody.getTimeSignatures()
-        return time_sigs[0] if time_sigs else meter.TimeSignature
-        
+        time_sig = melody.recurse().getElementsByClass(meter.TimeSignature).first()
+        return time_sig if time_sig is not None else meter.TimeSignature()
+
+    def detect_phrases(self, note_array: np.ndarray) -> np.ndarray:
+        """
+        Split the melody into phrases at rests.
+
+        Returns:
+            (n_phrases, 2) array of [start, end) indices into the note array
+        """
+        pitched = np.concatenate(([False], ~note_array['is_rest'], [False])).astype(np.int8)
+        edges = np.diff(pitched)
+        return np.column_stack((np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)))
+
+    def analyze_rhythm(self, note_array: np.ndarray, phrase_bounds: np.ndarray) -> List[np.ndarray]:
+        """Note durations (in quarter lengths) of each phrase."""
+        durations = note_array['duration']
+        return [durations[start:end] for start, end in phrase_bounds]
+
+    def analyze_contour(self, note_array: np.ndarray) -> np.ndarray:
+        """Direction of motion between consecutive notes (-1 down, 0 same, 1 up)."""
+        pitches = note_array['pitch'][~note_array['is_rest']]
+        return np.sign(np.diff(pitches)).astype(np.int8)
+
+    def detect_peak_notes(self, note_array: np.ndarray) -> np.ndarray:
+        """Indices (into the note array) of notes higher than both of their neighbours."""
+        indices = np.flatnonzero(~note_array['is_rest'])
+        pitches = note_array['pitch'][indices]
+        peaks = (pitches[1:-1] > pitches[:-2]) & (pitches[1:-1] > pitches[2:])
+        return indices[1:-1][peaks]
+
     def generate_harmony(self, melody_stream, style='simple'):
-        """Generate harmony for the given melody"""
+        """Generate harmony for the given melody (style sets the harmonic rhythm, see HARMONIC_RHYTHMS)"""
         # Analyze melody
-        key, time_sig, melody_notes = self.analyze_melody(melody_stream)
-        
-        # Create a new stream for harmony
-        harmony = stream.Stream()
-        
-        # Determine appropriate chord progression
-        if key.mode == 'major':
-            progression = self.common_progressions['major'][0]  # Use first progression for now
-        else:
-            progression = self.common_progressions['minor'][0]
-        
-        # Generate chords based on melody notes and progression
-        current_measure = 0
-        chords = []
-        
-        for note in melody_notes:
-            if isinstance(note, note.Note):
-                # Find suitable chord from progression
-                chord = self._find_suitable_chord(note, key, progression[current_measure % len(progression)])
-                chords.append(chord)
+        analysis = self.analyze_melody(melody_stream)
+        key_sig, time_sig = analysis.key, analysis.time_signature
+
+        # Group the melody into harmonic windows
+        length = window_length(time_sig, HARMONIC_RHYTHMS.get(style, 'bar'))
+        windows = segment_melody(analysis.note_array, length)
+
+        # Choose the chords that best fit each window, moving the way the progressions do
+        mode = 'minor' if key_sig.mode == 'minor' else 'major'
+        numerals = self.chord_selector(self.style_progressions[mode]).select(windows, key_sig)
+        return self.harmonize_windows(windows, key_sig, numerals)
+
+    def chord_selector(self, progressions: List[List[str]]) -> ChordSelector:
+        """The ChordSelector for a set of progressions (built once per analyzer)."""
+        cache_key = tuple(tuple(progression) for progression in progressions)
+        selector = self._chord_selectors.get(cache_key)
+        if selector is None:
+            selector = self._chord_selectors[cache_key] = ChordSelector(progressions)
+        return selector
+
+    def progression_numerals(self, windows: np.ndarray, progression: List[str], bar_length: float) -> List[str]:
+        """The progression numeral of each window's measure (the progression repeats)."""
+        measures = (windows['start'] // bar_length).astype(np.int64) % len(progression)
+        return [progression[measure] for measure in measures.tolist()]
+
+    def harmonize_windows(self, windows: np.ndarray, key_sig: key.Key, numerals: List[str],
+                          fit_melody: bool = True) -> stream.Stream:
+        """
+        One chord per harmonic window.
+
+        Consecutive windows that get the same chord are merged into one
+        longer chord, and silent windows become rests.
+
+        Args:
+            windows: Harmonic windows from segment_melody
+            key_sig: Key of the melody
+            numerals: Roman numeral of each window (see chord_selector and
+                progression_numerals)
+            fit_melody: Adjust each chord to the window's melody note
+                (see _find_suitable_chord)
+
+        Returns:
+            Stream of chords and rests
+        """
+        # decide the chords as (numeral, seventh) pairs first, so merged windows build one chord
+        segments = []
+        for start, duration, pitch, chord_roman in zip(windows['start'].tolist(), windows['duration'].tolist(),
+                                                       windows['pitch'].tolist(), numerals):
+            if pitch == REST_PITCH:
+                choice = None
+            else:
+                choice = self._chord_choice(pitch if fit_melody else None, key_sig, chord_roman)
+            if segments and segments[-1][2] == choice:
+                segments[-1][1] += duration
             else:
-                # For rests, continue previous chord or add rest
-                chords.append(note.Rest())
-                
-            current_measure = len(chords) // time_sig.numerator
-        
-        # Add chords to harmony stream
-        for chord in chords:
-            harmony.append(chord)
-        
+                segments.append([start, duration, choice])
+
+        harmony = stream.Stream()
+        for start, duration, choice in segments:
+            harmony_chord = note.Rest() if choice is None else choice[0].to_chord(choice[1])
+            harmony_chord.quarterLength = duration
+            # offsets only increase, so the stream stays sorted without re-checking it
+            harmony.insert(start, harmony_chord, ignoreSort=True)
         return harmony
 
+    def _chord_choice(self, melody_midi, key, chord_roman):
+        """The table chord for a numeral and whether to add a seventh to it for the melody note."""
+        # Look the Roman numeral up in the precomputed chord table
+        chord_obj = chord_table.get(chord_roman, key)
+
+        # If melody note is in chord, use the chord as is
+        if melody_midi is None or chord_obj.contains(melody_midi % 12):
+            return chord_obj, False
+        # If melody note is within one step of any chord note, use seventh chord
+        # (added only to triads, as a dominant seventh above the bass)
+        return chord_obj, len(chord_obj.midi) == 3 and chord_obj.near(melody_midi)
+
     def _find_suitable_chord(self, melody_note, key, chord_roman):
         """Find a suitable chord that contains or complements the melody note"""
-        # Convert Roman numeral to chord
-        chord_obj = roman.RomanNumeral(chord_roman, key)
-        
-        # Get base chord notes
-        chord_notes = chord_obj.pitches
-        
-        # If melody note is in chord, return chord as is
-        if melody_note.pitch in chord_notes:
-            return chord_obj
-        
-        # Otherwise, create modified chord that works with melody note
-        modified_chord = self._modify_chord_for_melody(chord_obj, melody_note)
-        return modified_chord
-
-    def _modify_chord_for_melody(self, chord, melody_note):
-        """Modify chord to better fit with melody note"""
-        # Get chord notes
-        chord_notes = list(chord.pitches)
-        
-        # If melody note is within one step of any chord note, use seventh chord
-        for note in chord_notes:
-            if abs(interval.Interval(note, melody_note.pitch).semitones) <= 2:
-                # Add seventh if not already present
-                if len(chord_notes) == 3:  # triad
-                    seventh = chord_notes[0].transpose(10)  # add dominant seventh
-                    chord_notes.append(seventh)
-                    return chord.Chord(chord_notes)
-        
-        return chord
+        chord_obj, add_seventh = self._chord_choice(melody_note.pitch.midi, key, chord_roman)
+        return chord_obj.to_chord(add_seventh)
 
     def create_midi(self, melody, harmony, output_file='harmonized_melody.mid'):
         """Combine melody and harmony into MIDI file"""
-        combined = stream.Score()
-        combined.append(melody)
-        combined.append(harmony)
-        combined.write('midi', fp=output_file)
+        if isinstance(melody, MidiMelody):
+            note_array, time_signature, tempo = melody.note_array, melody.time_signature, melody.tempo
+        else:
+            time_sig = self._get_time_signature(melody)
+            note_array = note_array_from_stream(melody.flatten().notesAndRests)
+            time_signature, tempo = (time_sig.numerator, time_sig.denominator), 500000
+        write_midi(output_file, note_array, chord_events(harmony), time_signature, tempo)
+
+
+# Per-process analyzer used by the analyze_arrangement worker pool
+_part_analyzer: Optional[MelodyAnalyzer] = None
+
+
+def _analyze_part(melody: MidiMelody) -> MelodyAnalysis:
+    global _part_analyzer
+    if _part_analyzer is None:
+        _part_analyzer = MelodyAnalyzer()
+    return _part_analyzer.analyze_melody(melody)
+
+
+def _key_object(tonic: int, mode: str) -> key.Key:
+    """music21 Key for a tonic pitch class and mode."""
+    return key.Key(key_name(tonic, mode), mode)
+
+
+# Kept for backwards compatibility with the original (misspelled) class name
+MelodyAnalayzer = MelodyAnalyzer
 
 # Example usage
-def harmonize_melody(melody_file):
-    # Load melody from MIDI file
-    melody = converter.parse(melody_file)
-    
+def harmonize_melody(melody_file, loader='music21'):
+    # Load melody from MIDI file ('mido' reads it without music21's parser)
+    if loader == 'mido':
+        melody = read_midi(melody_file)
+    else:
+        melody = converter.parse(melody_file)
+
     # Create harmonizer instance
-    harmonizer = MelodyHarmonizer()
-    
+    harmonizer = MelodyAnalyzer()
+
     # Generate harmony
     harmony = harmonizer.generate_harmony(melody)
-    
+
     # Create output MIDI file
     harmonizer.create_midi(melody, harmony)
-    
-    return melody, harmony
\ No newline at end of file
+
+    return melody, harmony
@@ -0,0 +1,168 @@
+from __future__ import annotations
+from typing import List, Optional, Tuple
+import hashlib
+import json
+import os
+import tempfile
+import zipfile
+import numpy as np
+from .analysis import ANALYZER_VERSION, MelodyAnalysis
+from ..utils.midi_utils import MidiMelody
+from ..utils.lazy import lazy_import
+
+key = lazy_import('music21.key')
+meter = lazy_import('music21.meter')
+
+_SUFFIX = '.npz'
+_TEMP_SUFFIX = '.tmp'  # entries being written; never matched as entries
+
+
+def file_digest(path: str, salt: str = '') -> str:
+    """Hex sha256 of salt followed by the bytes of a file."""
+    digest = hashlib.sha256(salt.encode())
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class AnalysisCache:
+    """
+    On-disk cache of melody analyses, keyed by the content of the melody file.
+
+    An entry holds the parsed note array and the analysis arrays of one
+    file, stored under a hash of the file bytes, the loader and
+    ANALYZER_VERSION, so renamed or copied files hit the same entry and an
+    analyzer change invalidates everything. When the directory grows past
+    max_bytes, the least recently used entries are deleted. Entries are
+    written atomically, so several processes can share a directory.
+
+    The directory is only scanned for eviction when a running total of
+    its size passes max_bytes. The total counts this process's writes on
+    top of the last scan, so with several writers the directory can
+    briefly exceed max_bytes until one of them scans.
+
+    Cached analyses are rebuilt from the note array: their music21 views
+    (notes, phrases, ...) are created from it on access rather than taken
+    from the originally parsed stream.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 256 * 1024 * 1024):
+        """
+        Args:
+            directory: Cache directory (created if missing)
+            max_bytes: Total size the cache entries may take up
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self._total_bytes: Optional[int] = None  # size of the entries, scanned on first put
+
+    def key_for(self, melody_path: str, loader: str) -> str:
+        """Cache key of a melody file: hash of its bytes, the loader and the analyzer version."""
+        return file_digest(melody_path, f'{ANALYZER_VERSION}:{loader}:')
+
+    def get(self, cache_key: str) -> Optional[Tuple[MidiMelody, MelodyAnalysis]]:
+        """The cached melody and analysis for a key, or None."""
+        path = self._path(cache_key)
+        try:
+            with np.load(path) as entry:
+                meta = json.loads(str(entry['meta']))
+                note_array = entry['note_array']
+                phrase_bounds = entry['phrase_bounds']
+                contour = entry['contour']
+                peak_indices = entry['peak_indices']
+        except FileNotFoundError:
+            # missing, or evicted meanwhile
+            self.misses += 1
+            return None
+        except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile):
+            # truncated or corrupt: a miss, and the entry is deleted so the next put replaces it
+            self._discard(path)
+            self.misses += 1
+            return None
+        os.utime(path)  # mark as recently used
+        self.hits += 1
+
+        melody = MidiMelody(note_array, tuple(meta['time_signature']), meta['ticks_per_beat'], meta['tempo'])
+        analysis = MelodyAnalysis(key.Key(meta['key']), meter.TimeSignature('%d/%d' % melody.time_signature),
+                                  note_array, phrase_bounds, contour, peak_indices)
+        return melody, analysis
+
+    def put(self, cache_key: str, melody, analysis: MelodyAnalysis) -> None:
+        """Store the analysis of a melody (a MidiMelody or a music21 stream)."""
+        time_sig = analysis.time_signature
+        meta = {
+            'key': analysis.key.tonicPitchNameWithCase,
+            'time_signature': [time_sig.numerator, time_sig.denominator],
+            'ticks_per_beat': melody.ticks_per_beat if isinstance(melody, MidiMelody) else 480,
+            'tempo': melody.tempo if isinstance(melody, MidiMelody) else 500000,
+        }
+        if self._total_bytes is None:
+            self._total_bytes = sum(size for _, size, _ in self._entries())
+
+        path = self._path(cache_key)
+        handle, temp_path = tempfile.mkstemp(suffix=_TEMP_SUFFIX, dir=self.directory)
+        try:
+            with os.fdopen(handle, 'wb') as f:
+                np.savez(f, meta=json.dumps(meta), note_array=analysis.note_array,
+                         phrase_bounds=analysis.phrase_bounds, contour=analysis.contour,
+                         peak_indices=analysis.peak_indices)
+                size = f.tell()
+            replaced = self._size(path)
+            os.replace(temp_path, path)
+        except BaseException:
+            self._discard(temp_path)
+            raise
+
+        self._total_bytes += size - replaced
+        if self._total_bytes > self.max_bytes:
+            self.evict()
+
+    def evict(self) -> None:
+        """Delete least recently used entries until the cache fits in max_bytes."""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._discard(os.path.join(self.directory, name))
+            total -= size
+        self._total_bytes = total
+
+    def clear(self) -> None:
+        """Delete every entry."""
+        for name in os.listdir(self.directory):
+            if name.endswith(_SUFFIX):
+                self._discard(os.path.join(self.directory, name))
+        self._total_bytes = 0
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        """(mtime, size, name) of every entry in the directory."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(_SUFFIX):
+                continue
+            try:
+                info = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            entries.append((info.st_mtime, info.st_size, name))
+        return entries
+
+    def _size(self, path: str) -> int:
+        try:
+            return os.path.getsize(path)
+        except FileNotFoundError:
+            return 0
+
+    def _discard(self, path: str) -> None:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    def _path(self, cache_key: str) -> str:
+        return os.path.join(self.directory, cache_key + _SUFFIX)
@@ -0,0 +1,95 @@
+from __future__ import annotations
+from typing import Dict, List, Sequence, Union
+import numpy as np
+from ..styles.style_pack import progression_transitions
+from ..utils.chord_tables import chord_table
+from ..utils.lazy import lazy_import
+
+key = lazy_import('music21.key')
+
+
+class ChordSelector:
+    """
+    Chooses a chord for every harmonic window with a hidden Markov model.
+
+    The hidden states are the Roman numerals of the given progressions.
+    Each window is scored against every numeral at once by matching its
+    pitch-class content with the numerals' chord-tone templates (a
+    window x numeral matrix product), and transitions are learned from the
+    numeral bigrams of the progressions (which repeat, so the last numeral
+    leads back to the first). Viterbi decoding then picks the best numeral
+    sequence.
+    """
+
+    def __init__(self,
+                 progressions: Sequence[Sequence[str]],
+                 hold_probability: float = 0.4,
+                 smoothing: float = 0.1,
+                 sharpness: float = 10.0):
+        """
+        Args:
+            progressions: Roman numeral progressions to learn from
+            hold_probability: Probability of keeping the chord into the next window
+            smoothing: Pseudo-count added to every bigram, so any change is possible
+            sharpness: Weight of the template match against the transitions
+        """
+        numerals, starts, changes = progression_transitions(tuple(map(tuple, progressions)), smoothing)
+        self.numerals: List[str] = list(numerals)
+        self.sharpness = sharpness
+
+        transitions = (1 - hold_probability) * changes
+        np.fill_diagonal(transitions, hold_probability)
+        with np.errstate(divide='ignore'):  # impossible moves (no smoothing) get -inf
+            self.log_transitions = np.log(transitions)
+            self.log_initial = np.log(starts)
+        self._templates: Dict[str, np.ndarray] = {}
+
+    def templates(self, key_sig: Union[key.Key, str]) -> np.ndarray:
+        """(numerals, 12) matrix of unit-length chord-tone templates in a key."""
+        key_name = key_sig if isinstance(key_sig, str) else key_sig.tonicPitchNameWithCase
+        templates = self._templates.get(key_name)
+        if templates is None:
+            masks = np.array([chord_table.get(numeral, key_name).mask for numeral in self.numerals])
+            templates = (masks[:, None] >> np.arange(12) & 1).astype(np.float64)
+            templates /= np.linalg.norm(templates, axis=1, keepdims=True)
+            self._templates[key_name] = templates
+        return templates
+
+    def match(self, windows: np.ndarray, key_sig: Union[key.Key, str]) -> np.ndarray:
+        """
+        Cosine similarity of every window's pitch content with every numeral.
+
+        Returns:
+            (windows, numerals) array in [0, 1]; silent windows match nothing
+        """
+        weights = windows['weights'].astype(np.float64)
+        norms = np.linalg.norm(weights, axis=1, keepdims=True)
+        weights = np.divide(weights, norms, out=np.zeros_like(weights), where=norms > 0)
+        return weights @ self.templates(key_sig).T
+
+    def select(self, windows: np.ndarray, key_sig: Union[key.Key, str]) -> List[str]:
+        """
+        Most likely numeral of every window.
+
+        Args:
+            windows: Harmonic windows from segment_melody
+            key_sig: Key of the melody
+
+        Returns:
+            One Roman numeral per window
+        """
+        if not len(windows):
+            return []
+        emissions = self.sharpness * self.match(windows, key_sig)
+
+        backpointers = np.zeros(emissions.shape, dtype=np.int64)
+        scores = self.log_initial + emissions[0]
+        for t in range(1, len(emissions)):
+            candidates = scores[:, None] + self.log_transitions
+            backpointers[t] = np.argmax(candidates, axis=0)
+            scores = candidates[backpointers[t], np.arange(len(scores))] + emissions[t]
+
+        path = [int(np.argmax(scores))]
+        for t in range(len(emissions) - 1, 0, -1):
+            path.append(int(backpointers[t, path[-1]]))
+        return [self.numerals[i] for i in reversed(path)]
@@ -1,92 +1,654 @@
-from typing import List, Dict, Optional
-from music21 import stream, converter
-from ..utils.music_theory import get_key_signature
+from __future__ import annotations
+from typing import BinaryIO, List, Dict, Optional, Iterable, Iterator, Tuple, Union
+from contextlib import nullcontext
+from dataclasses import dataclass
+import multiprocessing
+import os
+import traceback
+import numpy as np
 from ..styles.progressions import get_style_progression
-from .analysis import MelodyAnalyzer
+from ..utils.midi_utils import ChordEvent, MidiMelody, read_arrangement, read_midi, stream_arrangement, write_midi, chord_events
+from ..utils.corpus import MelodyCorpus
+from ..utils.profiling import PipelineProfiler, StageHook
+from .analysis import MelodyAnalyzer, MelodyAnalysis
+from .analysis_cache import AnalysisCache
+from .segmentation import HARMONIC_RHYTHMS, add_context, segment_melody, window_length
 from .voicing import VoicingGenerator
+from ..utils.lazy import lazy_import
+
+stream = lazy_import('music21.stream')
+converter = lazy_import('music21.converter')
+note = lazy_import('music21.note')
+
+
+@dataclass
+class HarmonizationResult:
+    """Outcome of harmonizing a single file in a batch."""
+    melody_path: str
+    output_path: Optional[str] = None
+    score: Optional[stream.Score] = None
+    error: Optional[str] = None
+    stages: Optional[Dict[str, float]] = None  # seconds spent in each pipeline stage, when profiling
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
 
 class MelodyHarmonizer:
     """Main harmonizer class that coordinates the harmonization process."""
-    
-    def __init__(self):
+
+    def __init__(self,
+                 profiler: Optional[PipelineProfiler] = None,
+                 analysis_cache: Optional[AnalysisCache] = None):
+        """
+        Args:
+            profiler: Optional PipelineProfiler recording per-stage time and
+                allocations of every harmonize call (see enable_profiling)
+            analysis_cache: Optional AnalysisCache; files already in it are
+                neither parsed nor analyzed again
+        """
         self.analyzer = MelodyAnalyzer()
         self.voicing_generator = VoicingGenerator()
-        
-    def harmonize(self, 
-                 melody_path: str, 
+        self.profiler = profiler
+        self.analysis_cache = analysis_cache
+
+    def enable_profiling(self, sample_rate: float = 1.0, hooks: Optional[List[StageHook]] = None) -> PipelineProfiler:
+        """
+        Start recording per-stage timings ('load', 'analyze', 'segment', 'progression',
+        'generate_harmony', 'voicing', 'score', 'write').
+
+        Args:
+            sample_rate: Fraction of harmonize calls to measure
+            hooks: Callbacks called with (stage, seconds, allocated blocks) after each stage
+
+        Returns:
+            The profiler; its report() holds the results
+        """
+        self.profiler = PipelineProfiler(sample_rate, hooks)
+        return self.profiler
+
+    def disable_profiling(self) -> None:
+        self.profiler = None
+
+    def harmonize(self,
+                 melody_path: str,
                  style: str = 'pop',
                  complexity: str = 'medium',
-                 output_path: Optional[str] = None) -> stream.Score:
+                 output_path: Optional[str] = None,
+                 loader: str = 'music21') -> stream.Score:
         """
         Harmonize a given melody file.
-        
+
         Args:
             melody_path: Path to the input melody file
             style: Harmonization style ('pop', 'jazz', 'classical', 'blues')
             complexity: Harmonization complexity ('simple', 'medium', 'complex')
             output_path: Optional path to save the output file
-            
+            loader: 'music21' (converter.parse, any format) or 'mido'
+                (fast reader for single-line MIDI files)
+
         Returns:
             music21.stream.Score object containing the harmonized piece
         """
-        # Load and analyze melody
-        melody = converter.parse(melody_path)
-        analysis = self.analyzer.analyze_melody(melody)
-        
+        with self._run():
+            # Load and analyze melody
+            melody, analysis = self._load_and_analyze(melody_path, loader)
+
+            # Generate the style's harmony and voice it
+            voiced_stream = self._voiced_stream(analysis, style, complexity)
+
+            # Combine melody and harmony
+            with self._stage('score'):
+                score = self._create_score(analysis.notes, voiced_stream)
+
+            # Save if output path is provided (written directly, not through the Score)
+            if output_path:
+                with self._stage('write'):
+                    self._write_output(output_path, analysis, chord_events(voiced_stream), _melody_tempo(melody))
+
+        return score
+
+    def harmonize_to_midi(self,
+                          melody_path: str,
+                          output_path: Union[str, BinaryIO],
+                          style: str = 'pop',
+                          complexity: str = 'medium',
+                          loader: str = 'music21') -> None:
+        """
+        Harmonize a melody file straight to a MIDI file, without building a Score.
+
+        The melody and the voiced chords go from the note array and the
+        voicing tuples directly into a two-track MIDI file.
+
+        Args:
+            melody_path: Path to the input melody file
+            output_path: Path of the MIDI file to write, or a binary file object
+            style: Harmonization style ('pop', 'jazz', 'classical', 'blues')
+            complexity: Harmonization complexity ('simple', 'medium', 'complex')
+            loader: 'music21' or 'mido' (see harmonize)
+        """
+        with self._run():
+            melody, analysis = self._load_and_analyze(melody_path, loader)
+            events = self._voiced_events(analysis, style, complexity)
+            with self._stage('write'):
+                self._write_output(output_path, analysis, events, _melody_tempo(melody))
+
+    def harmonize_arrangement(self,
+                              melody_path: str,
+                              style: str = 'pop',
+                              complexity: str = 'medium',
+                              output_path: Optional[str] = None,
+                              melody: Union[str, int] = 'auto',
+                              context_weight: float = 0.5,
+                              loader: str = 'mido') -> stream.Score:
+        """
+        Harmonize the melody of a multi-part file, taking its other parts into account.
+
+        The melody part is picked (or given) instead of merging every track
+        into one line, and the pitches of the other parts are added to the
+        harmonic windows, so the chords follow the existing accompaniment.
+
+        Args:
+            melody_path: Path to the input file
+            style: Harmonization style ('pop', 'jazz', 'classical', 'blues')
+            complexity: Harmonization complexity ('simple', 'medium', 'complex')
+            output_path: Optional path to save the output file
+            melody: Melody part: 'auto', 'skyline', a part index or a track name
+                (see MelodyAnalyzer.analyze_arrangement)
+            context_weight: Weight of the other parts relative to the melody
+                (0 harmonizes the melody alone)
+            loader: 'mido' (MIDI files, one part per track and channel) or
+                'music21' (anything converter.parse reads, one part per score part)
+
+        Returns:
+            music21.stream.Score object containing the melody and the harmony
+        """
+        with self._run():
+            with self._stage('load'):
+                arrangement = self._load_arrangement(melody_path, loader)
+            with self._stage('analyze'):
+                arrangement_analysis = self.analyzer.analyze_arrangement(arrangement, melody, analyze_parts=False)
+                analysis = arrangement_analysis.melody
+            with self._stage('segment'):
+                windows = self._segment(analysis, complexity)
+                if context_weight:
+                    windows = add_context(windows, arrangement_analysis.context,
+                                          self._window_length(analysis, complexity), context_weight)
+            voiced_stream = self._voiced_stream(analysis, style, complexity, windows)
+            with self._stage('score'):
+                score = self._create_score(analysis.notes, voiced_stream)
+            if output_path:
+                with self._stage('write'):
+                    self._write_output(output_path, analysis, chord_events(voiced_stream), arrangement.tempo)
+        return score
+
+    def harmonize_styles(self,
+                         melody_path: str,
+                         styles: Iterable[str] = ('pop', 'jazz', 'classical', 'blues'),
+                         complexities: Iterable[str] = ('medium',),
+                         output_dir: Optional[str] = None,
+                         workers: int = 1,
+                         loader: str = 'music21') -> Dict[Tuple[str, str], HarmonizationResult]:
+        """
+        Harmonize one melody in several styles and complexities.
+
+        The melody is loaded and analyzed once and segmented once per
+        complexity; only the progression, chord selection and voicing are
+        done again for every (style, complexity) branch. A branch that fails
+        produces a result with ``error`` set instead of aborting the others.
+
+        Args:
+            melody_path: Path to the input melody file
+            styles: Harmonization styles
+            complexities: Harmonization complexities
+            output_dir: Optional directory to write '<name>_<style>_<complexity>.mid'
+                outputs to. When given, results carry the output path but no score.
+            workers: Number of worker processes to run the branches in.
+                With 1 worker the branches run in this process.
+            loader: 'music21' or 'mido' (see harmonize)
+
+        Returns:
+            Dict mapping (style, complexity) to the HarmonizationResult of that branch
+        """
+        styles, complexities = list(styles), list(complexities)
+        with self._run():
+            melody, analysis = self._load_and_analyze(melody_path, loader)
+            with self._stage('segment'):
+                windows = {complexity: self._segment(analysis, complexity) for complexity in complexities}
+
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        tempo = _melody_tempo(melody)
+        branches = [(melody_path, analysis, windows[complexity], style, complexity,
+                     _output_path_for(melody_path, output_dir, f'_{style}_{complexity}'), tempo)
+                    for complexity in complexities for style in styles]
+
+        if workers <= 1 or len(branches) <= 1:
+            results = [self._harmonize_branch(branch) for branch in branches]
+        else:
+            with multiprocessing.Pool(min(workers, len(branches)), initializer=init_worker, initargs=(None,)) as pool:
+                results = pool.map(_run_worker_branch, branches)
+        return {(style, complexity): result
+                for (_, _, _, style, complexity, _, _), result in zip(branches, results)}
+
+    def harmonize_many(self,
+                       melody_paths: Iterable[str],
+                       style: str = 'pop',
+                       complexity: str = 'medium',
+                       output_dir: Optional[str] = None,
+                       workers: Optional[int] = None,
+                       chunksize: int = 1,
+                       loader: str = 'music21',
+                       input_root: Optional[str] = None) -> Iterator[HarmonizationResult]:
+        """
+        Harmonize many melody files in parallel.
+
+        Files are distributed over a pool of worker processes, each of which
+        keeps a single MelodyHarmonizer (and so a single MelodyAnalyzer and
+        VoicingGenerator) for all the files it handles. Results are yielded
+        as soon as they finish, so their order is not the input order. A
+        file that fails to harmonize produces a result with ``error`` set
+        instead of aborting the batch. When profiling is enabled, the
+        workers profile too and every result carries its stage timings.
+
+        Args:
+            melody_paths: Paths to the input melody files
+            style: Harmonization style ('pop', 'jazz', 'classical', 'blues')
+            complexity: Harmonization complexity ('simple', 'medium', 'complex')
+            output_dir: Optional directory to write '<name>.mid' outputs to.
+                When given, results carry the output path but no score.
+            workers: Number of worker processes (defaults to the CPU count).
+                With 1 worker the files are harmonized in this process.
+            chunksize: Number of files handed to a worker at a time
+            loader: Melody loader passed on to harmonize ('music21' or 'mido')
+            input_root: Optional directory the melody paths are under; outputs
+                then mirror it ('<output_dir>/<path relative to input_root>.mid')
+                instead of all going into output_dir itself
+
+        Returns:
+            Iterator of HarmonizationResult objects
+        """
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        jobs = ((path, style, complexity, _output_path_for(path, output_dir, root=input_root), loader)
+                for path in melody_paths)
+
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers <= 1:
+            for job in jobs:
+                yield _harmonize_job(self, job)
+            return
+
+        cache = self.analysis_cache
+        cache_args = (cache.directory, cache.max_bytes) if cache is not None else None
+        sample_rate = self.profiler.sample_rate if self.profiler is not None else None
+        with multiprocessing.Pool(workers, initializer=init_worker, initargs=(cache_args, sample_rate)) as pool:
+            yield from pool.imap_unordered(_run_worker_job, jobs, chunksize=chunksize)
+
+    def harmonize_corpus(self,
+                         corpus: Union[str, MelodyCorpus],
+                         style: str = 'pop',
+                         complexity: str = 'medium',
+                         output_dir: Optional[str] = None,
+                         workers: Optional[int] = None,
+                         chunksize: int = 64,
+                         indices: Optional[Iterable[int]] = None) -> Iterator[HarmonizationResult]:
+        """
+        Harmonize the melodies of a packed corpus (see utils.corpus).
+
+        Works like harmonize_many, but the melodies are read as slices of the
+        corpus's memory-mapped note file instead of being opened and parsed
+        one file at a time; every worker process maps the corpus itself, so
+        only melody indices are sent to it. Results carry the melody's name
+        in place of a path.
+
+        Args:
+            corpus: MelodyCorpus, or the path of its directory
+            style: Harmonization style ('pop', 'jazz', 'classical', 'blues')
+            complexity: Harmonization complexity ('simple', 'medium', 'complex')
+            output_dir: Optional directory to write '<name>.mid' outputs to.
+                When given, results carry the output path but no score.
+            workers: Number of worker processes (defaults to the CPU count).
+                With 1 worker the melodies are harmonized in this process.
+            chunksize: Number of melodies handed to a worker at a time
+            indices: Melodies to harmonize (defaults to all of them)
+
+        Returns:
+            Iterator of HarmonizationResult objects
+        """
+        if isinstance(corpus, str):
+            corpus = MelodyCorpus(corpus)
+        if indices is None:
+            indices = range(len(corpus))
+        names = corpus.names
+        jobs = ((corpus.path, i, style, complexity, _corpus_output_path(names[i], output_dir))
+                for i in indices)
+
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers <= 1:
+            for job in jobs:
+                yield _harmonize_corpus_job(self, corpus, job)
+            return
+
+        with multiprocessing.Pool(workers, initializer=init_worker, initargs=(None,)) as pool:
+            yield from pool.imap_unordered(_run_worker_corpus_job, jobs, chunksize=chunksize)
+
+    def _run(self):
+        """Context for one pass through the pipeline (sampling decision of the profiler)."""
+        return self.profiler.run() if self.profiler is not None else nullcontext()
+
+    def _stage(self, name: str):
+        """Context measuring one pipeline stage when profiling is enabled."""
+        return self.profiler.stage(name) if self.profiler is not None else nullcontext()
+
+    def _harmonize_branch(self, branch: tuple) -> HarmonizationResult:
+        """Harmonize one (style, complexity) branch of harmonize_styles, capturing any failure."""
+        melody_path, analysis, windows, style, complexity, output_path, tempo = branch
+        try:
+            with self._run():
+                if output_path:
+                    events = self._voiced_events(analysis, style, complexity, windows)
+                    with self._stage('write'):
+                        self._write_output(output_path, analysis, events, tempo)
+                    return HarmonizationResult(melody_path, output_path)
+                voiced_stream = self._voiced_stream(analysis, style, complexity, windows)
+                with self._stage('score'):
+                    score = self._create_score(analysis.notes, voiced_stream)
+        except Exception:
+            return HarmonizationResult(melody_path, output_path, error=traceback.format_exc())
+        return HarmonizationResult(melody_path, score=score)
+
+    def _voiced_stream(self,
+                       analysis: 'MelodyAnalysis',
+                       style: str,
+                       complexity: str,
+                       windows: Optional[np.ndarray] = None) -> stream.Stream:
+        """The style's harmony for an analyzed melody, voiced, as a stream of chords and rests."""
         # Get style-specific progression
-        progression = get_style_progression(style, analysis.key)
-        
+        with self._stage('progression'):
+            progression = get_style_progression(style, analysis.key)
+
         # Generate initial harmony
-        harmony = self._generate_harmony(analysis, progression, complexity)
-        
+        with self._stage('generate_harmony'):
+            harmony = self._generate_harmony(analysis, progression, complexity, windows)
+
         # Apply voicing based on style
-        voiced_harmony = self.voicing_generator.apply_voicing(harmony, style)
-        
-        # Combine melody and harmony
-        score = self._create_score(melody, voiced_harmony)
-        
-        # Save if output path is provided
-        if output_path:
-            score.write('midi', fp=output_path)
-            
-        return score
-    
-    def _generate_harmony(self, 
+        with self._stage('voicing'):
+            voiced_harmony = self.voicing_generator.apply_voicing(list(harmony), style)
+            voiced_stream = stream.Stream()
+            for original, voiced in zip(harmony, voiced_harmony):
+                voiced_stream.insert(original.offset, voiced, ignoreSort=True)
+        return voiced_stream
+
+    def _voiced_events(self,
+                       analysis: 'MelodyAnalysis',
+                       style: str,
+                       complexity: str,
+                       windows: Optional[np.ndarray] = None) -> List[ChordEvent]:
+        """Like _voiced_stream, but return the voiced chords as MIDI events without building chords."""
+        with self._stage('progression'):
+            progression = get_style_progression(style, analysis.key)
+        with self._stage('generate_harmony'):
+            harmony = list(self._generate_harmony(analysis, progression, complexity, windows))
+
+        with self._stage('voicing'):
+            voicings = self.voicing_generator.apply_voicing_midi(harmony, style)
+            return [(float(el.offset), float(el.quarterLength), voicing)
+                    for el, voicing in zip(harmony, voicings) if voicing is not None]
+
+    def _load_and_analyze(self, melody_path: str, loader: str):
+        """Load and analyze a melody, going through the analysis cache if there is one."""
+        cache_key = None
+        if self.analysis_cache is not None:
+            with self._stage('load'):
+                cache_key = self.analysis_cache.key_for(melody_path, loader)
+                cached = self.analysis_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        with self._stage('load'):
+            melody = self._load_melody(melody_path, loader)
+        with self._stage('analyze'):
+            analysis = self.analyzer.analyze_melody(melody)
+        if cache_key is not None:
+            self.analysis_cache.put(cache_key, melody, analysis)
+        return melody, analysis
+
+    def _load_melody(self, melody_path: str, loader: str):
+        """Load a melody as a music21 stream, or as a MidiMelody with the mido loader."""
+        if loader == 'mido':
+            return read_midi(melody_path)
+        if loader == 'music21':
+            return converter.parse(melody_path)
+        raise ValueError(f"Unknown melody loader: {loader!r}")
+
+    def _load_arrangement(self, melody_path: str, loader: str):
+        """Load the parts of a file as a MidiArrangement."""
+        if loader == 'mido':
+            return read_arrangement(melody_path)
+        if loader == 'music21':
+            return stream_arrangement(converter.parse(melody_path))
+        raise ValueError(f"Unknown melody loader: {loader!r}")
+
+    def _write_output(self,
+                      output_path: Union[str, BinaryIO],
+                      analysis: 'MelodyAnalysis',
+                      events: list,
+                      tempo: int) -> None:
+        """Write the melody and voiced chord events as a two-track MIDI file."""
+        time_sig = analysis.time_signature
+        write_midi(output_path, analysis.note_array, events,
+                   (time_sig.numerator, time_sig.denominator), tempo)
+
+    def _generate_harmony(self,
                          analysis: 'MelodyAnalysis',
                          progression: List[str],
-                         complexity: str) -> stream.Stream:
-        """Generate initial harmony based on analysis and style."""
+                         complexity: str,
+                         windows: Optional[np.ndarray] = None) -> stream.Stream:
+        """
+        Generate initial harmony based on analysis and style.
+
+        windows, when given, is the melody already segmented for the
+        complexity (see _segment).
+        """
         harmony = stream.Stream()
-        
+
         # Implementation varies based on complexity
         if complexity == 'simple':
             # Generate basic chord progression
-            harmony = self._generate_simple_harmony(analysis, progression)
+            harmony = self._generate_simple_harmony(analysis, progression, windows)
         elif complexity == 'medium':
             # Add passing chords and basic variations
-            harmony = self._generate_medium_harmony(analysis, progression)
+            harmony = self._generate_medium_harmony(analysis, progression, windows)
         else:  # complex
             # Add advanced harmonization techniques
-            harmony = self._generate_complex_harmony(analysis, progression)
-            
+            harmony = self._generate_complex_harmony(analysis, progression, windows)
+
         return harmony
-    
-    def _create_score(self, 
-                     melody: stream.Stream,
+
+    def _segment(self, analysis: 'MelodyAnalysis', complexity: str) -> np.ndarray:
+        """Harmonic windows of the melody at the complexity's harmonic rhythm."""
+        return segment_melody(analysis.note_array, self._window_length(analysis, complexity))
+
+    def _window_length(self, analysis: 'MelodyAnalysis', complexity: str) -> float:
+        """Length of the harmonic windows for a complexity (quarter lengths)."""
+        rhythm = HARMONIC_RHYTHMS.get(complexity, HARMONIC_RHYTHMS['complex'])
+        return window_length(analysis.time_signature, rhythm)
+
+    def _generate_simple_harmony(self,
+                                 analysis: 'MelodyAnalysis',
+                                 progression: List[str],
+                                 windows: Optional[np.ndarray] = None) -> stream.Stream:
+        """One chord of the progression per measure."""
+        if windows is None:
+            windows = self._segment(analysis, 'simple')
+        numerals = self.analyzer.progression_numerals(windows, progression,
+                                                      analysis.time_signature.barDuration.quarterLength)
+        return self.analyzer.harmonize_windows(windows, analysis.key, numerals, fit_melody=False)
+
+    def _generate_medium_harmony(self,
+                                 analysis: 'MelodyAnalysis',
+                                 progression: List[str],
+                                 windows: Optional[np.ndarray] = None) -> stream.Stream:
+        """Up to two chords per measure, chosen to fit the melody of each half."""
+        return self._generate_window_harmony(analysis, progression, 'medium', windows)
+
+    def _generate_complex_harmony(self,
+                                  analysis: 'MelodyAnalysis',
+                                  progression: List[str],
+                                  windows: Optional[np.ndarray] = None) -> stream.Stream:
+        """Up to one chord per beat, chosen to fit the melody of the beat."""
+        return self._generate_window_harmony(analysis, progression, 'complex', windows)
+
+    def _generate_window_harmony(self,
+                                 analysis: 'MelodyAnalysis',
+                                 progression: List[str],
+                                 complexity: str,
+                                 windows: Optional[np.ndarray] = None) -> stream.Stream:
+        """
+        Segment the melody at the complexity's harmonic rhythm (unless windows
+        are given) and choose the progression chords that best fit each
+        window (see ChordSelector).
+        """
+        if windows is None:
+            windows = self._segment(analysis, complexity)
+        numerals = self.analyzer.chord_selector([progression]).select(windows, analysis.key)
+        return self.analyzer.harmonize_windows(windows, analysis.key, numerals)
+
+    def _create_score(self,
+                     melody_notes: List[note.GeneralNote],
                      harmony: stream.Stream) -> stream.Score:
-        """Combine melody and harmony into a single score."""
+        """Combine melody notes and harmony into a single score."""
         score = stream.Score()
-        
+
         # Create melody part
-        melody_part = stream.Part()
-        melody_part.append(melody.flatten())
-        
+        melody_part = stream.Part(melody_notes)
+
         # Create harmony part
-        harmony_part = stream.Part()
-        harmony_part.append(harmony)
-        
+        harmony_part = stream.Part(harmony.notesAndRests)
+
         # Add both parts to score
-        score.append(melody_part)
-        score.append(harmony_part)
-        
-        return score
\ No newline at end of file
+        score.insert(0, melody_part)
+        score.insert(0, harmony_part)
+
+        return score
+
+
+def _output_path_for(melody_path: str,
+                     output_dir: Optional[str],
+                     suffix: str = '',
+                     root: Optional[str] = None) -> Optional[str]:
+    """
+    Output file for a melody in a batch run ('<output_dir>/<name><suffix>.mid').
+
+    With a root, name keeps the melody's directories below root (which are
+    created under output_dir).
+    """
+    if not output_dir:
+        return None
+    if root is None:
+        name = os.path.splitext(os.path.basename(melody_path))[0]
+        return os.path.join(output_dir, name + suffix + '.mid')
+    path = os.path.join(output_dir, os.path.splitext(os.path.relpath(melody_path, root))[0] + suffix + '.mid')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+def _corpus_output_path(name: str, output_dir: Optional[str]) -> Optional[str]:
+    """Output file for a corpus melody ('<output_dir>/<name>.mid', creating the subdirectories in name)."""
+    if not output_dir:
+        return None
+    path = os.path.join(output_dir, *name.split('/')) + '.mid'
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+def _melody_tempo(melody) -> int:
+    """Tempo (microseconds per quarter note) of a loaded melody; music21 streams get 120 bpm."""
+    return melody.tempo if isinstance(melody, MidiMelody) else 500000
+
+
+def _harmonize_job(harmonizer: MelodyHarmonizer, job: tuple) -> HarmonizationResult:
+    """Harmonize one batch job, capturing any failure in the result."""
+    melody_path, style, complexity, output_path, loader = job
+    before = _stage_seconds(harmonizer.profiler)
+    try:
+        if output_path:
+            # only the file is wanted, so skip building a Score
+            harmonizer.harmonize_to_midi(melody_path, output_path, style, complexity, loader)
+            result = HarmonizationResult(melody_path, output_path)
+        else:
+            score = harmonizer.harmonize(melody_path, style, complexity, loader=loader)
+            result = HarmonizationResult(melody_path, score=score)
+    except Exception:
+        result = HarmonizationResult(melody_path, output_path, error=traceback.format_exc())
+    if before is not None:
+        after = _stage_seconds(harmonizer.profiler)
+        result.stages = {name: seconds - before.get(name, 0.0) for name, seconds in after.items()}
+    return result
+
+
+def _stage_seconds(profiler: Optional[PipelineProfiler]) -> Optional[Dict[str, float]]:
+    """Total seconds recorded so far for each stage, or None without a profiler."""
+    if profiler is None:
+        return None
+    return {name: stats.total_seconds for name, stats in profiler.stages.items()}
+
+
+def _harmonize_corpus_job(harmonizer: MelodyHarmonizer, corpus: MelodyCorpus, job: tuple) -> HarmonizationResult:
+    """Harmonize one corpus melody, capturing any failure in the result."""
+    _, index, style, complexity, output_path = job
+    name = corpus.names[index]
+    try:
+        melody = corpus[index]
+        analysis = harmonizer.analyzer.analyze_melody(melody)
+    except Exception:
+        return HarmonizationResult(name, output_path, error=traceback.format_exc())
+    return harmonizer._harmonize_branch((name, analysis, None, style, complexity, output_path, melody.tempo))
+
+
+# Per-process harmonizer of the worker pools (see init_worker)
+_worker_harmonizer: Optional[MelodyHarmonizer] = None
+
+# Corpora mapped by this worker process, by path
+_worker_corpora: Dict[str, MelodyCorpus] = {}
+
+
+def init_worker(cache_args: Optional[tuple], sample_rate: Optional[float] = None) -> None:
+    """
+    Pool initializer: create the MelodyHarmonizer this worker process uses for all its jobs.
+
+    Args:
+        cache_args: (directory, max_bytes) of a shared AnalysisCache, or None
+        sample_rate: Profile this share of the worker's jobs (None: no profiling)
+    """
+    global _worker_harmonizer
+    cache = AnalysisCache(*cache_args) if cache_args is not None else None
+    _worker_harmonizer = MelodyHarmonizer(analysis_cache=cache)
+    if sample_rate is not None:
+        _worker_harmonizer.enable_profiling(sample_rate)
+
+
+def worker_harmonizer() -> MelodyHarmonizer:
+    """The harmonizer init_worker created in this worker process."""
+    if _worker_harmonizer is None:
+        raise RuntimeError("init_worker has not run in this process")
+    return _worker_harmonizer
+
+
+def _run_worker_job(job: tuple) -> HarmonizationResult:
+    return _harmonize_job(_worker_harmonizer, job)
+
+
+def _run_worker_branch(branch: tuple) -> HarmonizationResult:
+    return _worker_harmonizer._harmonize_branch(branch)
+
+
+def _run_worker_corpus_job(job: tuple) -> HarmonizationResult:
+    corpus = _worker_corpora.get(job[0])
+    if corpus is None:
+        corpus = _worker_corpora[job[0]] = MelodyCorpus(job[0])
+    return _harmonize_corpus_job(_worker_harmonizer, corpus, job)
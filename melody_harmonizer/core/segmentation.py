@@ -0,0 +1,116 @@
+from __future__ import annotations
+import math
+import numpy as np
+from ..utils.note_array import REST_PITCH
+from ..utils.lazy import lazy_import
+
+meter = lazy_import('music21.meter')
+
+# Harmonic rhythm (how often the chord may change) for each complexity
+HARMONIC_RHYTHMS = {
+    'simple': 'bar',
+    'medium': 'half_bar',
+    'complex': 'beat',
+}
+
+# One record per harmonic window
+WINDOW_DTYPE = np.dtype([
+    ('start', np.float64),          # quarter lengths from the start
+    ('duration', np.float64),       # quarter lengths
+    ('pitch', np.int16),            # MIDI number of the most prominent melody note (REST_PITCH if silent)
+    ('weights', np.float32, (12,)), # duration-weighted pitch-class content
+])
+
+
+def window_length(time_sig: meter.TimeSignature, rhythm: str) -> float:
+    """
+    Length of a harmonic window in quarter lengths.
+
+    Args:
+        time_sig: Time signature of the melody
+        rhythm: 'bar', 'half_bar' (a whole bar when the bar has an odd
+            number of beats) or 'beat'
+    """
+    bar_length = float(time_sig.barDuration.quarterLength)
+    if rhythm == 'bar':
+        return bar_length
+    if rhythm == 'half_bar':
+        return bar_length / 2 if time_sig.beatCount % 2 == 0 else bar_length
+    if rhythm == 'beat':
+        return float(time_sig.beatDuration.quarterLength)
+    raise ValueError(f"Unknown harmonic rhythm: {rhythm!r}")
+
+
+def segment_melody(note_array: np.ndarray, length: float) -> np.ndarray:
+    """
+    Group the notes of a melody into consecutive windows of equal length.
+
+    Every note contributes to each window it sounds in, weighted by the time
+    it sounds there and by its metrical strength. The window's pitch is the
+    melody note with the largest weight in it (the earliest on ties).
+
+    Args:
+        note_array: Note array of the melody
+        length: Window length in quarter lengths (see window_length)
+
+    Returns:
+        Array of WINDOW_DTYPE records covering the whole melody
+    """
+    if not len(note_array):
+        return np.zeros(0, dtype=WINDOW_DTYPE)
+
+    end = float((note_array['onset'] + note_array['duration']).max())
+    n_windows = max(1, int(math.ceil(end / length - 1e-9)))
+    windows = np.zeros(n_windows, dtype=WINDOW_DTYPE)
+    windows['start'] = np.arange(n_windows) * length
+    windows['duration'] = np.minimum(length, end - windows['start'])
+    windows['pitch'] = REST_PITCH
+
+    pitched = note_array[~note_array['is_rest']]
+    if not len(pitched):
+        return windows
+
+    # expand every note into one row per window it overlaps
+    onsets = pitched['onset']
+    offsets = onsets + pitched['duration']
+    first = (onsets // length).astype(np.int64)
+    last = np.maximum(np.ceil(offsets / length - 1e-9).astype(np.int64) - 1, first)
+    last = np.minimum(last, n_windows - 1)
+    spans = last - first + 1
+    note_index = np.repeat(np.arange(len(pitched)), spans)
+    window_index = np.repeat(first, spans) + np.arange(spans.sum()) - np.repeat(np.cumsum(spans) - spans, spans)
+
+    overlap = (np.minimum(offsets[note_index], (window_index + 1) * length)
+               - np.maximum(onsets[note_index], window_index * length))
+    weight = np.maximum(overlap, 0) * (1 + pitched['beat_strength'][note_index])
+    pitches = pitched['pitch'][note_index]
+    np.add.at(windows['weights'], (window_index, pitches % 12), weight)
+
+    # heaviest note of each window
+    order = np.lexsort((note_index, -weight, window_index))
+    heaviest, rows = np.unique(window_index[order], return_index=True)
+    windows['pitch'][heaviest] = pitches[order[rows]]
+    return windows
+
+
+def add_context(windows: np.ndarray, context: np.ndarray, length: float, weight: float = 0.5) -> np.ndarray:
+    """
+    Add the pitch-class content of accompanying parts to harmonic windows.
+
+    The windows keep their melody pitch; only their weights (what chord
+    matching looks at) change. Context beyond the last window is ignored.
+
+    Args:
+        windows: Windows of the melody from segment_melody
+        context: Note array of the other parts (overlapping notes allowed)
+        length: Window length used for the melody
+        weight: Weight of the context relative to the melody
+
+    Returns:
+        New array of WINDOW_DTYPE records
+    """
+    context_windows = segment_melody(context, length)
+    count = min(len(windows), len(context_windows))
+    windows = windows.copy()
+    windows['weights'][:count] += weight * context_windows['weights'][:count]
+    return windows
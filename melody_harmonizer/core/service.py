@@ -0,0 +1,163 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Deque, Dict, Optional, Tuple
+import asyncio
+import io
+import time
+import numpy as np
+from .harmonizer import init_worker, worker_harmonizer
+from .analysis_cache import AnalysisCache, file_digest
+
+
+@dataclass(frozen=True)
+class HarmonizationJob:
+    """One request to the HarmonizationService."""
+    melody_path: str
+    style: str = 'pop'
+    complexity: str = 'medium'
+    loader: str = 'mido'
+
+
+class HarmonizationService:
+    """
+    asyncio front-end running harmonization jobs in a process pool.
+
+    submit() returns the harmonized MIDI file's bytes without blocking the
+    event loop: the whole pipeline runs in worker processes, each keeping
+    one MelodyHarmonizer. At most max_pending jobs are handed to the pool
+    at a time; further submissions wait for a slot (backpressure). The
+    waiting queue is unbounded unless max_queued is set, in which case a
+    submission that would make more than max_queued jobs wait raises
+    asyncio.QueueFull at once. Identical jobs (same file content, loader,
+    style and complexity) submitted while one of them is in flight share
+    its result instead of running again.
+
+    Use it as an async context manager, or call close() when done.
+    """
+
+    def __init__(self,
+                 workers: int = 2,
+                 max_pending: Optional[int] = None,
+                 max_queued: Optional[int] = None,
+                 analysis_cache: Optional[AnalysisCache] = None,
+                 latency_window: int = 1000):
+        """
+        Args:
+            workers: Number of worker processes
+            max_pending: Jobs handed to the pool at a time (defaults to twice
+                the workers, so every worker has its next job ready)
+            max_queued: Jobs allowed to wait for a slot (None: unbounded)
+            analysis_cache: Optional AnalysisCache shared by the workers
+            latency_window: Number of recent job latencies kept for percentiles
+        """
+        cache = analysis_cache
+        cache_args = (cache.directory, cache.max_bytes) if cache is not None else None
+        self._executor = ProcessPoolExecutor(workers, initializer=init_worker, initargs=(cache_args,))
+        self.max_pending = max_pending or 2 * workers
+        self.max_queued = max_queued
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._in_flight: Dict[Tuple[str, str, str, str], asyncio.Task] = {}
+        self.latencies: Deque[float] = deque(maxlen=latency_window)
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.deduplicated = 0
+
+    async def submit(self, job: HarmonizationJob) -> bytes:
+        """
+        Harmonize a melody file.
+
+        Returns:
+            The harmonized piece as the bytes of a two-track MIDI file
+
+        Raises:
+            asyncio.QueueFull: If max_queued jobs are already waiting for a slot
+                (never for a job identical to one in flight, which shares its result)
+            Whatever the harmonizer raised for the job (in the worker process)
+        """
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        digest = await loop.run_in_executor(None, file_digest, job.melody_path)
+        job_key = (digest, job.loader, job.style, job.complexity)
+
+        task = self._in_flight.get(job_key)
+        if task is None:
+            queued = self.waiting + self.running - self.max_pending  # jobs that would wait ahead of this one
+            if self.max_queued is not None and queued >= self.max_queued:
+                raise asyncio.QueueFull(f"{self.max_queued} jobs are already waiting for a slot")
+            self.waiting += 1  # counted from here, so submissions in the same tick see each other
+            task = self._in_flight[job_key] = asyncio.ensure_future(self._run(job))
+            task.add_done_callback(lambda _: self._in_flight.pop(job_key, None))
+        else:
+            self.deduplicated += 1
+        try:
+            # shielded, so a cancelled caller does not cancel the job for the others sharing it
+            return await asyncio.shield(task)
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+    async def _run(self, job: HarmonizationJob) -> bytes:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.running += 1
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._executor, _run_service_job, job)
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.running -= 1
+            self._slots.release()
+        self.completed += 1
+        return result
+
+    @property
+    def queue_depth(self) -> int:
+        """Jobs waiting for a slot in the pool."""
+        return self.waiting
+
+    def latency_percentiles(self, percentiles: Tuple[float, ...] = (50, 90, 99)) -> Dict[str, float]:
+        """Percentiles (in seconds) of the recent submit-to-result latencies, keyed 'p50', 'p90', ..."""
+        if not self.latencies:
+            return {f'p{p:g}': 0.0 for p in percentiles}
+        values = np.percentile(np.fromiter(self.latencies, dtype=np.float64), percentiles)
+        return {f'p{p:g}': float(value) for p, value in zip(percentiles, values)}
+
+    def stats(self) -> dict:
+        """Queue depth, job counters and latency percentiles."""
+        return {
+            'queue_depth': self.queue_depth,
+            'running': self.running,
+            'in_flight': len(self._in_flight),
+            'completed': self.completed,
+            'failed': self.failed,
+            'deduplicated': self.deduplicated,
+            'latency': self.latency_percentiles(),
+        }
+
+    async def close(self) -> None:
+        """Wait for the jobs in flight, then shut the worker processes down."""
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight.values(), return_exceptions=True)
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+
+    async def __aenter__(self) -> 'HarmonizationService':
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+
+def _run_service_job(job: HarmonizationJob) -> bytes:
+    """Harmonize one service job in a worker process."""
+    output = io.BytesIO()
+    worker_harmonizer().harmonize_to_midi(job.melody_path, output, job.style, job.complexity, job.loader)
+    return output.getvalue()
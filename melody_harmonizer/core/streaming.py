@@ -0,0 +1,197 @@
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+import time
+import mido
+from ..styles.style_pack import get_style
+from ..utils.chord_tables import NumeralChord, chord_table
+from ..utils.midi_utils import HARMONY_CHANNEL, DEFAULT_VELOCITY, beat_layout
+from ..utils.music_theory import key_name
+from .analysis import MelodyAnalyzer
+from .voicing import VoicingGenerator, Voicing, voicing_cache
+from .voice_leading import cached_transition_cost, config_token, voicing_cost
+
+
+class StreamingHarmonizer:
+    """
+    Harmonizes a melody while it is being played.
+
+    Notes are fed in one at a time (directly, or as mido messages from a
+    live or virtual port). The key and phrase state are updated
+    incrementally, and when a note calls for a new chord the next voicing is
+    chosen with a single voice-leading step from the previous one, so the
+    work per event is a few cache lookups.
+    """
+
+    def __init__(self,
+                 style: str = 'pop',
+                 tempo: float = 120.0,
+                 time_signature: Tuple[int, int] = (4, 4),
+                 latency_budget: float = 0.005,
+                 analyzer: Optional[MelodyAnalyzer] = None,
+                 voicing_generator: Optional[VoicingGenerator] = None,
+                 warm_up: bool = True,
+                 key_window: Optional[int] = None):
+        """
+        Args:
+            style: Harmonization style ('pop', 'jazz', 'classical', 'blues')
+            tempo: Tempo in quarter notes per minute, used to turn seconds into beats
+            time_signature: (numerator, denominator)
+            latency_budget: Target processing time per event, in seconds
+            analyzer: MelodyAnalyzer to take the incremental analysis from
+            voicing_generator: VoicingGenerator providing configs and candidates
+            warm_up: Build the chords of the style's progressions in all keys
+                up front, so no event pays for it
+            key_window: Estimate the key from only the last key_window
+                measures (follows modulations); None uses the whole melody
+        """
+        self.style = style
+        self.tempo = tempo
+        beats_per_bar, beat_length = beat_layout(*time_signature)
+        self.beat_length = beat_length
+        self.bar_length = beats_per_bar * beat_length
+        self.latency_budget = latency_budget
+        self.key_window = key_window
+
+        self.analyzer = analyzer or MelodyAnalyzer()
+        self.voicing_generator = voicing_generator or VoicingGenerator()
+        self.config = self.voicing_generator.config_for(style)
+        self.progressions = {mode: get_style(style).progression(mode) for mode in ('major', 'minor')}
+
+        self.latencies: Deque[float] = deque(maxlen=1024)
+        self.over_budget = 0
+        self.reset()
+        if warm_up:
+            self.warm_up()
+
+    def reset(self) -> None:
+        """Forget the melody played so far."""
+        self.analysis = self.analyzer.incremental(bar_length=self.bar_length, window=self.key_window)
+        self.clock = 0.0
+        self.current_bar: Optional[int] = None
+        self.current_chord: Optional[NumeralChord] = None
+        self.current_voicing: Optional[Voicing] = None
+        self._sounding: Dict[int, float] = {}  # melody notes held down -> onset
+        self._sounding_chord: Optional[Voicing] = None
+
+    def warm_up(self) -> None:
+        """Build every progression chord in every key ahead of time."""
+        for progression in self.progressions.values():
+            chord_table.build(progression)
+
+    def note_on(self, pitch: int, seconds: float) -> Optional[Voicing]:
+        """
+        Handle a melody note starting at the given time.
+
+        Returns:
+            The voicing of the new chord, or None if the current chord holds
+        """
+        started = time.perf_counter()
+        onset = seconds * self.tempo / 60.0
+        self._sounding[pitch] = onset
+        self.analysis.add_note(pitch, onset)
+
+        voicing = None
+        bar = int(onset // self.bar_length)
+        on_beat = abs(onset / self.beat_length - round(onset / self.beat_length)) < 1e-6
+        fits = self.current_chord is not None and self.current_chord.contains(pitch % 12)
+        if bar != self.current_bar or (on_beat and not fits):
+            self.current_bar = bar
+            self.current_chord = self._choose_chord(pitch, bar)
+            voicing = self._voice(self.current_chord, pitch)
+            self.current_voicing = voicing
+
+        self._record_latency(time.perf_counter() - started)
+        return voicing
+
+    def note_off(self, pitch: int, seconds: float) -> None:
+        """Handle the end of a melody note."""
+        onset = self._sounding.pop(pitch, None)
+        if onset is not None:
+            self.analysis.finish_note(pitch, onset, seconds * self.tempo / 60.0 - onset)
+
+    def process(self, message: mido.Message) -> List[mido.Message]:
+        """
+        Handle one incoming MIDI message (its time is the delta in seconds, as
+        delivered by mido input ports) and return the harmony messages to send.
+        """
+        self.clock += message.time
+        if message.type == 'note_on' and message.velocity > 0:
+            voicing = self.note_on(message.note, self.clock)
+            if voicing is not None:
+                return self._chord_change(voicing)
+        elif message.type in ('note_on', 'note_off'):
+            self.note_off(message.note, self.clock)
+        return []
+
+    def run(self,
+            input_port: mido.ports.BaseInput,
+            output_port: mido.ports.BaseOutput,
+            should_stop: Callable[[], bool] = lambda: False,
+            poll_interval: float = 0.001) -> None:
+        """Harmonize messages from input_port to output_port until should_stop() is true."""
+        previous = time.perf_counter()
+        while not should_stop():
+            for message in input_port.iter_pending():
+                now = time.perf_counter()
+                for out in self.process(message.copy(time=now - previous)):
+                    output_port.send(out)
+                previous = now
+            time.sleep(poll_interval)
+        for out in self.all_notes_off():
+            output_port.send(out)
+
+    def all_notes_off(self) -> List[mido.Message]:
+        """Messages releasing the chord that is currently sounding."""
+        messages = [mido.Message('note_off', channel=HARMONY_CHANNEL, note=p)
+                    for p in self._sounding_chord or ()]
+        self._sounding_chord = None
+        return messages
+
+    def latency_stats(self) -> Dict[str, float]:
+        """Worst and median processing time of recent note events, and how often the budget was exceeded."""
+        ordered = sorted(self.latencies)
+        if not ordered:
+            return {'max': 0.0, 'median': 0.0, 'over_budget': 0}
+        return {'max': ordered[-1], 'median': ordered[len(ordered) // 2], 'over_budget': self.over_budget}
+
+    def _choose_chord(self, pitch: int, bar: int) -> NumeralChord:
+        """The bar's progression chord, or another chord of the progression containing the note."""
+        tonic, mode = self.analysis.key
+        current_key = key_name(tonic, mode)
+        progression = self.progressions[mode]
+        scheduled = progression[bar % len(progression)]
+        for numeral in [scheduled] + progression:
+            chord_obj = chord_table.get(numeral, current_key)
+            if chord_obj.contains(pitch % 12):
+                return chord_obj
+        return chord_table.get(scheduled, current_key)
+
+    def _voice(self, chord_obj: NumeralChord, melody_midi: int) -> Voicing:
+        """Voice a chord under the melody note with one voice-leading step from the last voicing."""
+        pitches, root = chord_obj.midi, chord_obj.root
+        generator = self.voicing_generator
+        chord_type = generator.determine_chord_type_midi(pitches, root)
+        extensions = tuple(generator.style_extensions.get(self.style, {}).get(chord_type, []))
+        cache_key = (pitches, root, chord_type, extensions, self.config, melody_midi)
+        candidates = voicing_cache.get(cache_key)
+        if candidates is None:
+            candidates = generator.voicing_candidates(pitches, root, chord_type, self.style, self.config, melody_midi)
+            voicing_cache.put(cache_key, candidates)
+
+        if self.current_voicing is None:
+            return min(candidates, key=lambda v: voicing_cost(v, self.config, melody_midi))
+        token = config_token(self.config)
+        return min(candidates, key=lambda v: cached_transition_cost(self.current_voicing, v, self.config, token)
+                   + voicing_cost(v, self.config, melody_midi))
+
+    def _chord_change(self, voicing: Voicing) -> List[mido.Message]:
+        messages = self.all_notes_off()
+        messages += [mido.Message('note_on', channel=HARMONY_CHANNEL, note=p, velocity=DEFAULT_VELOCITY)
+                     for p in voicing]
+        self._sounding_chord = voicing
+        return messages
+
+    def _record_latency(self, elapsed: float) -> None:
+        self.latencies.append(elapsed)
+        if elapsed > self.latency_budget:
+            self.over_budget += 1
@@ -0,0 +1,192 @@
+from typing import Dict, List, Optional, Sequence, Tuple, TYPE_CHECKING
+import numpy as np
+from .voice_leading import candidate_voicings, transition_cost
+
+if TYPE_CHECKING:
+    from .voicing import VoicingConfig
+
+# Padding for chords with fewer voices than the widest chord (a rest is all MISSING)
+MISSING = -1
+
+# Kinds of violation validate_voicings reports
+VIOLATION_KINDS = ('fifths', 'octaves', 'crossing', 'overlap', 'spacing')
+
+# One record per violation
+VIOLATION_DTYPE = np.dtype([
+    ('kind', 'U8'),         # one of VIOLATION_KINDS
+    ('chord', np.int32),    # chord index (for fifths, octaves and overlap: the second chord of the pair)
+    ('lower', np.int16),    # lower voice involved (0 is the bass)
+    ('upper', np.int16),    # upper voice involved
+])
+
+
+def voicing_matrix(voicings: Sequence[Optional[Sequence[int]]]) -> np.ndarray:
+    """
+    Stack voicings into a (chords, voices) matrix of MIDI numbers, lowest voice first.
+
+    Chords with fewer voices are padded with MISSING above their top voice;
+    None (a rest) becomes a row of MISSING.
+    """
+    width = max((len(v) for v in voicings if v is not None), default=0)
+    matrix = np.full((len(voicings), width), MISSING, dtype=np.int16)
+    for i, voicing in enumerate(voicings):
+        if voicing is not None:
+            matrix[i, :len(voicing)] = voicing
+    return matrix
+
+
+def violation_masks(matrix: np.ndarray, min_spacing: int, max_spacing: int) -> Dict[str, np.ndarray]:
+    """
+    Flag every violation of a voiced progression at once.
+
+    Works on a (..., chords, voices) matrix, so a batch of progressions
+    can be checked in one call. Voice pairs are the columns of
+    np.triu_indices(voices, 1).
+
+    Returns:
+        kind -> boolean array: 'fifths' and 'octaves' are (..., chords - 1,
+        pairs), where the pair moves in parallel into the chord after that
+        index; 'crossing' and 'spacing' are (..., chords, voices - 1) and
+        'overlap' is (..., chords - 1, voices - 1), for each voice and the
+        one above it.
+    """
+    matrix = matrix.astype(np.int32)
+    present = matrix != MISSING
+
+    # parallel fifths/octaves: a perfect interval kept while both voices move the same way
+    lower, upper = np.triu_indices(matrix.shape[-1], 1)
+    pair_present = present[..., lower] & present[..., upper]
+    interval = (matrix[..., upper] - matrix[..., lower]) % 12
+    lower_motion = np.diff(matrix[..., lower], axis=-2)
+    upper_motion = np.diff(matrix[..., upper], axis=-2)
+    parallel = (pair_present[..., :-1, :] & pair_present[..., 1:, :]
+                & (interval[..., :-1, :] == interval[..., 1:, :])
+                & (lower_motion != 0) & (np.sign(lower_motion) == np.sign(upper_motion)))
+    previous_interval = interval[..., :-1, :]
+
+    # neighbouring voices within a chord, and from one chord to the next
+    adjacent = present[..., :-1] & present[..., 1:]
+    gaps = matrix[..., 1:] - matrix[..., :-1]
+    moving = adjacent[..., :-1, :] & adjacent[..., 1:, :]
+    overlap = moving & ((matrix[..., 1:, :-1] > matrix[..., :-1, 1:]) | (matrix[..., 1:, 1:] < matrix[..., :-1, :-1]))
+
+    return {
+        'fifths': parallel & (previous_interval == 7),
+        'octaves': parallel & (previous_interval == 0),
+        'crossing': adjacent & (gaps < 0),
+        'overlap': overlap,
+        'spacing': adjacent & (gaps >= 0) & ((gaps < min_spacing) | (gaps > max_spacing)),
+    }
+
+
+def validate_voicings(matrix: np.ndarray, config: 'VoicingConfig') -> np.ndarray:
+    """
+    Check a voiced progression for parallel fifths/octaves, voice crossing,
+    voice overlap and spacing outside the config's limits.
+
+    Overlap (a voice moving past where its neighbour was) is only reported
+    when config.voice_crossing is off, like its penalty in the voice-leading
+    search.
+
+    Args:
+        matrix: (chords, voices) matrix from voicing_matrix
+        config: Voicing configuration (spacing limits, voice_crossing)
+
+    Returns:
+        Array of VIOLATION_DTYPE records ordered by chord
+    """
+    masks = violation_masks(matrix, config.min_spacing, config.max_spacing)
+    lower, upper = np.triu_indices(matrix.shape[-1], 1)
+
+    parts = []
+    for kind, mask in masks.items():
+        if kind == 'overlap' and config.voice_crossing:
+            continue
+        chords, columns = np.nonzero(mask)
+        records = np.zeros(len(chords), dtype=VIOLATION_DTYPE)
+        records['kind'] = kind
+        if kind in ('fifths', 'octaves'):
+            records['chord'] = chords + 1
+            records['lower'] = lower[columns]
+            records['upper'] = upper[columns]
+        else:
+            records['chord'] = chords + 1 if kind == 'overlap' else chords
+            records['lower'] = columns
+            records['upper'] = columns + 1
+        parts.append(records)
+
+    report = np.concatenate(parts) if parts else np.zeros(0, dtype=VIOLATION_DTYPE)
+    return report[np.argsort(report['chord'], kind='stable')]
+
+
+def violation_counts(report: np.ndarray) -> Dict[str, int]:
+    """Number of violations of each kind in a report."""
+    return {kind: int(np.count_nonzero(report['kind'] == kind)) for kind in VIOLATION_KINDS}
+
+
+def repair_voicings(voicings: Sequence[Optional[Tuple[int, ...]]],
+                    config: 'VoicingConfig',
+                    melody_midis: Optional[Sequence[Optional[int]]] = None,
+                    passes: int = 2) -> Tuple[List[Optional[Tuple[int, ...]]], np.ndarray]:
+    """
+    Revoice the chords involved in violations.
+
+    Every chord named in the report is compared with all its candidate
+    voicings (see candidate_voicings; the root stays in the bass and the
+    top voice under the melody note), each checked against its neighbours
+    in one batched violation_masks call. The chord takes the candidate
+    with the fewest violations, the smoothest voice leading breaking ties,
+    if that has fewer violations than the current voicing. Chords that are
+    fine are left alone.
+
+    Args:
+        voicings: Voiced progression (None for rests)
+        config: Voicing configuration
+        melody_midis: Optional melody note above each chord
+        passes: Maximum number of validate/repair rounds
+
+    Returns:
+        (repaired voicings, report of the violations that remain)
+    """
+    voiced = list(voicings)
+    report = validate_voicings(voicing_matrix(voiced), config)
+    for _ in range(passes):
+        if not len(report):
+            break
+        changed = False
+        for i in np.unique(report['chord']).tolist():
+            current = voiced[i]
+            if current is None:
+                continue
+            previous = voiced[i - 1] if i > 0 else None
+            following = voiced[i + 1] if i + 1 < len(voiced) else None
+            melody_midi = melody_midis[i] if melody_midis is not None else None
+            options = [current] + [v for v in candidate_voicings(current, current[0], config, melody_midi)
+                                   if v != current]
+
+            counts = _window_violations(previous, options, following, config)
+            costs = [(transition_cost(previous, v, config) if previous is not None else 0.0)
+                     + (transition_cost(v, following, config) if following is not None else 0.0)
+                     for v in options]
+            best = min(range(len(options)), key=lambda k: (counts[k], costs[k]))
+            if counts[best] < counts[0]:
+                voiced[i] = options[best]
+                changed = True
+        if not changed:
+            break
+        report = validate_voicings(voicing_matrix(voiced), config)
+    return voiced, report
+
+
+def _window_violations(previous: Optional[Tuple[int, ...]],
+                       options: List[Tuple[int, ...]],
+                       following: Optional[Tuple[int, ...]],
+                       config: 'VoicingConfig') -> List[int]:
+    """Violations of each option as the middle chord between previous and following."""
+    rows = [row for option in options for row in (previous, option, following)]
+    matrix = voicing_matrix(rows).reshape(len(options), 3, -1)
+    masks = violation_masks(matrix, config.min_spacing, config.max_spacing)
+    if config.voice_crossing:
+        del masks['overlap']
+    total = sum(mask.reshape(len(options), -1).sum(axis=1) for mask in masks.values())
+    return total.tolist()
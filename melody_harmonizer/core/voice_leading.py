@@ -0,0 +1,255 @@
+from typing import Dict, List, Optional, Sequence, Tuple, TYPE_CHECKING
+import bisect
+import heapq
+import numpy as np
+from ..utils.cache import LRUCache
+
+if TYPE_CHECKING:
+    from .voicing import VoicingConfig
+
+# Transition cost weights (motion is measured in semitones)
+PARALLEL_PENALTY = 8.0
+CROSSING_PENALTY = 6.0
+SIMILAR_MOTION_PENALTY = 4.0
+MELODY_GAP_WEIGHT = 0.25
+RANGE_CENTRE_WEIGHT = 0.1
+
+# Intervals (mod 12) that may not move in parallel: unisons/octaves and fifths
+PERFECT_INTERVALS = (0, 7)
+
+# Transition costs shared by every search in this process
+transition_cache = LRUCache(maxsize=1 << 16)
+
+# Voicing lattices per (chord shape, range, spacing), shared by every chord in this process
+lattice_cache = LRUCache(maxsize=1024)
+
+# Small integer standing in for each config in transition_cache keys, since
+# hashing a whole VoicingConfig costs more than the cost function itself
+_config_tokens: Dict['VoicingConfig', int] = {}
+
+
+class VoicingLattice:
+    """
+    Every voicing of one chord shape allowed by a range and spacing.
+
+    The voicings are the rows of an array sorted by top note, then bass
+    note, so the voicings that fit under a melody note are a prefix of it,
+    found by binary search. Selections come back in enumeration order
+    (bass, then the upper voices' octaves, lowest first), the order the
+    voice-leading search breaks ties in; the selection for each prefix is
+    kept, so repeated melody notes are a table lookup.
+    """
+    __slots__ = ('voicings', 'tops', 'basses', 'ranks', '_tuples', '_top_list', '_prefixes')
+
+    def __init__(self, voicings: np.ndarray):
+        """
+        Args:
+            voicings: (n, voices) array of MIDI numbers in enumeration order
+        """
+        tops = voicings.max(axis=1) if len(voicings) else np.zeros(0, dtype=voicings.dtype)
+        order = np.lexsort((np.arange(len(voicings)), voicings[:, 0], tops))
+        self.voicings = voicings[order]
+        self.tops = tops[order]
+        self.basses = self.voicings[:, 0]
+        self.ranks = order  # enumeration index of each row
+        self._tuples = [tuple(v) for v in voicings.tolist()]
+        self._top_list = self.tops.tolist()  # bisect on a list beats numpy calls at these sizes
+        self._prefixes: Dict[int, List[Tuple[int, ...]]] = {}
+
+    def __len__(self) -> int:
+        return len(self.voicings)
+
+    def select(self, max_top: Optional[int] = None, bass: Optional[int] = None) -> List[Tuple[int, ...]]:
+        """
+        Voicings whose top note is at most max_top and, if given, with that bass note.
+
+        Returns:
+            List of voicings in enumeration order
+        """
+        count = len(self._top_list) if max_top is None else bisect.bisect_right(self._top_list, max_top)
+        if bass is not None:
+            ranks = self.ranks[:count][self.basses[:count] == bass]
+            return [self._tuples[i] for i in np.sort(ranks).tolist()]
+        prefix = self._prefixes.get(count)
+        if prefix is None:
+            prefix = self._prefixes[count] = [self._tuples[i] for i in np.sort(self.ranks[:count]).tolist()]
+        return list(prefix)
+
+
+def build_lattice(root_class: int,
+                  upper_classes: Tuple[int, ...],
+                  low: int,
+                  high: int,
+                  min_spacing: int,
+                  max_spacing: int) -> VoicingLattice:
+    """
+    Enumerate every voicing of a chord shape (see candidate_voicings) into a lattice.
+
+    Args:
+        root_class: Pitch class of the root (always in the bass)
+        upper_classes: Sorted pitch classes of the other voices
+        low, high: Range every voice must lie in (MIDI numbers)
+        min_spacing, max_spacing: Allowed distance between neighbouring voices
+    """
+    options = [np.arange(low + (pc - low) % 12, high + 1, 12) for pc in (root_class,) + upper_classes]
+    grid = np.stack(np.meshgrid(*options, indexing='ij'), axis=-1).reshape(-1, len(options))
+    voicings = np.concatenate((grid[:, :1], np.sort(grid[:, 1:], axis=1)), axis=1)
+    gaps = np.diff(voicings, axis=1)
+    legal = ((gaps >= min_spacing) & (gaps <= max_spacing)).all(axis=1)
+    return VoicingLattice(voicings[legal])
+
+
+def voicing_lattice(root_class: int, upper_classes: Tuple[int, ...], config: 'VoicingConfig') -> VoicingLattice:
+    """The (cached) lattice of a chord shape under a config's range and spacing."""
+    low, high = config.preferred_range
+    key = (root_class, upper_classes, low, high, config.min_spacing, config.max_spacing)
+    return lattice_cache.get_or_compute(key, lambda: build_lattice(root_class, upper_classes, *key[2:]))
+
+
+def candidate_voicings(pitches: Sequence[int],
+                       root: int,
+                       config: 'VoicingConfig',
+                       melody_midi: Optional[int] = None) -> List[Tuple[int, ...]]:
+    """
+    List every voicing of a chord allowed by the config.
+
+    Each pitch class of the chord is used exactly once, the root is in the
+    bass, every voice lies inside config.preferred_range, neighbouring voices
+    are between min_spacing and max_spacing apart and, when a melody note is
+    given, the top voice does not go above it. The voicings come from the
+    chord shape's precomputed VoicingLattice.
+
+    Args:
+        pitches: MIDI pitches of the chord (octaves are ignored)
+        root: MIDI root of the chord
+        config: Voicing configuration
+        melody_midi: Optional MIDI number of the melody note above the chord
+
+    Returns:
+        List of voicings (tuples of MIDI numbers, lowest voice first)
+    """
+    root_class = root % 12
+    upper_classes = tuple(sorted({p % 12 for p in pitches} - {root_class}))
+    return voicing_lattice(root_class, upper_classes, config).select(melody_midi)
+
+
+def transition_cost(prev: Sequence[int], curr: Sequence[int], config: 'VoicingConfig') -> float:
+    """
+    Cost of moving from one voicing to the next.
+
+    Sums the semitone motion of the voices, and penalises parallel
+    fifths/octaves, voice overlap/crossing (unless config.voice_crossing)
+    and similar motion of more than config.parallel_threshold of the voices.
+    """
+    if len(prev) == len(curr):
+        cost = float(sum(abs(b - a) for a, b in zip(prev, curr)))
+    else:
+        # different numbers of voices: each voice moves to its nearest neighbour
+        cost = (sum(min(abs(b - a) for a in prev) for b in curr) +
+                sum(min(abs(b - a) for b in curr) for a in prev)) / 2.0
+
+    voices = min(len(prev), len(curr))
+    moves = [curr[i] - prev[i] for i in range(voices)]
+
+    for i in range(voices):
+        for j in range(i + 1, voices):
+            if (moves[i] != 0 and moves[i] == moves[j]
+                    and (prev[j] - prev[i]) % 12 in PERFECT_INTERVALS):
+                cost += PARALLEL_PENALTY
+
+    if not config.voice_crossing:
+        for i in range(voices - 1):
+            if curr[i] > prev[i + 1] or curr[i + 1] < prev[i]:
+                cost += CROSSING_PENALTY
+
+    if voices > 1:
+        up = sum(1 for m in moves if m > 0)
+        down = sum(1 for m in moves if m < 0)
+        if max(up, down) / voices > config.parallel_threshold:
+            cost += SIMILAR_MOTION_PENALTY
+
+    return cost
+
+
+def cached_transition_cost(prev: Tuple[int, ...], curr: Tuple[int, ...], config: 'VoicingConfig', token: int) -> float:
+    """transition_cost looked up in (or added to) transition_cache; token is config_token(config)."""
+    key = (token, prev, curr)
+    cost = transition_cache.get(key)
+    if cost is None:
+        cost = transition_cost(prev, curr, config)
+        transition_cache.put(key, cost)
+    return cost
+
+
+def config_token(config: 'VoicingConfig') -> int:
+    """Interned integer identifying a config in cache keys."""
+    return _config_tokens.setdefault(config, len(_config_tokens))
+
+
+def voicing_cost(voicing: Sequence[int], config: 'VoicingConfig', melody_midi: Optional[int] = None) -> float:
+    """Cost of a voicing on its own: keeps it close under the melody, or central in the range."""
+    if melody_midi is not None:
+        return MELODY_GAP_WEIGHT * abs(melody_midi - voicing[-1])
+    centre = sum(config.preferred_range) / 2.0
+    return RANGE_CENTRE_WEIGHT * abs(sum(voicing) / len(voicing) - centre)
+
+
+def solve_voice_leading(candidates: Sequence[Sequence[Tuple[int, ...]]],
+                        config: 'VoicingConfig',
+                        melody_midis: Optional[Sequence[Optional[int]]] = None,
+                        beam_width: Optional[int] = None) -> List[Tuple[int, ...]]:
+    """
+    Choose one voicing per chord minimising the total voice-leading cost.
+
+    This is a Viterbi search over the candidate voicings of each chord. Only
+    the beam_width cheapest partial paths are kept after each chord, so the
+    running time is linear in the number of chords; a beam at least as wide
+    as the largest candidate list gives the exact optimum.
+
+    Args:
+        candidates: Candidate voicings for each chord (each list non-empty)
+        config: Voicing configuration used for transition costs
+        melody_midis: Optional melody MIDI number (or None) for each chord
+        beam_width: Partial paths kept per chord (defaults to config.beam_width)
+
+    Returns:
+        The chosen voicing for each chord
+
+    Raises:
+        ValueError: If beam_width is less than 1
+    """
+    if not candidates:
+        return []
+    if beam_width is None:
+        beam_width = config.beam_width
+    if beam_width < 1:
+        raise ValueError(f"beam_width must be at least 1, got {beam_width}")
+    melody_midis = melody_midis or [None] * len(candidates)
+    token = config_token(config)
+
+    # beam entries are (cumulative cost, candidate index); backpointers per step
+    beam = [(voicing_cost(v, config, melody_midis[0]), i) for i, v in enumerate(candidates[0])]
+    beam = heapq.nsmallest(beam_width, beam)
+    backpointers: List[List[int]] = []
+
+    for step in range(1, len(candidates)):
+        prev_candidates = candidates[step - 1]
+        scored = []
+        pointers = []
+        for i, voicing in enumerate(candidates[step]):
+            best_cost, best_prev = min(
+                (cost + cached_transition_cost(prev_candidates[j], voicing, config, token), j)
+                for cost, j in beam)
+            scored.append((best_cost + voicing_cost(voicing, config, melody_midis[step]), i))
+            pointers.append(best_prev)
+        backpointers.append(pointers)
+        beam = heapq.nsmallest(beam_width, scored)
+
+    # walk the backpointers from the cheapest final state
+    index = min(beam)[1]
+    path = [candidates[-1][index]]
+    for step in range(len(candidates) - 1, 0, -1):
+        index = backpointers[step - 1][index]
+        path.append(candidates[step - 1][index])
+    path.reverse()
+    return path
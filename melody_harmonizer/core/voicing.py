@@ -1,11 +1,33 @@
-from typing import List, Dict, Optional, Tuple
-from music21 import chord, note, pitch, interval
+from __future__ import annotations
+from typing import List, Dict, Optional, Tuple, Sequence
+import copy
 from dataclasses import dataclass
 import logging 
+import numpy as np
+from .voice_leading import candidate_voicings, lattice_cache, solve_voice_leading, transition_cost, transition_cache
+from .validation import repair_voicings, validate_voicings, voicing_matrix
+from ..utils.cache import LRUCache
+from ..styles.style_pack import get_style, style_extensions, voicing_configs
+from ..utils.lazy import lazy_import
 
-@dataclass
+chord = lazy_import('music21.chord')
+note = lazy_import('music21.note')
+pitch = lazy_import('music21.pitch')
+interval = lazy_import('music21.interval')
+
+# A voicing is a tuple of MIDI note numbers, lowest voice first
+Voicing = Tuple[int, ...]
+
+# Pitch classes above the root for each chord type determine_chord_type recognises
+CHORD_TYPE_INTERVALS = {
+    frozenset((0, 4, 7)): 'major',
+    frozenset((0, 3, 7)): 'minor',
+    frozenset((0, 4, 7, 10)): 'dominant',
+}
+
+@dataclass(frozen=True)
 class VoicingConfig:
-    """Configuration for chord voicing."""
+    """Configuration for chord voicing (immutable, so it can be part of cache keys)."""
     voicing_style: str = 'default'
     voicing_complexity: str = 'simple'
     voicing_range: str = 'C3-C5'
@@ -15,63 +37,104 @@ class VoicingConfig:
     voicing_bass: bool = False
     voicing_bass_octave: int = 3
     max_spacing: int = 12
-    min_spaciing: int = 2
+    min_spacing: int = 2
     preferred_range : Tuple[int, int] = (48, 72) #MIDI Note range (C3 - C5)
     preferred_bass_range: Tuple[int, int] = (36, 48)
     voice_crossing: bool = False
     parallel_threshold: float = 0.8 
+    beam_width: int = 16 # partial paths kept per chord by the voice-leading search
+
+    def __post_init__(self):
+        if self.beam_width < 1:
+            raise ValueError(f"beam_width must be at least 1, got {self.beam_width}")
+
+
+# Candidate voicings per (chord, extensions, config, melody note), shared by
+# every VoicingGenerator in this process so repeated chords are voiced once
+voicing_cache = LRUCache(maxsize=4096)
 
 
 class VoicingGenerator: 
     "Handles Generation of Chord Voicings based on different styles"
     
     def __init__(self):
-        self.style_configs = {
-            'pop': VoicingConfig(max_spacing = 12, min_spacing = 3, preferred_range = (48, 72), preferred_bass_range = (36, 48), voice_crossing = False),
-            'jazz': VoicingConfig(max_spacing = 10, min_spacing = 2, preferred_range = (48, 72), preferred_bass_range = (36, 48), voice_crossing = True),
-            'rock': VoicingConfig(max_spacing = 12, min_spacing = 3, preferred_range = (48, 72), preferred_bass_range = (36, 48), voice_crossing = True),
-            'classical': VoicingConfig(max_spacing = 16, min_spacing = 2, preferred_range = (48, 72), preferred_bass_range = (36, 48), voice_crossing = False),
-            'blues': VoicingConfig(max_spacing = 12, min_spacing = 3, preferred_range = (48, 72), preferred_bass_range = (36, 48), voice_crossing = True),
-            'country': VoicingConfig(max_spacing = 12, min_spacing = 3, preferred_range = (48, 72), preferred_bass_range = (36, 48), voice_crossing = True),
-            'latin': VoicingConfig(max_spacing = 12, min_spacing = 3, preferred_range = (48, 72), preferred_bass_range = (36, 48), voice_crossing = True),
-            'hiphop': VoicingConfig(max_spacing = 12, min_spacing = 3, preferred_range = (48, 72), preferred_bass_range = (36, 48), voice_crossing = True),
-        }
-        
-        # defining the chord extensions for each style
-        self.style_extensions = {
-            'pop': {'major': [], 'minor': [], 'dominant': [7]},
-            'jazz': {'major': [11], 'minor': [10], 'dominant': [7, 11]},
-            'classical': {'major': [], 'minor': [], 'dominant': []},
-            'blues': {'major': [7], 'minor': [7], 'dominant': [7, 9]},
-        }
-        
+        # shared views of the registered style packs (see styles/style_pack)
+        self.style_configs = voicing_configs()
+        self.style_extensions = style_extensions()
+
+    def config_for(self, style: str) -> VoicingConfig:
+        """
+        Voicing config of a registered style.
+
+        Raises:
+            ValueError: If no style of that name is registered
+        """
+        return get_style(style).voicing
+
+    def apply_voicing(self, chords: List[chord.Chord], style: str = 'pop', melody_notes: Optional[List[note.Note]] = None) -> List[chord.Chord]:
+        """Apply voicing to a list of chords, choosing the voicings with the smoothest voice leading (repaired where they break the style's rules)."""
+        voiced_chords = list(chords)
+        for i, spelling, voicing in zip(*self._voice_chords(chords, style, melody_notes)):
+            voiced_chord = voicing_to_chord(voicing, spelling)
+            voiced_chord.quarterLength = chords[i].quarterLength
+            voiced_chords[i] = voiced_chord
+            
+        return voiced_chords
+    
+    def apply_voicing_midi(self, chords: List[chord.Chord], style: str = 'pop', melody_notes: Optional[List[note.Note]] = None) -> List[Optional[Voicing]]:
+        """Like apply_voicing, but return the voicings as MIDI tuples (None for rests) without building chords."""
+        voicings: List[Optional[Voicing]] = [None] * len(chords)
+        for i, _, voicing in zip(*self._voice_chords(chords, style, melody_notes)):
+            voicings[i] = voicing
+        return voicings
     
-    def apply_voicing(self, chord_type: List[chord.Chord], style: str = 'pop', melody: List[note.Note] = None) -> List[chord.Chord]:
-        """Apply voicing to a list of chords."""
-        config = self.style_confights[style]
-        voiced_chords = []
-        prev_chord = None
+    def _voice_chords(self, chords: List[chord.Chord], style: str, melody_notes: Optional[List[note.Note]]) -> Tuple[List[int], List[Dict[int, str]], List[Voicing]]:
+        """Voice the chords in the list; returns their positions, spellings and chosen voicings."""
+        config = self.config_for(style)
         
-        for i, current_chord in enumerate(chord_type):
-            melody_note = melody_notes[i] if melody_notes else None
-            
-            chord_type = self.determine_chord_type(current_chord)
-            extended_cord = self.add_extensions(current_chord, chord_type, style)
-            
-            voiced_chord = self.generate_voicing(extended_cord, config, melody_note)
+        # everything between here and the output boundary works on plain MIDI numbers
+        positions = []
+        spellings = []
+        melody_midis = []
+        candidates = []
+        for i, current_chord in enumerate(chords):
+            # rests (and anything else that is not a chord) pass through untouched
+            if not isinstance(current_chord, chord.Chord):
+                continue
             
-            # apply voice leading if there is a previous chord 
-            if prev_chord:
-                voiced_chord = self.apply_voice_leading(prev_chord, voiced_chord, config)
+            melody_midi = _melody_midi(melody_notes[i]) if melody_notes else None
             
-            voiced_chords.append(voiced_chord)
-            previous_chord = voiced_chord
+            pitches, root, spelling = chord_to_midi(current_chord)
+            chord_type = self.determine_chord_type_midi(pitches, root)
+            extensions = tuple(self.style_extensions.get(style, {}).get(chord_type, []))
+            key = (pitches, root, chord_type, extensions, config, melody_midi)
+            chord_candidates = voicing_cache.get(key)
+            if chord_candidates is None:
+                chord_candidates = self.voicing_candidates(pitches, root, chord_type, style, config, melody_midi)
+                voicing_cache.put(key, chord_candidates)
             
-        return voiced_chords
+            positions.append(i)
+            spellings.append(spelling)
+            melody_midis.append(melody_midi)
+            candidates.append(chord_candidates)
+        
+        # the search only penalizes rule violations, so revoice the chords the validator still flags
+        voicings = solve_voice_leading(candidates, config, melody_midis)
+        voicings, _ = repair_voicings(voicings, config, melody_midis)
+        return positions, spellings, voicings
     
-    def generate_voicing(self, chord_type: str, config: VoicingConfig) -> List[chord.Chord]:
-        """Generate voicings for a given chord type."""
-        pass
+    def voicing_candidates(self, pitches: Voicing, root: int, chord_type: str, style: str, config: VoicingConfig, melody_midi: Optional[int] = None) -> Tuple[Voicing, ...]:
+        """Extend a chord for the style and list its candidate voicings (the greedy voicing always included)."""
+        extended = self.add_extensions_midi(pitches, chord_type, style)
+        greedy = self.generate_voicing_midi(extended, root, config, melody_midi)
+        candidates = candidate_voicings(extended, root, config, melody_midi)
+        if greedy not in candidates:
+            candidates.append(greedy)
+        return tuple(candidates)
+    
+    def cache_info(self) -> Dict[str, Dict[str, int]]:
+        """Hit/miss counters and sizes of the process-wide voicing, lattice and transition caches."""
+        return {'voicings': voicing_cache.info(), 'lattices': lattice_cache.info(), 'transitions': transition_cache.info()}
     
     def determine_chord_type(self, ch: chord.Chord) -> str:
         """Determine the chord type from a chord object."""
@@ -86,7 +149,7 @@ class VoicingGenerator:
             return 'major'
         
     def add_extensions(self, ch: chord.Chord, chord_type : str, style : str) -> chord.Chord:
-        extensions = self.style_extensions[style][chord_type]
+        extensions = self.style_extensions.get(style, {}).get(chord_type, [])
         base_notes =  [p.midi for p in ch.pitches]
         root = base_notes[0]
         
@@ -109,7 +172,9 @@ class VoicingGenerator:
     def generate_voicing(self, ch: chord.Chord, config: VoicingConfig, melody_note: Optional[note.Note] = None) -> chord.Chord:
         "Generate initial voicing for chord"
         
-        root = ch.root()
+        root = copy.deepcopy(ch.root())
+        if root.octave is None:
+            root.octave = root.implicitOctave
         while root.midi < config.preferred_range[0]:
             root.octave +=1
         while root.midi > config.preferred_range[1]:
@@ -117,7 +182,7 @@ class VoicingGenerator:
         
 
         voiced_notes = [root]
-        remaining_notes = sorted([p for p in ch.pitches if p.name != root.name], key=lambda p: p.midi)
+        remaining_notes = sorted([copy.deepcopy(p) for p in ch.pitches if p.name != root.name], key=lambda p: p.midi)
         
         # add the remaining notes to the voicing, making sure they are in the correct octave
         for note_to_add in remaining_notes:
@@ -126,14 +191,14 @@ class VoicingGenerator:
             voiced_notes.append(note_to_add)
         
         # if the melody note is provided, we need to adjust the voicing to fit the melody note by making sure its the highest note in the chord
-        if melody_note:
-            while voiced_notes[-1].midi < melody_note.pitch.midi:
+        if isinstance(melody_note, note.Note):
+            while voiced_notes[-1].midi > melody_note.pitch.midi:
                 voiced_notes[-1].octave -= 1
         return chord.Chord(voiced_notes)
     
-    def find_best_octave(self, note_to_add: pitch.Pitch, prev_note: pitch.Pith, config: VoicingConfig) -> int:
+    def find_best_octave(self, note_to_add: pitch.Pitch, prev_note: pitch.Pitch, config: VoicingConfig) -> int:
         
-        curr_octave = prev_note.octave
+        curr_octave = note_to_add.octave if note_to_add.octave is not None else note_to_add.implicitOctave
         interval_semitones = interval.Interval(prev_note, note_to_add).semitones
         
         while interval_semitones < config.min_spacing:
@@ -147,48 +212,164 @@ class VoicingGenerator:
         return curr_octave
 
     def apply_voice_leading(self, prev_chord: chord.Chord, current_chord: chord.Chord, config: VoicingConfig) -> chord.Chord:
-        """Apply voice leading to the current chord based on the previous chord."""
-        pass
-    
-    def fix_parallel_motion(self, prev_chord : chord.Chord, curr_chord: chord.Chord) -> chord.Chord:
+        """Revoice the current chord to move as smoothly as possible from the previous chord."""
+        prev_voicing = tuple(p.midi for p in prev_chord.pitches)
+        pitches, root, spelling = chord_to_midi(current_chord)
+        options = candidate_voicings(pitches, root, config) or [tuple(sorted(pitches))]
+        best = min(options, key=lambda v: transition_cost(prev_voicing, v, config))
         
-        "Adjust voicing to avoid parallell motion"
+        voiced_chord = voicing_to_chord(best, spelling)
+        voiced_chord.duration = copy.deepcopy(current_chord.duration)
+        return voiced_chord
+    
+    def fix_parallel_motion(self, prev_chord: chord.Chord, curr_chord: chord.Chord, config: Optional[VoicingConfig] = None) -> chord.Chord:
+        """Revoice the current chord to avoid parallel fifths/octaves (and other violations) from the previous chord."""
+        config = config or self.style_configs['pop']
+        prev_voicing = tuple(sorted(p.midi for p in prev_chord.pitches))
+        pitches, root, spelling = chord_to_midi(curr_chord)
+        voicing = tuple(sorted(pitches, key=lambda p: (p != root, p)))  # root in the bass, as candidates have it
+        (_, repaired), _ = repair_voicings([prev_voicing, voicing], config)
+        if repaired == voicing:
+            return curr_chord
 
-        for i in range(1, len(curr_chord.pitches)):
-            original_pitch = curr_chord.pitches[i].midi 
-            
-            for step in [-2, -1, 1, 2]:
-                curr_chord.pitches[i].midi = original_pitch + step
-                if not self.is_parallel_motion(prev_chord.pitches[i], original_pitch):
-                    return curr_chord
-            
-            curr_chord.pitches[i].midi = original_pitch
-        
-        return curr_chord
+        voiced_chord = voicing_to_chord(repaired, spelling)
+        voiced_chord.duration = copy.deepcopy(curr_chord.duration)
+        return voiced_chord
+
+    def validate(self, voicings: Sequence[Optional[Voicing]], style: str = 'pop') -> np.ndarray:
+        """Violations (see validation.validate_voicings) of a voiced progression under the style's config."""
+        config = self.config_for(style)
+        return validate_voicings(voicing_matrix(voicings), config)
+
+    def repair(self,
+               voicings: Sequence[Optional[Voicing]],
+               style: str = 'pop',
+               melody_midis: Optional[Sequence[Optional[int]]] = None) -> List[Optional[Voicing]]:
+        """Revoice the chords of a progression that break the style's voice-leading rules (see validation.repair_voicings)."""
+        config = self.config_for(style)
+        return repair_voicings(voicings, config, melody_midis)[0]
     
     def minimize_voice_movement(self, prev_chord : chord.Chord, curr_chord: chord.Chord, config: VoicingConfig) -> chord.Chord:
         """ Minimize movement between voices in consecutive chords"""
         
-        for i in range(len(curr_chord.pitches)):
-            curr_pitch = curr_chord.pitches[i]
-            target_pitch = prev_chord.pitches[i]
-            
+        voicing = self.minimize_voice_movement_midi(
+            [p.midi for p in prev_chord.pitches], [p.midi for p in curr_chord.pitches], config)
+        for p, midi in zip(curr_chord.pitches, voicing):
+            if p.midi != midi:
+                p.midi = midi
+                   
+        return curr_chord
+
+    def determine_chord_type_midi(self, pitches: Sequence[int], root: int) -> str:
+        """Determine the chord type from MIDI pitches and the chord root."""
+        intervals = frozenset((p - root) % 12 for p in pitches)
+        return CHORD_TYPE_INTERVALS.get(intervals, 'major')
+
+    def add_extensions_midi(self, pitches: Sequence[int], chord_type: str, style: str) -> Voicing:
+        """Integer counterpart of add_extensions; returns a new tuple instead of mutating."""
+        extensions = self.style_extensions.get(style, {}).get(chord_type, [])
+        extended = list(pitches)
+        root = pitches[0]
+
+        for ext in extensions:
+            if ext == 7:
+                added = root + (10 if chord_type == 'dominant' else 11)
+            elif ext == 9:
+                added = root + (14 if chord_type == 'dominant' else 13)
+            elif ext == 13:
+                added = root + 21
+            else:
+                continue
+            if added not in pitches:
+                extended.append(added)
+
+        return tuple(extended)
+
+    def generate_voicing_midi(self, pitches: Sequence[int], root: int, config: VoicingConfig, melody_midi: Optional[int] = None) -> Voicing:
+        """Integer counterpart of generate_voicing."""
+        low, high = config.preferred_range
+        if root < low:
+            root += 12 * -((root - low) // 12)
+        if root > high:
+            root -= 12 * -((high - root) // 12)
+
+        voiced = [root]
+        root_class = root % 12
+        for note_to_add in sorted(p for p in pitches if p % 12 != root_class):
+            voiced.append(self.find_best_octave_midi(note_to_add, voiced[-1], config))
+
+        if melody_midi is not None and voiced[-1] > melody_midi:
+            # whole octaves down until the top voice is not above the melody
+            voiced[-1] -= 12 * -((melody_midi - voiced[-1]) // 12)
+        return tuple(voiced)
+
+    def find_best_octave_midi(self, note_to_add: int, prev_note: int, config: VoicingConfig) -> int:
+        """Place note_to_add (by octave) between min_spacing and max_spacing above prev_note."""
+        interval_semitones = note_to_add - prev_note
+
+        # the fewest whole octaves up to reach min_spacing, then down to get within max_spacing
+        if interval_semitones < config.min_spacing:
+            interval_semitones += 12 * -((interval_semitones - config.min_spacing) // 12)
+        if interval_semitones > config.max_spacing:
+            interval_semitones -= 12 * -((config.max_spacing - interval_semitones) // 12)
+
+        return prev_note + interval_semitones
+
+    def minimize_voice_movement_midi(self, prev_voicing: Sequence[int], curr_voicing: Sequence[int], config: VoicingConfig) -> Voicing:
+        """Move each voice by octaves to within a tritone of the same voice in the previous chord."""
+        voiced = list(curr_voicing)
+
+        for i in range(min(len(voiced), len(prev_voicing))):
+            curr_pitch = voiced[i]
+            target_pitch = prev_voicing[i]
+
             while abs(curr_pitch - target_pitch) > 6:
                 if curr_pitch < target_pitch:
                     curr_pitch += 12
                 else:
                     curr_pitch -= 12
-            
-            if i > 0:
-                prev_voice = curr_chord.pitches[i - 1]
-                if curr_pitch - prev_voice < config.min_spacing:
-                    break
-            if i < len(curr_chord.pitches) - 1:
-                next_voice = curr_chord[i + 1].midi
-                if next_voice - curr_pitch < config.min_spacing:
-                    break 
-            
-            curr_chord.pitches[i].midi = curr_pitch
-                   
-        return curr_chord
-                    
\ No newline at end of file
+
+            if i > 0 and curr_pitch - voiced[i - 1] < config.min_spacing:
+                break
+            if i < len(voiced) - 1 and voiced[i + 1] - curr_pitch < config.min_spacing:
+                break
+
+            voiced[i] = curr_pitch
+
+        return tuple(voiced)
+
+
+def chord_to_midi(ch: chord.Chord) -> Tuple[Voicing, int, Dict[int, str]]:
+    """
+    Convert a chord into the integer representation used by the voicing engine.
+
+    Returns:
+        (MIDI pitches in chord order, MIDI root, pitch-class -> note name spelling)
+    """
+    pitches = tuple(p.midi for p in ch.pitches)
+    spelling = {}
+    for p in ch.pitches:
+        spelling.setdefault(p.pitchClass, p.name)
+    return pitches, ch.root().midi, spelling
+
+
+def voicing_to_chord(voicing: Sequence[int], spelling: Optional[Dict[int, str]] = None) -> chord.Chord:
+    """Build a chord from a voicing, keeping the original spelling of each pitch class."""
+    pitches = []
+    for midi in voicing:
+        name = spelling.get(midi % 12) if spelling else None
+        if name is None:
+            pitches.append(pitch.Pitch(midi=midi))
+            continue
+        p = pitch.Pitch(name)
+        p.octave = 4
+        p.octave += (midi - p.midi) // 12
+        pitches.append(p)
+    return chord.Chord(pitches)
+
+
+def _melody_midi(melody_note: Optional[note.GeneralNote]) -> Optional[int]:
+    """MIDI number of a melody note, or None for rests and missing notes."""
+    if isinstance(melody_note, note.Note):
+        return melody_note.pitch.midi
+    return None
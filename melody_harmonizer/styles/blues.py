@@ -0,0 +1,14 @@
+from ..core.voicing import VoicingConfig
+from .style_pack import StylePack, extension_masks
+
+# Twelve-bar blues
+BLUES = StylePack(
+    name='blues',
+    major=('I7', 'I7', 'I7', 'I7', 'IV7', 'IV7', 'I7', 'I7', 'V7', 'IV7', 'I7', 'V7'),
+    minor=('i7', 'i7', 'i7', 'i7', 'iv7', 'iv7', 'i7', 'i7', 'V7', 'iv7', 'i7', 'V7'),
+    voicing=VoicingConfig(max_spacing=12, min_spacing=3, preferred_range=(48, 72),
+                          preferred_bass_range=(36, 48), voice_crossing=True),
+    extensions=extension_masks({'major': [7], 'minor': [7], 'dominant': [7, 9]}),
+)
+
+STYLES = [BLUES]
@@ -0,0 +1,13 @@
+from ..core.voicing import VoicingConfig
+from .style_pack import StylePack, extension_masks
+
+CLASSICAL = StylePack(
+    name='classical',
+    major=('I', 'IV', 'V', 'I'),
+    minor=('i', 'iv', 'V', 'i'),
+    voicing=VoicingConfig(max_spacing=16, min_spacing=2, preferred_range=(48, 72),
+                          preferred_bass_range=(36, 48), voice_crossing=False),
+    extensions=extension_masks({'major': [], 'minor': [], 'dominant': []}),
+)
+
+STYLES = [CLASSICAL]
@@ -0,0 +1,13 @@
+from ..core.voicing import VoicingConfig
+from .style_pack import StylePack, extension_masks
+
+JAZZ = StylePack(
+    name='jazz',
+    major=('ii7', 'V7', 'I7', 'vi7'),
+    minor=('ii7', 'V7', 'i7', 'VI7'),
+    voicing=VoicingConfig(max_spacing=10, min_spacing=2, preferred_range=(48, 72),
+                          preferred_bass_range=(36, 48), voice_crossing=True),
+    extensions=extension_masks({'major': [11], 'minor': [10], 'dominant': [7, 11]}),
+)
+
+STYLES = [JAZZ]
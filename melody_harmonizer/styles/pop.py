@@ -0,0 +1,22 @@
+from dataclasses import replace
+from ..core.voicing import VoicingConfig
+from .style_pack import StylePack, extension_masks
+
+POP = StylePack(
+    name='pop',
+    major=('I', 'V', 'vi', 'IV'),
+    minor=('i', 'VI', 'III', 'VII'),
+    voicing=VoicingConfig(max_spacing=12, min_spacing=3, preferred_range=(48, 72),
+                          preferred_bass_range=(36, 48), voice_crossing=False),
+    extensions=extension_masks({'major': [], 'minor': [], 'dominant': [7]}),
+)
+
+# Styles that so far only differ from pop in allowing voice crossing
+# (they use the pop progressions and no chord extensions)
+_CROSSING = replace(POP.voicing, voice_crossing=True)
+ROCK = StylePack('rock', POP.major, POP.minor, _CROSSING)
+COUNTRY = StylePack('country', POP.major, POP.minor, _CROSSING)
+LATIN = StylePack('latin', POP.major, POP.minor, _CROSSING)
+HIPHOP = StylePack('hiphop', POP.major, POP.minor, _CROSSING)
+
+STYLES = [POP, ROCK, COUNTRY, LATIN, HIPHOP]
@@ -0,0 +1,23 @@
+from __future__ import annotations
+from typing import List
+from .style_pack import get_style
+from ..utils.lazy import lazy_import
+
+key = lazy_import('music21.key')
+
+
+def get_style_progression(style: str, key_sig: key.Key) -> List[str]:
+    """
+    Get the chord progression for a style in the mode of the given key.
+
+    Args:
+        style: Harmonization style (any registered style pack, see style_pack)
+        key_sig: Key of the melody
+
+    Returns:
+        List of Roman numerals
+
+    Raises:
+        ValueError: If the style is not registered
+    """
+    return get_style(style).progression(key_sig.mode)
@@ -0,0 +1,235 @@
+from dataclasses import dataclass, asdict, replace
+from functools import lru_cache
+from typing import Dict, Iterable, List, Mapping, Sequence, Tuple, TYPE_CHECKING
+import json
+import numpy as np
+
+if TYPE_CHECKING:
+    from ..core.voicing import VoicingConfig
+
+# Modules defining the built-in packs, registered on first use
+_BUILTIN_MODULES = ('pop', 'jazz', 'classical', 'blues')
+
+
+@dataclass(frozen=True)
+class StylePack:
+    """
+    Everything that defines a harmonization style, compiled into immutable form.
+
+    Packs are hashable (they can be cache keys) and picklable, so worker
+    processes can share them without rebuilding anything.
+    """
+    name: str
+    major: Tuple[str, ...]                   # Roman numeral progression in major keys
+    minor: Tuple[str, ...]                   # ... and in minor keys
+    voicing: 'VoicingConfig'
+    extensions: Tuple[Tuple[str, int], ...] = ()  # (chord type, bitmask of extension degrees)
+
+    def progression(self, mode: str) -> List[str]:
+        """The progression for a mode ('minor', anything else counts as major)."""
+        return list(self.minor if mode == 'minor' else self.major)
+
+    def extension_intervals(self, chord_type: str) -> List[int]:
+        """
+        Extension degrees added to chords of the given type.
+
+        These are chord degrees, not semitones: 7 adds the seventh (minor on
+        dominant chords, major otherwise), 9 the ninth and 13 the
+        thirteenth (see VoicingGenerator.add_extensions); other values add
+        nothing.
+        """
+        return _mask_degrees(dict(self.extensions).get(chord_type, 0))
+
+    def to_dict(self) -> dict:
+        """Plain-data form of the pack, as read by from_dict."""
+        return {
+            'name': self.name,
+            'major': list(self.major),
+            'minor': list(self.minor),
+            'voicing': asdict(self.voicing),
+            'extensions': {chord_type: _mask_degrees(mask) for chord_type, mask in self.extensions},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Mapping, base: 'StylePack' = None) -> 'StylePack':
+        """
+        Build a pack from plain data (e.g. one entry of a style file).
+
+        Args:
+            data: Mapping with 'name' and any of 'major', 'minor', 'voicing'
+                (VoicingConfig fields) and 'extensions' ({chord type: extension degrees})
+            base: Pack to take the missing entries from
+        """
+        from ..core.voicing import VoicingConfig
+
+        voicing = base.voicing if base is not None else VoicingConfig()
+        if 'voicing' in data:
+            fields = {name: tuple(value) if isinstance(value, list) else value
+                      for name, value in data['voicing'].items()}
+            voicing = replace(voicing, **fields)
+        return cls(
+            name=data['name'],
+            major=tuple(data['major'] if base is None or 'major' in data else base.major),
+            minor=tuple(data['minor'] if base is None or 'minor' in data else base.minor),
+            voicing=voicing,
+            extensions=(extension_masks(data['extensions']) if 'extensions' in data
+                        else base.extensions if base is not None else ()),
+        )
+
+
+def extension_masks(extensions: Mapping[str, Iterable[int]]) -> Tuple[Tuple[str, int], ...]:
+    """Compile {chord type: extension degrees} into sorted (chord type, bitmask) pairs."""
+    masks = []
+    for chord_type, degrees in sorted(extensions.items()):
+        mask = 0
+        for degree in degrees:
+            mask |= 1 << degree
+        masks.append((chord_type, mask))
+    return tuple(masks)
+
+
+def _mask_degrees(mask: int) -> List[int]:
+    return [degree for degree in range(mask.bit_length()) if mask >> degree & 1]
+
+
+@lru_cache(maxsize=None)
+def progression_transitions(progressions: Tuple[Tuple[str, ...], ...],
+                            smoothing: float = 0.1) -> Tuple[Tuple[str, ...], np.ndarray, np.ndarray]:
+    """
+    Numeral statistics of a set of progressions, computed once per set.
+
+    Progressions repeat, so the last numeral of each leads back to its first.
+
+    Args:
+        progressions: Roman numeral progressions
+        smoothing: Pseudo-count added to every start and change, so that any
+            numeral can start and any change is possible
+
+    Returns:
+        (numerals in order of appearance,
+         start probabilities,
+         change probabilities: row i gives the chance of moving from numeral i
+         to each other numeral, given that the chord changes; the diagonal is 0)
+        The arrays are read-only, as they are shared.
+    """
+    numerals = tuple(dict.fromkeys(n for progression in progressions for n in progression))
+    index = {numeral: i for i, numeral in enumerate(numerals)}
+
+    size = len(numerals)
+    changes = np.full((size, size), smoothing)
+    starts = np.full(size, smoothing)
+    for progression in progressions:
+        starts[index[progression[0]]] += 1
+        for current, following in zip(progression, progression[1:] + progression[:1]):
+            changes[index[current], index[following]] += 1
+    np.fill_diagonal(changes, 0)
+    totals = changes.sum(axis=1, keepdims=True)
+    changes = np.divide(changes, totals, out=np.zeros_like(changes), where=totals > 0)
+    starts /= starts.sum()
+
+    starts.setflags(write=False)
+    changes.setflags(write=False)
+    return numerals, starts, changes
+
+
+# Registered packs by name, and views of them in the form VoicingGenerator uses.
+# The views are shared dicts, kept up to date by register_style.
+_registry: Dict[str, StylePack] = {}
+_voicing_configs: Dict[str, 'VoicingConfig'] = {}
+_style_extensions: Dict[str, Dict[str, List[int]]] = {}
+_builtins_loaded = False
+
+
+def register_style(pack: StylePack, replace_existing: bool = True) -> None:
+    """
+    Make a style available to the harmonizer under pack.name.
+
+    Args:
+        pack: The style pack
+        replace_existing: Allow replacing an already registered style
+    """
+    _load_builtin_styles()
+    if not replace_existing and pack.name in _registry:
+        raise ValueError(f"Style {pack.name!r} is already registered")
+    _registry[pack.name] = pack
+    _voicing_configs[pack.name] = pack.voicing
+    if pack.extensions:
+        _style_extensions[pack.name] = {chord_type: _mask_degrees(mask) for chord_type, mask in pack.extensions}
+    else:
+        _style_extensions.pop(pack.name, None)
+
+
+def get_style(name: str) -> StylePack:
+    """
+    The registered pack for a style.
+
+    Raises:
+        ValueError: If no style of that name is registered
+    """
+    _load_builtin_styles()
+    pack = _registry.get(name)
+    if pack is None:
+        raise ValueError(f"Unknown style {name!r}; registered styles: {', '.join(style_names())}")
+    return pack
+
+
+def style_names() -> List[str]:
+    """Names of all registered styles."""
+    _load_builtin_styles()
+    return list(_registry)
+
+
+def voicing_configs() -> Dict[str, 'VoicingConfig']:
+    """Voicing config of every registered style (a shared, live dict; do not modify)."""
+    _load_builtin_styles()
+    return _voicing_configs
+
+
+def style_extensions() -> Dict[str, Dict[str, List[int]]]:
+    """Extension degrees per chord type of every style that has any (shared, live; do not modify)."""
+    _load_builtin_styles()
+    return _style_extensions
+
+
+def load_style_packs(path: str, register: bool = True) -> List[StylePack]:
+    """
+    Read style packs from a JSON file.
+
+    The file holds a list of pack entries (see StylePack.from_dict); an entry
+    may name a registered style as 'based_on' to inherit everything it does
+    not set.
+
+    Args:
+        path: Path of the JSON file
+        register: Register the packs as they are read
+
+    Returns:
+        The packs, in file order
+    """
+    with open(path) as f:
+        entries = json.load(f)
+    packs = []
+    for entry in entries:
+        base = get_style(entry['based_on']) if 'based_on' in entry else None
+        pack = StylePack.from_dict(entry, base)
+        if register:
+            register_style(pack)
+        packs.append(pack)
+    return packs
+
+
+def save_style_packs(path: str, packs: Sequence[StylePack]) -> None:
+    """Write style packs to a JSON file that load_style_packs reads back."""
+    with open(path, 'w') as f:
+        json.dump([pack.to_dict() for pack in packs], f, indent=2)
+
+
+def _load_builtin_styles() -> None:
+    global _builtins_loaded
+    if _builtins_loaded:
+        return
+    _builtins_loaded = True
+    from importlib import import_module
+    for module_name in _BUILTIN_MODULES:
+        for pack in import_module(f'{__package__}.{module_name}').STYLES:
+            register_style(pack)
@@ -0,0 +1,85 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Dict, Iterable, Tuple, Union
+from .music_theory import MAJOR_TONICS, MINOR_TONICS
+from .lazy import lazy_import
+
+chord = lazy_import('music21.chord')
+key = lazy_import('music21.key')
+roman = lazy_import('music21.roman')
+
+
+@dataclass(frozen=True)
+class NumeralChord:
+    """A Roman numeral realised in one key, in integer form."""
+    mask: int                 # pitch-class bitmask (bit n set if pitch class n sounds)
+    midi: Tuple[int, ...]     # MIDI pitches, bass first
+    root: int                 # MIDI pitch of the root
+    names: Tuple[str, ...]    # spelled pitches ('F#4'), to rebuild the music21 chord
+    seventh: str              # spelled pitch a minor seventh above the bass
+
+    def contains(self, pitch_class: int) -> bool:
+        """Whether the chord has the given pitch class."""
+        return bool(self.mask >> pitch_class & 1)
+
+    def near(self, midi: int, semitones: int = 2) -> bool:
+        """Whether any chord tone lies within the given number of semitones of a pitch."""
+        return any(abs(midi - p) <= semitones for p in self.midi)
+
+    def to_chord(self, add_seventh: bool = False) -> chord.Chord:
+        """A new music21 chord with the same spelled pitches as the Roman numeral."""
+        return chord.Chord(self.names + (self.seventh,) if add_seventh else self.names)
+
+
+class ChordTable:
+    """
+    Roman numerals resolved to NumeralChords, per key.
+
+    Each (numeral, key) pair is built with music21 once, on first use (or
+    up front with build()); afterwards chord-fit checks are bit operations
+    on the stored masks.
+    """
+
+    def __init__(self):
+        self._entries: Dict[Tuple[str, str], NumeralChord] = {}
+
+    def get(self, numeral: str, key_sig: Union[key.Key, str]) -> NumeralChord:
+        """
+        Look up a numeral in a key.
+
+        Args:
+            numeral: Roman numeral ('V7', 'ii')
+            key_sig: music21 Key, or key name ('E-', 'c#')
+        """
+        key_name = key_sig if isinstance(key_sig, str) else key_sig.tonicPitchNameWithCase
+        entry = self._entries.get((numeral, key_name))
+        if entry is None:
+            entry = self._entries[numeral, key_name] = _build_entry(numeral, key_name)
+        return entry
+
+    def build(self, numerals: Iterable[str]) -> None:
+        """Resolve the given numerals in all 24 keys ahead of time."""
+        numerals = set(numerals)
+        for key_name in MAJOR_TONICS + MINOR_TONICS:
+            for numeral in numerals:
+                self.get(numeral, key_name)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _build_entry(numeral: str, key_name: str) -> NumeralChord:
+    numeral_obj = roman.RomanNumeral(numeral, key.Key(key_name))
+    pitches = numeral_obj.pitches
+    mask = 0
+    for p in pitches:
+        mask |= 1 << p.pitchClass
+    return NumeralChord(mask,
+                        tuple(p.midi for p in pitches),
+                        numeral_obj.root().midi,
+                        tuple(p.nameWithOctave for p in pitches),
+                        pitches[0].transpose(10).nameWithOctave)
+
+
+# Process-wide table shared by the analyzer, harmonizer and streaming harmonizer
+chord_table = ChordTable()
@@ -0,0 +1,186 @@
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional, Tuple
+import fnmatch
+import multiprocessing
+import os
+import traceback
+import numpy as np
+from .midi_utils import MidiMelody, read_midi
+from .note_array import NOTE_DTYPE
+
+# Files of a corpus directory
+NOTES_FILE = 'notes.bin'    # the note arrays of all melodies, back to back (raw NOTE_DTYPE records)
+INDEX_FILE = 'index.npy'    # one INDEX_DTYPE record per melody
+NAMES_FILE = 'names.txt'    # one name per line, in index order
+
+# Where each melody's notes are and how to play them
+INDEX_DTYPE = np.dtype([
+    ('start', np.int64),            # first record in NOTES_FILE
+    ('count', np.int64),            # number of records
+    ('numerator', np.int16),        # time signature
+    ('denominator', np.int16),
+    ('ticks_per_beat', np.int32),
+    ('tempo', np.int32),            # microseconds per quarter note
+])
+
+
+class MelodyCorpus:
+    """
+    A packed, read-only collection of melodies.
+
+    All note arrays live back to back in one file that is memory-mapped, so
+    corpus[i] is a MidiMelody whose note array is a zero-copy slice of the
+    mapping: no file is opened and nothing is parsed per melody, and the
+    operating system pages in only the melodies that are used. Write
+    corpora with CorpusWriter or import_midi_directory.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Corpus directory
+        """
+        self.path = path
+        self.index = np.load(os.path.join(path, INDEX_FILE), mmap_mode='r')
+        notes_path = os.path.join(path, NOTES_FILE)
+        if os.path.getsize(notes_path):
+            self.notes = np.memmap(notes_path, dtype=NOTE_DTYPE, mode='r')
+        else:
+            self.notes = np.zeros(0, dtype=NOTE_DTYPE)  # an empty file cannot be mapped
+        self._names: Optional[List[str]] = None
+
+    @property
+    def names(self) -> List[str]:
+        """Names of the melodies (for imported corpora, their paths relative to the source directory)."""
+        if self._names is None:
+            with open(os.path.join(self.path, NAMES_FILE), encoding='utf-8') as f:
+                self._names = f.read().splitlines()
+        return self._names
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __getitem__(self, i: int) -> MidiMelody:
+        entry = self.index[i]
+        start = int(entry['start'])
+        return MidiMelody(self.notes[start:start + int(entry['count'])],
+                          (int(entry['numerator']), int(entry['denominator'])),
+                          int(entry['ticks_per_beat']), int(entry['tempo']))
+
+    def __iter__(self) -> Iterator[MidiMelody]:
+        for i in range(len(self)):
+            yield self[i]
+
+
+class CorpusWriter:
+    """
+    Writes a MelodyCorpus one melody at a time.
+
+    Notes are appended to the notes file as they come, so a corpus of any
+    size is written in constant memory apart from its index. The index
+    and names are written by close(); use the writer as a context manager.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Corpus directory (created if missing; an existing corpus in it is replaced)
+        """
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._notes = open(os.path.join(path, NOTES_FILE), 'wb')
+        self._entries: List[tuple] = []
+        self._names: List[str] = []
+        self._count = 0
+
+    def add(self, name: str, melody: MidiMelody) -> None:
+        """Append a melody; name must not contain line breaks."""
+        note_array = np.ascontiguousarray(melody.note_array, dtype=NOTE_DTYPE)
+        self._notes.write(note_array.tobytes())
+        self._entries.append((self._count, len(note_array), *melody.time_signature,
+                              melody.ticks_per_beat, melody.tempo))
+        self._names.append(name)
+        self._count += len(note_array)
+
+    def close(self) -> None:
+        if self._notes.closed:
+            return
+        self._notes.close()
+        np.save(os.path.join(self.path, INDEX_FILE), np.array(self._entries, dtype=INDEX_DTYPE))
+        with open(os.path.join(self.path, NAMES_FILE), 'w', encoding='utf-8') as f:
+            f.writelines(name + '\n' for name in self._names)
+
+    def __enter__(self) -> 'CorpusWriter':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+@dataclass
+class ImportReport:
+    """Outcome of import_midi_directory."""
+    imported: int = 0
+    failed: List[Tuple[str, str]] = field(default_factory=list)  # (file, traceback)
+
+
+def import_midi_directory(directory: str,
+                          corpus_path: str,
+                          patterns: Tuple[str, ...] = ('*.mid', '*.midi'),
+                          workers: int = 1,
+                          chunksize: int = 64) -> ImportReport:
+    """
+    Pack every MIDI file under a directory into a corpus.
+
+    Files are read with read_midi (single-line melodies) in sorted path
+    order; each melody is named after its path relative to directory,
+    without the extension. Files that cannot be read are reported and
+    left out.
+
+    Args:
+        directory: Directory searched recursively for MIDI files
+        corpus_path: Corpus directory to write
+        patterns: File name patterns of the files to import
+        workers: Number of worker processes parsing the files
+        chunksize: Number of files handed to a worker at a time
+
+    Returns:
+        ImportReport with the number of melodies imported and the failures
+    """
+    paths = find_files(directory, patterns)
+    report = ImportReport()
+    with CorpusWriter(corpus_path) as writer:
+        if workers <= 1:
+            parsed = map(_read_melody, paths)
+            _add_melodies(writer, directory, paths, parsed, report)
+        else:
+            with multiprocessing.Pool(workers) as pool:
+                parsed = pool.imap(_read_melody, paths, chunksize=chunksize)
+                _add_melodies(writer, directory, paths, parsed, report)
+    return report
+
+
+def find_files(directory: str, patterns: Tuple[str, ...] = ('*.mid', '*.midi')) -> List[str]:
+    """Paths of the files under a directory (recursively) whose lower-cased names match a pattern, sorted."""
+    return sorted(os.path.join(root, name)
+                  for root, _, names in os.walk(directory)
+                  for name in names
+                  if any(fnmatch.fnmatch(name.lower(), pattern) for pattern in patterns))
+
+
+def _read_melody(path: str) -> Tuple[Optional[MidiMelody], Optional[str]]:
+    """Read one file for the importer: (melody, None), or (None, traceback) on failure."""
+    try:
+        return read_midi(path), None
+    except Exception:
+        return None, traceback.format_exc()
+
+
+def _add_melodies(writer: CorpusWriter, directory: str, paths: List[str], parsed, report: ImportReport) -> None:
+    for path, (melody, error) in zip(paths, parsed):
+        if melody is None:
+            report.failed.append((path, error))
+            continue
+        name = os.path.splitext(os.path.relpath(path, directory))[0].replace(os.sep, '/')
+        writer.add(name, melody)
+        report.imported += 1
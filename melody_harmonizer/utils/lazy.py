@@ -0,0 +1,31 @@
+# music21 loads on first use, not at import: modules bind it with lazy_import
+# (and use `from __future__ import annotations`, so their type hints do not touch it)
+import importlib
+import types
+
+
+class LazyModule(types.ModuleType):
+    """
+    Stand-in for a module that is imported on first attribute access.
+
+    Used for heavy dependencies (music21) so that importing the package,
+    e.g. in a short-lived batch worker, does not pay for them until they
+    are actually needed.
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+
+    def __getattr__(self, attribute: str):
+        module = importlib.import_module(self.__name__)
+        # later lookups find the attributes directly, without __getattr__
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attribute)
+
+    def __repr__(self) -> str:
+        return f"<lazy module {self.__name__!r}>"
+
+
+def lazy_import(name: str) -> LazyModule:
+    """A module proxy that imports the named module when first used."""
+    return LazyModule(name)
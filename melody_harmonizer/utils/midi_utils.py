@@ -0,0 +1,473 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, List, Optional, Sequence, Tuple, Union
+import os
+import struct
+import mido
+import numpy as np
+from .note_array import NOTE_DTYPE, REST_PITCH, beat_strengths
+from .lazy import lazy_import
+
+stream = lazy_import('music21.stream')
+note = lazy_import('music21.note')
+meter = lazy_import('music21.meter')
+tempo_marks = lazy_import('music21.tempo')
+
+# MIDI channel reserved for percussion (0-based), ignored when reading melodies
+DRUM_CHANNEL = 9
+
+# Channels and velocity used when writing harmonized output
+MELODY_CHANNEL = 0
+HARMONY_CHANNEL = 1
+DEFAULT_VELOCITY = 90
+
+# A harmony event: (onset, duration) in quarter lengths and the voiced MIDI pitches
+ChordEvent = Tuple[float, float, Tuple[int, ...]]
+
+# Track names that mark the melody of an arrangement (matched case-insensitively)
+MELODY_TRACK_NAMES = ('melody', 'lead', 'vocal', 'voice', 'solo', 'tune')
+
+
+@dataclass
+class MidiMelody:
+    """A melody read straight from a MIDI file, without building a music21 stream."""
+    note_array: np.ndarray
+    time_signature: Tuple[int, int] = (4, 4)
+    ticks_per_beat: int = 480
+    tempo: int = 500000  # microseconds per quarter note
+
+    def beat_layout(self) -> Tuple[int, float]:
+        """(beats per bar, beat length in quarter lengths) of the time signature."""
+        return beat_layout(*self.time_signature)
+
+    def to_notes(self) -> List[note.GeneralNote]:
+        """music21 notes and rests for the melody, with their offsets set."""
+        return note_array_to_notes(self.note_array)
+
+    def to_stream(self) -> stream.Stream:
+        """Build a music21 stream of the melody (only when one is really needed)."""
+        melody = stream.Stream()
+        melody.insert(0, meter.TimeSignature('%d/%d' % self.time_signature))
+        for n in self.to_notes():
+            melody.coreInsert(n.offset, n)
+        melody.coreElementsChanged()
+        return melody
+
+
+class LoopbackPort(mido.ports.BaseIOPort):
+    """
+    In-process stand-in for a (virtual) rtmidi port.
+
+    Messages sent to the port can be read back from it with poll(),
+    iter_pending() or receive(), so live harmonization can be driven and
+    observed without any MIDI hardware or backend.
+    """
+
+    def _send(self, message: mido.Message) -> None:
+        self._messages.append(message)
+
+
+def beat_layout(numerator: int, denominator: int) -> Tuple[int, float]:
+    """Beats per bar and beat length (in quarter lengths) for a time signature."""
+    beat_length = 4.0 / denominator
+    if numerator % 3 == 0 and numerator > 3 and denominator >= 8:
+        # compound meter: the beat is a dotted note
+        return numerator // 3, beat_length * 3
+    return numerator, beat_length
+
+
+def quantize(quarter_lengths: np.ndarray) -> np.ndarray:
+    """Snap quarter lengths to the nearest sixteenth or eighth-note triplet, like music21 does."""
+    by_four = np.round(quarter_lengths * 4) / 4
+    by_three = np.round(quarter_lengths * 3) / 3
+    closer = np.abs(by_three - quarter_lengths) < np.abs(by_four - quarter_lengths)
+    return np.where(closer, by_three, by_four)
+
+
+@dataclass
+class MidiPart:
+    """One part of a MIDI file: the notes of one channel on one track."""
+    track: int
+    channel: int
+    name: str = ''                 # name of the track
+    program: Optional[int] = None  # first program change on the channel
+    note_count: int = 0
+
+
+@dataclass
+class MidiArrangement:
+    """
+    Every (non-percussion) note of a MIDI file, kept apart by part.
+
+    Notes are stored flat, in file order, with the index of their part, so
+    any selection of parts is a mask; onsets and ends are in quarter
+    lengths and not yet quantized.
+    """
+    parts: List[MidiPart]
+    onsets: np.ndarray
+    ends: np.ndarray
+    pitches: np.ndarray
+    part_indices: np.ndarray
+    time_signature: Tuple[int, int] = (4, 4)
+    ticks_per_beat: int = 480
+    tempo: int = 500000
+
+    def skyline(self, parts: Optional[Sequence[int]] = None) -> MidiMelody:
+        """
+        The highest voice of the selected parts (all by default) as a melody.
+
+        Where notes start together only the highest is kept, overlapping
+        notes are cut at the next onset and gaps become rests.
+        """
+        mask = self._mask(parts)
+        note_array = _monophonic_note_array(self.onsets[mask], self.ends[mask], self.pitches[mask],
+                                            *beat_layout(*self.time_signature))
+        return MidiMelody(note_array, self.time_signature, self.ticks_per_beat, self.tempo)
+
+    def notes(self, parts: Optional[Sequence[int]] = None) -> np.ndarray:
+        """Every note of the selected parts (all by default) as a note array sorted by onset, chords and all."""
+        mask = self._mask(parts)
+        onsets, ends = quantize(self.onsets[mask]), quantize(self.ends[mask])
+        order = np.argsort(onsets, kind='stable')
+        array = np.zeros(len(order), dtype=NOTE_DTYPE)
+        array['onset'] = onsets[order]
+        array['duration'] = (ends - onsets)[order]
+        array['pitch'] = self.pitches[mask][order]
+        array['beat_strength'] = beat_strengths(array['onset'], *beat_layout(*self.time_signature))
+        return array[array['duration'] > 0]
+
+    def melody_part(self) -> int:
+        """
+        Guess which part carries the melody.
+
+        A part named like a melody track (MELODY_TRACK_NAMES) wins;
+        otherwise the part with the highest mean pitch, less an octave per
+        unit of polyphony (the share of its notes starting while another
+        of its notes sounds), among the parts with at least a tenth of the
+        notes of the busiest part.
+        """
+        if not self.parts:
+            raise ValueError("The arrangement has no notes")
+        for i, part in enumerate(self.parts):
+            if any(word in part.name.lower() for word in MELODY_TRACK_NAMES):
+                return i
+
+        counts = np.bincount(self.part_indices, minlength=len(self.parts))
+        best, best_score = 0, -np.inf
+        for i in np.flatnonzero(counts >= counts.max() / 10).tolist():
+            mask = self.part_indices == i
+            order = np.argsort(self.onsets[mask], kind='stable')
+            onsets, ends = self.onsets[mask][order], self.ends[mask][order]
+            sounding_until = np.maximum.accumulate(ends)
+            polyphony = float(np.mean(onsets[1:] < sounding_until[:-1])) if len(onsets) > 1 else 0.0
+            score = float(self.pitches[mask].mean()) - 12 * polyphony
+            if score > best_score:
+                best, best_score = i, score
+        return best
+
+    def find_part(self, name: str) -> int:
+        """Index of the first part whose track name contains name (case-insensitively)."""
+        for i, part in enumerate(self.parts):
+            if name.lower() in part.name.lower():
+                return i
+        raise ValueError(f"No part named {name!r}")
+
+    def _mask(self, parts: Optional[Sequence[int]]) -> np.ndarray:
+        if parts is None:
+            return np.ones(len(self.pitches), dtype=bool)
+        return np.isin(self.part_indices, np.asarray(parts, dtype=self.part_indices.dtype))
+
+
+def read_midi(path: str) -> MidiMelody:
+    """
+    Read a melody from a MIDI file with mido.
+
+    Note on/off events of all (non-percussion) tracks are collected into a
+    note array: where notes start together only the highest is kept,
+    overlapping notes are cut at the next onset and gaps become rests.
+    Use read_arrangement to keep the tracks apart.
+
+    Args:
+        path: Path to the MIDI file
+
+    Returns:
+        MidiMelody holding the note array and the file's timing information
+    """
+    return read_arrangement(path).skyline()
+
+
+def read_arrangement(path: str) -> MidiArrangement:
+    """
+    Read every part of a MIDI file with mido, without merging them.
+
+    A part is one channel of one track, so type 0 files (all channels on
+    one track) split into their instruments too. The percussion channel is
+    left out.
+
+    Args:
+        path: Path to the MIDI file
+
+    Returns:
+        MidiArrangement with the notes of every part and the file's timing information
+    """
+    midi_file = mido.MidiFile(path)
+    time_signature = None
+    tempo = None
+    part_numbers: Dict[Tuple[int, int], int] = {}
+    parts: List[MidiPart] = []
+    starts, ends, pitches, part_indices = [], [], [], []
+
+    for track_number, track in enumerate(midi_file.tracks):
+        tick = 0
+        sounding = {}
+        track_name = ''
+        programs = {}
+        for msg in track:
+            tick += msg.time
+            kind = msg.type
+            if kind == 'note_on' and msg.velocity > 0:
+                if msg.channel != DRUM_CHANNEL:
+                    sounding.setdefault((msg.channel, msg.note), tick)
+            elif kind == 'note_off' or kind == 'note_on':
+                start = sounding.pop((msg.channel, msg.note), None)
+                if start is not None:
+                    part_key = (track_number, msg.channel)
+                    part = part_numbers.get(part_key)
+                    if part is None:
+                        part = part_numbers[part_key] = len(parts)
+                        parts.append(MidiPart(track_number, msg.channel))
+                    starts.append(start)
+                    ends.append(tick)
+                    pitches.append(msg.note)
+                    part_indices.append(part)
+            elif kind == 'track_name' and not track_name:
+                track_name = msg.name
+            elif kind == 'program_change':
+                programs.setdefault(msg.channel, msg.program)
+            elif kind == 'time_signature' and time_signature is None:
+                time_signature = (msg.numerator, msg.denominator)
+            elif kind == 'set_tempo' and tempo is None:
+                tempo = msg.tempo
+        for part in parts:
+            if part.track == track_number:
+                part.name = track_name
+                part.program = programs.get(part.channel)
+
+    part_indices = np.asarray(part_indices, dtype=np.int16)
+    for part, count in zip(parts, np.bincount(part_indices, minlength=len(parts)).tolist()):
+        part.note_count = count
+    return MidiArrangement(parts,
+                           np.asarray(starts, dtype=np.float64) / midi_file.ticks_per_beat,
+                           np.asarray(ends, dtype=np.float64) / midi_file.ticks_per_beat,
+                           np.asarray(pitches, dtype=np.int16),
+                           part_indices,
+                           time_signature or (4, 4),
+                           midi_file.ticks_per_beat,
+                           tempo or 500000)
+
+
+def stream_arrangement(score: stream.Score) -> MidiArrangement:
+    """
+    The parts of a music21 score as a MidiArrangement, without merging them.
+
+    Every part of the score is one part of the arrangement (a stream
+    without parts is a single part); tied notes are joined, chords
+    contribute all their notes and unpitched percussion is left out.
+
+    Args:
+        score: Parsed score (e.g. from converter.parse)
+
+    Returns:
+        MidiArrangement with the notes of every part, the first time
+        signature and the first tempo mark of the score
+    """
+    parts: List[MidiPart] = []
+    starts, ends, pitches, part_indices = [], [], [], []
+    for number, part_stream in enumerate(score.parts or [score]):
+        instrument = part_stream.recurse().getElementsByClass('Instrument').first()
+        part = MidiPart(number, getattr(instrument, 'midiChannel', None) or 0,
+                        part_stream.partName or '', getattr(instrument, 'midiProgram', None))
+        for element in part_stream.stripTies().flatten().notes:
+            onset = float(element.offset)
+            for p in getattr(element, 'pitches', ()):
+                starts.append(onset)
+                ends.append(onset + float(element.quarterLength))
+                pitches.append(p.midi)
+                part_indices.append(len(parts))
+                part.note_count += 1
+        if part.note_count:
+            parts.append(part)
+
+    time_sig = score.recurse().getElementsByClass(meter.TimeSignature).first()
+    mark = score.recurse().getElementsByClass(tempo_marks.MetronomeMark).first()
+    return MidiArrangement(parts,
+                           np.asarray(starts, dtype=np.float64),
+                           np.asarray(ends, dtype=np.float64),
+                           np.asarray(pitches, dtype=np.int16),
+                           np.asarray(part_indices, dtype=np.int16),
+                           (time_sig.numerator, time_sig.denominator) if time_sig is not None else (4, 4),
+                           tempo=int(round(60e6 / mark.getQuarterBPM())) if mark is not None else 500000)
+
+
+def _monophonic_note_array(onsets: np.ndarray,
+                           ends: np.ndarray,
+                           pitches: np.ndarray,
+                           beats_per_bar: int,
+                           beat_length: float) -> np.ndarray:
+    """Reduce (possibly overlapping) notes to a single line with rests in the gaps."""
+    onsets = quantize(onsets)
+    ends = quantize(ends)
+
+    # sort by onset, highest pitch first, and keep one note per onset
+    order = np.lexsort((-pitches, onsets))
+    onsets, ends, pitches = onsets[order], ends[order], pitches[order]
+    first = np.ones(len(onsets), dtype=bool)
+    first[1:] = onsets[1:] != onsets[:-1]
+    onsets, ends, pitches = onsets[first], ends[first], pitches[first]
+
+    # cut overlaps at the next onset, then drop notes that vanished
+    if len(onsets):
+        ends[:-1] = np.minimum(ends[:-1], onsets[1:])
+    keep = ends > onsets
+    onsets, ends, pitches = onsets[keep], ends[keep], pitches[keep]
+
+    # rests fill the gaps before each note
+    previous_ends = np.concatenate(([0.0], ends[:-1]))
+    gaps = onsets > previous_ends
+
+    total = len(onsets) + int(gaps.sum())
+    array = np.zeros(total, dtype=NOTE_DTYPE)
+    note_rows = np.arange(len(onsets)) + np.cumsum(gaps)
+    rest_rows = note_rows[gaps] - 1
+
+    array['onset'][note_rows] = onsets
+    array['duration'][note_rows] = ends - onsets
+    array['pitch'][note_rows] = pitches
+    array['onset'][rest_rows] = previous_ends[gaps]
+    array['duration'][rest_rows] = onsets[gaps] - previous_ends[gaps]
+    array['pitch'][rest_rows] = REST_PITCH
+    array['is_rest'][rest_rows] = True
+    array['beat_strength'] = beat_strengths(array['onset'], beats_per_bar, beat_length)
+    return array
+
+
+def note_array_to_notes(note_array: np.ndarray) -> List[note.GeneralNote]:
+    """Materialize music21 notes and rests (with offsets) from a note array."""
+    notes = []
+    for onset, duration, midi, is_rest in zip(note_array['onset'].tolist(),
+                                              note_array['duration'].tolist(),
+                                              note_array['pitch'].tolist(),
+                                              note_array['is_rest'].tolist()):
+        n = note.Rest(quarterLength=duration) if is_rest else note.Note(midi, quarterLength=duration)
+        n.offset = onset
+        notes.append(n)
+    return notes
+
+
+def chord_events(harmony: stream.Stream) -> List[ChordEvent]:
+    """Harmony events for the chords in a music21 stream (rests are skipped)."""
+    return [(float(ch.offset), float(ch.quarterLength), tuple(p.midi for p in ch.pitches))
+            for ch in harmony.getElementsByClass('Chord')]
+
+
+def encode_midi(note_array: np.ndarray,
+                harmony: Sequence[ChordEvent],
+                time_signature: Tuple[int, int] = (4, 4),
+                tempo: int = 500000,
+                ticks_per_beat: int = 480) -> bytes:
+    """
+    Encode a melody and its harmony as a two-track (type 1) MIDI file.
+
+    The first track holds the tempo, time signature and melody, the second
+    the chords; nothing goes through a music21 Score.
+
+    Args:
+        note_array: Melody note array (rests are skipped)
+        harmony: Chord events to play under the melody
+        time_signature: (numerator, denominator)
+        tempo: Microseconds per quarter note
+        ticks_per_beat: Resolution of the file
+
+    Returns:
+        The bytes of the MIDI file
+    """
+    pitched = note_array[~note_array['is_rest']]
+    melody_meta = [
+        mido.MetaMessage('track_name', name='Melody'),
+        mido.MetaMessage('set_tempo', tempo=tempo),
+        mido.MetaMessage('time_signature', numerator=time_signature[0], denominator=time_signature[1]),
+    ]
+    melody_track = _track_chunk(melody_meta, _note_events(
+        pitched['onset'], pitched['onset'] + pitched['duration'], pitched['pitch'],
+        MELODY_CHANNEL, ticks_per_beat))
+
+    onsets = [onset for onset, _, voicing in harmony for _ in voicing]
+    ends = [onset + duration for onset, duration, voicing in harmony for _ in voicing]
+    pitches = [p for _, _, voicing in harmony for p in voicing]
+    harmony_track = _track_chunk([mido.MetaMessage('track_name', name='Harmony')], _note_events(
+        np.asarray(onsets, dtype=np.float64), np.asarray(ends, dtype=np.float64),
+        np.asarray(pitches, dtype=np.int16), HARMONY_CHANNEL, ticks_per_beat))
+
+    header = b'MThd' + struct.pack('>LHHH', 6, 1, 2, ticks_per_beat)
+    return header + melody_track + harmony_track
+
+
+def write_midi(target: Union[str, BinaryIO],
+               note_array: np.ndarray,
+               harmony: Sequence[ChordEvent],
+               time_signature: Tuple[int, int] = (4, 4),
+               tempo: int = 500000,
+               ticks_per_beat: int = 480) -> None:
+    """Write a melody and its harmony to a path or binary file (see encode_midi)."""
+    data = encode_midi(note_array, harmony, time_signature, tempo, ticks_per_beat)
+    if isinstance(target, (str, os.PathLike)):
+        with open(target, 'wb') as f:
+            f.write(data)
+    else:
+        target.write(data)
+
+
+def _note_events(onsets: np.ndarray,
+                 ends: np.ndarray,
+                 pitches: np.ndarray,
+                 channel: int,
+                 ticks_per_beat: int,
+                 velocity: int = DEFAULT_VELOCITY) -> bytes:
+    """Encoded note on/off events (with delta times) for notes given in quarter lengths."""
+    on_ticks = np.rint(onsets * ticks_per_beat).astype(np.int64)
+    off_ticks = np.maximum(np.rint(ends * ticks_per_beat).astype(np.int64), on_ticks + 1)
+
+    ticks = np.concatenate((off_ticks, on_ticks))
+    is_on = np.concatenate((np.zeros(len(off_ticks), dtype=bool), np.ones(len(on_ticks), dtype=bool)))
+    notes = np.concatenate((pitches, pitches))
+    # at equal ticks, release notes before starting new ones
+    order = np.lexsort((is_on, ticks))
+    deltas = np.diff(ticks[order], prepend=0)
+
+    note_on, note_off = 0x90 | channel, 0x80 | channel
+    delta_bytes: Dict[int, bytes] = {}
+    events = bytearray()
+    for on, n, delta in zip(is_on[order].tolist(), notes[order].tolist(), deltas.tolist()):
+        encoded = delta_bytes.get(delta)
+        if encoded is None:
+            encoded = delta_bytes[delta] = _variable_length(delta)
+        events += encoded
+        events += bytes((note_on, n, velocity) if on else (note_off, n, 0))
+    return bytes(events)
+
+
+def _track_chunk(meta_messages: List[mido.MetaMessage], events: bytes) -> bytes:
+    """An MTrk chunk: meta messages at time 0, the encoded events and end-of-track."""
+    data = b''.join(b'\x00' + bytes(msg.bytes()) for msg in meta_messages)
+    data += events + b'\x00' + bytes(mido.MetaMessage('end_of_track').bytes())
+    return b'MTrk' + struct.pack('>L', len(data)) + data
+
+
+def _variable_length(value: int) -> bytes:
+    """MIDI variable-length quantity encoding of a delta time."""
+    encoded = [value & 0x7F]
+    value >>= 7
+    while value:
+        encoded.append((value & 0x7F) | 0x80)
+        value >>= 7
+    return bytes(reversed(encoded))
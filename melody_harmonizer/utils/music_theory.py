@@ -0,0 +1,139 @@
+from typing import Optional, Tuple
+import numpy as np
+
+# Aarden-Essen key profiles (the weights music21 uses for analyze('key')),
+# indexed by pitch class above the tonic
+MAJOR_PROFILE = np.array([17.7661, 0.145624, 14.9265, 0.160186, 19.8049, 11.3587,
+                          0.291248, 22.062, 0.145624, 8.15494, 0.232998, 4.95122])
+MINOR_PROFILE = np.array([18.2648, 0.737619, 14.0499, 16.8599, 0.702494, 14.4362,
+                          0.702494, 18.6161, 4.56621, 1.93186, 7.37619, 1.75623])
+
+# (24, 12) matrix: row t is the major profile on tonic t, row 12 + t the minor one
+KEY_PROFILES = np.array([np.roll(MAJOR_PROFILE, tonic) for tonic in range(12)] +
+                        [np.roll(MINOR_PROFILE, tonic) for tonic in range(12)])
+
+# Profiles centred and scaled to unit length, so that a product with a
+# centred histogram is the Pearson correlation music21 ranks keys by
+_CENTRED_PROFILES = KEY_PROFILES - KEY_PROFILES.mean(axis=1, keepdims=True)
+_CENTRED_PROFILES /= np.linalg.norm(_CENTRED_PROFILES, axis=1, keepdims=True)
+
+# Preferred spelling of each tonic pitch class (music21 key names)
+MAJOR_TONICS = ['C', 'C#', 'D', 'E-', 'E', 'F', 'F#', 'G', 'A-', 'A', 'B-', 'B']
+MINOR_TONICS = ['c', 'c#', 'd', 'e-', 'e', 'f', 'f#', 'g', 'g#', 'a', 'b-', 'b']
+
+
+def pitch_class_histogram(note_array: np.ndarray) -> np.ndarray:
+    """Total duration (quarter lengths) of each pitch class in a note array."""
+    pitched = note_array[~note_array['is_rest']]
+    return np.bincount(pitched['pitch'] % 12, weights=pitched['duration'], minlength=12)
+
+
+def measure_histograms(note_array: np.ndarray, bar_length: float) -> np.ndarray:
+    """
+    Pitch-class histogram of every measure.
+
+    Notes count towards the measure they start in.
+
+    Returns:
+        (n_measures, 12) array of total duration per pitch class
+    """
+    if not len(note_array):
+        return np.zeros((0, 12))
+    pitched = note_array[~note_array['is_rest']]
+    n_measures = int(note_array['onset'].max() // bar_length) + 1
+    measures = (pitched['onset'] // bar_length).astype(np.int64)
+    histograms = np.zeros((n_measures, 12))
+    np.add.at(histograms, (measures, pitched['pitch'] % 12), pitched['duration'])
+    return histograms
+
+
+def key_correlations(histograms: np.ndarray) -> np.ndarray:
+    """
+    Correlation of histograms with all 24 key profiles.
+
+    Args:
+        histograms: (..., 12) array of pitch-class histograms
+
+    Returns:
+        (..., 24) array; index t is the major key on tonic t, 12 + t the minor
+        one. Empty histograms correlate 0 with every key.
+    """
+    centred = histograms - histograms.mean(axis=-1, keepdims=True)
+    norms = np.linalg.norm(centred, axis=-1, keepdims=True)
+    centred = np.divide(centred, norms, out=np.zeros_like(centred), where=norms > 0)
+    return centred @ _CENTRED_PROFILES.T
+
+
+def estimate_key(histogram: np.ndarray) -> Tuple[int, str]:
+    """
+    Most likely key for a duration-weighted pitch-class histogram.
+
+    This ranks keys exactly like music21's analyze('key') (Aarden-Essen).
+
+    Args:
+        histogram: Length-12 array of total duration per pitch class
+
+    Returns:
+        (tonic pitch class, 'major' or 'minor')
+    """
+    best = int(np.argmax(key_correlations(histogram)))
+    return best % 12, 'major' if best < 12 else 'minor'
+
+
+def estimate_keys(histograms: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Most likely key of each histogram in a (n, 12) array.
+
+    Returns:
+        (tonic pitch classes, is_minor flags), both of length n
+    """
+    best = np.argmax(key_correlations(histograms), axis=-1)
+    return best % 12, best >= 12
+
+
+def windowed_keys(histograms: np.ndarray, window: int = 4) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Local key of every measure, from the measures around it.
+
+    Each measure's key is estimated from the summed histograms of a window
+    of measures centred on it (clipped at the ends of the piece), so keys
+    follow modulations. All windows are summed with one cumulative sum.
+
+    Args:
+        histograms: (n_measures, 12) array from measure_histograms
+        window: Number of measures per window
+
+    Returns:
+        (tonic pitch classes, is_minor flags), one per measure
+    """
+    n = len(histograms)
+    totals = np.vstack((np.zeros((1, 12)), np.cumsum(histograms, axis=0)))
+    starts = np.clip(np.arange(n) - (window - 1) // 2, 0, None)
+    ends = np.clip(starts + window, None, n)
+    return estimate_keys(totals[ends] - totals[starts])
+
+
+class KeyTracker:
+    """
+    Running key estimate for a melody that grows note by note.
+
+    Keeps the duration-weighted pitch-class histogram, so adding a note is
+    one increment and reading the key one (24, 12) matrix product.
+    """
+
+    def __init__(self, histogram: Optional[np.ndarray] = None):
+        self.histogram = np.zeros(12) if histogram is None else np.asarray(histogram, dtype=float).copy()
+
+    def add(self, pitch: int, duration: float) -> None:
+        """Add duration (quarter lengths, may be negative to correct) to a pitch's class."""
+        self.histogram[pitch % 12] += duration
+
+    @property
+    def key(self) -> Tuple[int, str]:
+        """(tonic pitch class, mode) of the best matching key."""
+        return estimate_key(self.histogram)
+
+
+def key_name(tonic: int, mode: str) -> str:
+    """music21 key name for a tonic pitch class and mode ('E-', 'c#', ...)."""
+    return MAJOR_TONICS[tonic] if mode == 'major' else MINOR_TONICS[tonic]
@@ -0,0 +1,69 @@
+from typing import Iterable
+import numpy as np
+
+# One record per melody event; rests have pitch REST_PITCH and is_rest set
+NOTE_DTYPE = np.dtype([
+    ('onset', np.float64),          # quarter lengths from the start
+    ('duration', np.float32),       # quarter lengths
+    ('pitch', np.int16),            # MIDI number (highest pitch for chords)
+    ('is_rest', np.bool_),
+    ('beat_strength', np.float32),  # 1.0 on the downbeat, smaller off the beat
+])
+
+REST_PITCH = -1
+
+
+def beat_strengths(onsets: np.ndarray, beats_per_bar: int, beat_length: float) -> np.ndarray:
+    """
+    Metrical weight of each onset.
+
+    A simplified metrical hierarchy: 1.0 on the downbeat, 0.5 in the middle
+    of bars with an even number (> 2) of beats, 0.25 on other beats, 0.125
+    on half beats and 0.0625 anywhere else.
+
+    Args:
+        onsets: Onsets in quarter lengths
+        beats_per_bar: Beats per bar
+        beat_length: Length of one beat in quarter lengths
+    """
+    bar_length = beats_per_bar * beat_length
+    position = np.mod(onsets, bar_length)
+    in_beat = np.mod(position, beat_length)
+
+    strengths = np.full(len(onsets), 0.0625, dtype=np.float32)
+    strengths[np.isclose(np.mod(in_beat, beat_length / 2), 0)] = 0.125
+    strengths[np.isclose(in_beat, 0) | np.isclose(in_beat, beat_length)] = 0.25
+    if beats_per_bar % 2 == 0 and beats_per_bar > 2:
+        strengths[np.isclose(position, bar_length / 2)] = 0.5
+    strengths[np.isclose(position, 0) | np.isclose(position, bar_length)] = 1.0
+    return strengths
+
+
+def note_array_from_stream(notes: Iterable, beats_per_bar: int = 4, beat_length: float = 1.0) -> np.ndarray:
+    """
+    Build a note array from music21 notes, rests and chords in a single pass.
+
+    Args:
+        notes: Flat sequence of music21 notes/rests/chords (e.g. notesAndRests)
+        beats_per_bar: Beats per bar
+        beat_length: Length of one beat in quarter lengths
+    """
+    notes = list(notes)
+    array = np.zeros(len(notes), dtype=NOTE_DTYPE)
+    onsets = array['onset']
+    durations = array['duration']
+    pitches = array['pitch']
+
+    for i, n in enumerate(notes):
+        onsets[i] = n.offset
+        durations[i] = n.quarterLength
+        if n.isRest:
+            pitches[i] = REST_PITCH
+        elif n.isChord:
+            pitches[i] = max(p.midi for p in n.pitches)
+        else:
+            pitches[i] = n.pitch.midi
+
+    array['is_rest'] = pitches == REST_PITCH
+    array['beat_strength'] = beat_strengths(onsets, beats_per_bar, beat_length)
+    return array
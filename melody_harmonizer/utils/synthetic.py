@@ -0,0 +1,70 @@
+from typing import Dict, List, Tuple
+import numpy as np
+from .midi_utils import MidiMelody, beat_layout
+from .note_array import NOTE_DTYPE, REST_PITCH, beat_strengths
+
+# Note values (quarter lengths) and their probabilities for each density
+DENSITIES: Dict[str, Tuple[List[float], List[float]]] = {
+    'sparse': ([1.0, 1.5, 2.0, 4.0], [0.4, 0.2, 0.3, 0.1]),
+    'medium': ([0.5, 1.0, 1.5, 2.0], [0.35, 0.4, 0.1, 0.15]),
+    'dense': ([0.25, 0.5, 0.75, 1.0], [0.5, 0.3, 0.1, 0.1]),
+}
+
+# Semitones above the tonic of each scale degree
+SCALES = {
+    'major': (0, 2, 4, 5, 7, 9, 11),
+    'minor': (0, 2, 3, 5, 7, 8, 10),
+}
+
+# Melodic steps in scale degrees and their probabilities (mostly stepwise)
+_STEPS = np.array([-4, -3, -2, -1, 0, 1, 2, 3, 4])
+_STEP_PROBABILITIES = np.array([0.03, 0.07, 0.12, 0.25, 0.06, 0.25, 0.12, 0.07, 0.03])
+
+
+def synthetic_melody(n_notes: int,
+                     density: str = 'medium',
+                     tonic: int = 60,
+                     mode: str = 'major',
+                     rest_probability: float = 0.05,
+                     time_signature: Tuple[int, int] = (4, 4),
+                     seed: int = 0) -> MidiMelody:
+    """
+    Generate a random, tonal, single-line melody.
+
+    The melody is a random walk over the scale (mostly steps, some leaps)
+    kept within two octaves above the tonic's lower octave, with note
+    values drawn from the density's distribution. The same arguments always
+    give the same melody.
+
+    Args:
+        n_notes: Number of events (notes and rests)
+        density: 'sparse', 'medium' or 'dense' (see DENSITIES)
+        tonic: MIDI number of the tonic
+        mode: 'major' or 'minor'
+        rest_probability: Chance of each event being a rest
+        time_signature: (numerator, denominator)
+        seed: Random seed
+
+    Returns:
+        MidiMelody, as read_midi would return it
+    """
+    rng = np.random.default_rng(seed)
+    values, probabilities = DENSITIES[density]
+    scale = np.array(SCALES[mode])
+
+    durations = rng.choice(values, size=n_notes, p=probabilities)
+    steps = rng.choice(_STEPS, size=n_notes, p=_STEP_PROBABILITIES)
+    degrees = np.empty(n_notes, dtype=np.int64)
+    degree = 7  # start on the tonic, one octave up in the walk's range
+    for i, step in enumerate(steps.tolist()):
+        degree = min(max(degree + step, 0), 20)
+        degrees[i] = degree
+    pitches = tonic - 12 + 12 * (degrees // 7) + scale[degrees % 7]
+
+    melody = np.zeros(n_notes, dtype=NOTE_DTYPE)
+    melody['onset'] = np.concatenate(([0.0], np.cumsum(durations)[:-1]))
+    melody['duration'] = durations
+    melody['is_rest'] = rng.random(n_notes) < rest_probability
+    melody['pitch'] = np.where(melody['is_rest'], REST_PITCH, pitches)
+    melody['beat_strength'] = beat_strengths(melody['onset'], *beat_layout(*time_signature))
+    return MidiMelody(melody, time_signature)
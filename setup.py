@@ -0,0 +1,19 @@
+from setuptools import find_namespace_packages, setup
+
+setup(
+    name='melody-harmonizer',
+    version='0.1.0',
+    description='Automatic harmonization of melodies in several styles',
+    packages=find_namespace_packages(include=['melody_harmonizer', 'melody_harmonizer.*']),
+    python_requires='>=3.8',
+    install_requires=[
+        'music21>=9.1.0',
+        'numpy>=1.24.0',
+        'mido>=1.2.10',
+    ],
+    entry_points={
+        'console_scripts': [
+            'melody-harmonizer = melody_harmonizer.cli:main',
+        ],
+    },
+)
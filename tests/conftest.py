@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+# The tests import the package and the benchmarks from the repository root,
+# whatever directory pytest is started from
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from melody_harmonizer.utils.midi_utils import write_midi
+from melody_harmonizer.utils.synthetic import synthetic_melody
+
+
+@pytest.fixture
+def melody_file():
+    """Factory writing a synthetic single-line melody to a MIDI file and returning its path."""
+    def write(path, seed=0, length=32):
+        melody = synthetic_melody(length, seed=seed)
+        write_midi(str(path), melody.note_array, [], melody.time_signature, melody.tempo)
+        return str(path)
+    return write
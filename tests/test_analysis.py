@@ -0,0 +1,140 @@
+import itertools
+
+import numpy as np
+import pytest
+from music21 import note, stream
+
+from melody_harmonizer.core.analysis import MelodyAnalyzer
+from melody_harmonizer.core.chord_selection import ChordSelector
+from melody_harmonizer.core.segmentation import WINDOW_DTYPE, segment_melody
+from melody_harmonizer.utils.synthetic import synthetic_melody
+
+C_MAJOR = [60, 64, 67, 72, 71, 67, 65, 62, 60, 64, 67, 60]
+F_SHARP_MAJOR = [66, 68, 70, 71, 73, 75, 77, 78]
+
+
+def _play(analysis, pitches, start=0):
+    for i, pitch in enumerate(pitches, start):
+        analysis.add_note(pitch, float(i))
+        analysis.finish_note(pitch, float(i), 1.0)
+
+
+def test_incremental_key_and_phrases():
+    analyzer = MelodyAnalyzer()
+    analysis = analyzer.incremental()
+    _play(analysis, C_MAJOR * 2)
+    assert analysis.key == (0, 'major')
+    assert (analysis.note_count, analysis.phrase_count) == (24, 1)
+
+    # a rest of at least phrase_gap starts a new phrase
+    assert analysis.add_note(60, 25.0)
+    assert not analysis.add_note(62, 26.0)
+    assert analysis.phrase_count == 2
+
+
+def test_windowed_incremental_key_follows_a_modulation():
+    analyzer = MelodyAnalyzer()
+    windowed, whole = analyzer.incremental(window=2), analyzer.incremental()
+    for analysis in (windowed, whole):
+        _play(analysis, C_MAJOR * 2 + F_SHARP_MAJOR * 2)
+    assert windowed.key in ((6, 'major'), (3, 'minor'))  # F# major or its relative minor
+    assert whole.key != windowed.key
+
+
+def test_note_array_key_matches_music21():
+    analyzer = MelodyAnalyzer()
+    for seed in range(4):
+        for tonic, mode in ((60, 'major'), (57, 'minor'), (66, 'major')):
+            melody = synthetic_melody(32, tonic=tonic, mode=mode, seed=seed)
+            expected = melody.to_stream().analyze('key')
+            found = analyzer._get_key_from_note_array(melody.note_array)
+            assert found.tonicPitchNameWithCase == expected.tonicPitchNameWithCase
+
+
+def test_chord_selector_returns_the_most_likely_path():
+    selector = ChordSelector([['I', 'IV', 'V', 'I'], ['I', 'vi', 'ii', 'V']])
+    windows = segment_melody(synthetic_melody(24, seed=2).note_array, 2.0)[:5]
+    emissions = selector.sharpness * selector.match(windows, 'C')
+
+    def log_probability(path):
+        score = selector.log_initial[path[0]] + emissions[0, path[0]]
+        for t in range(1, len(path)):
+            score += selector.log_transitions[path[t - 1], path[t]] + emissions[t, path[t]]
+        return score
+
+    best = max(itertools.product(range(len(selector.numerals)), repeat=len(windows)), key=log_probability)
+    assert selector.select(windows, 'C') == [selector.numerals[i] for i in best]
+
+    # a window holding just C, E and G is the tonic
+    triad = np.zeros(1, dtype=WINDOW_DTYPE)
+    triad['weights'][0, [0, 4, 7]] = 1
+    assert selector.select(triad, 'C') == ['I']
+
+
+def _stream(events):
+    """music21 stream of (pitch or None for a rest, quarter length) events."""
+    melody = stream.Stream()
+    for pitch, length in events:
+        melody.append(note.Rest(quarterLength=length) if pitch is None else note.Note(pitch, quarterLength=length))
+    return melody
+
+
+def test_phrases_contour_and_peaks_of_a_known_melody():
+    melody = _stream([(None, 1),                                      # 0
+                      (60, 1), (64, 1), (67, 1), (64, 1),             # 1-4: C E G E
+                      (None, 1),                                      # 5
+                      (62, 0.5), (65, 0.5), (65, 1), (69, 1), (67, 1),  # 6-10: D F F A G
+                      (None, 1), (None, 1),                           # 11-12
+                      (72, 2)])                                       # 13: C
+    analysis = MelodyAnalyzer().analyze_melody(melody)
+
+    assert analysis.phrase_bounds.tolist() == [[1, 5], [6, 11], [13, 14]]
+    assert [d.tolist() for d in analysis.rhythm_patterns] == [[1, 1, 1, 1], [0.5, 0.5, 1, 1, 1], [2]]
+    # across rests, between pitched notes only; repeated notes are 0
+    assert analysis.contour.tolist() == [1, 1, -1, -1, 1, 0, 1, -1, 1]
+    # strictly higher than both pitched neighbours: G4 and A4, not the repeated F4 or the last C5
+    assert analysis.peak_indices.tolist() == [3, 9]
+    assert [n.pitch.midi for n in analysis.peak_notes] == [67, 69]
+
+
+def _reference_views(notes):
+    """Phrases, rhythm patterns, contour and peak notes computed the list-based way, straight from music21 notes."""
+    phrases, current = [], []
+    for n in notes:
+        if isinstance(n, note.Note):
+            current.append(n)
+        elif current:
+            phrases.append(current)
+            current = []
+    if current:
+        phrases.append(current)
+    pitched = [n for n in notes if isinstance(n, note.Note)]
+    contour = [int(np.sign(b.pitch.midi - a.pitch.midi)) for a, b in zip(pitched, pitched[1:])]
+    peaks = [pitched[i] for i in range(1, len(pitched) - 1)
+             if pitched[i - 1].pitch.midi < pitched[i].pitch.midi > pitched[i + 1].pitch.midi]
+    return phrases, [[float(n.quarterLength) for n in phrase] for phrase in phrases], contour, peaks
+
+
+def test_slotted_analysis_views_match_the_notes():
+    melody = synthetic_melody(64, rest_probability=0.15, seed=5)
+    melody_stream = melody.to_stream()
+    analyzer = MelodyAnalyzer()
+    analysis = analyzer.analyze_melody(melody_stream)
+
+    with pytest.raises(AttributeError):
+        analysis.extra = 1
+    assert not hasattr(analysis, '__dict__')
+
+    phrases, rhythms, contour, peaks = _reference_views(list(melody_stream.flatten().notesAndRests))
+    assert len(phrases) > 1
+    assert [[id(n) for n in phrase] for phrase in analysis.phrases] == [[id(n) for n in phrase] for phrase in phrases]
+    assert [d.tolist() for d in analysis.rhythm_patterns] == rhythms
+    assert analysis.contour.tolist() == contour
+    assert [id(n) for n in analysis.peak_notes] == [id(n) for n in peaks]
+
+    # an analysis of the note array alone builds equivalent notes when they are asked for
+    lazy = analyzer.analyze_melody(melody)
+    assert lazy._notes is None
+    assert [[(n.pitch.midi, float(n.quarterLength)) for n in phrase] for phrase in lazy.phrases] == \
+        [[(n.pitch.midi, float(n.quarterLength)) for n in phrase] for phrase in phrases]
+    assert [n.pitch.midi for n in lazy.peak_notes] == [n.pitch.midi for n in peaks]
@@ -0,0 +1,113 @@
+import os
+
+import numpy as np
+import pytest
+
+from melody_harmonizer.core.analysis import MelodyAnalyzer
+from melody_harmonizer.core.analysis_cache import AnalysisCache
+from melody_harmonizer.core.harmonizer import MelodyHarmonizer
+from melody_harmonizer.utils.midi_utils import read_midi
+
+
+def test_hit_and_miss(tmp_path, melody_file):
+    path = melody_file(tmp_path / 'a.mid', seed=1)
+    cache = AnalysisCache(str(tmp_path / 'cache'))
+    cache_key = cache.key_for(path, 'mido')
+    assert cache.get(cache_key) is None
+
+    melody = read_midi(path)
+    analysis = MelodyAnalyzer().analyze_melody(melody)
+    cache.put(cache_key, melody, analysis)
+    cached_melody, cached = cache.get(cache_key)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert np.array_equal(cached_melody.note_array, melody.note_array)
+    assert cached.key == analysis.key
+    assert np.array_equal(cached.phrase_bounds, analysis.phrase_bounds)
+
+    # the key follows the content and the loader, not the name
+    copy = tmp_path / 'copy.mid'
+    copy.write_bytes(open(path, 'rb').read())
+    assert cache.key_for(str(copy), 'mido') == cache_key
+    assert cache.key_for(path, 'music21') != cache_key
+
+
+def test_corrupt_entry_is_a_miss_and_is_replaced(tmp_path, melody_file):
+    path = melody_file(tmp_path / 'a.mid', seed=1)
+    cache = AnalysisCache(str(tmp_path / 'cache'))
+    harmonizer = MelodyHarmonizer(analysis_cache=cache)
+    harmonizer.harmonize_to_midi(path, str(tmp_path / 'out.mid'), loader='mido')
+
+    (entry,) = os.listdir(cache.directory)
+    entry_path = os.path.join(cache.directory, entry)
+    with open(entry_path, 'r+b') as f:
+        f.truncate(os.path.getsize(entry_path) // 2)
+
+    assert cache.get(cache.key_for(path, 'mido')) is None
+    assert not os.path.exists(entry_path)
+    harmonizer.harmonize_to_midi(path, str(tmp_path / 'out.mid'), loader='mido')
+    assert cache.get(cache.key_for(path, 'mido')) is not None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, melody_file):
+    cache = AnalysisCache(str(tmp_path / 'cache'))
+    analyzer = MelodyAnalyzer()
+    keys = []
+    for seed in range(3):
+        path = melody_file(tmp_path / f'{seed}.mid', seed=seed)
+        melody = read_midi(path)
+        keys.append(cache.key_for(path, 'mido'))
+        cache.put(keys[-1], melody, analyzer.analyze_melody(melody))
+        os.utime(cache._path(keys[-1]), (seed, seed))
+
+    cache.get(keys[0])  # now the most recently used
+    sizes = sorted(os.path.getsize(cache._path(cache_key)) for cache_key in keys)
+    cache.max_bytes = sizes[-1] + sizes[-2]
+    cache.evict()
+    assert [os.path.exists(cache._path(cache_key)) for cache_key in keys] == [True, False, True]
+
+
+def test_put_scans_the_directory_only_when_over_budget(tmp_path, melody_file, monkeypatch):
+    cache = AnalysisCache(str(tmp_path / 'cache'))
+    analyzer = MelodyAnalyzer()
+    scans = []
+    entries = cache._entries
+    monkeypatch.setattr(cache, '_entries', lambda: scans.append(1) or entries())
+
+    keys = []
+    for seed in range(4):
+        path = melody_file(tmp_path / f'{seed}.mid', seed=seed)
+        melody = read_midi(path)
+        keys.append(cache.key_for(path, 'mido'))
+        cache.put(keys[-1], melody, analyzer.analyze_melody(melody))
+        os.utime(cache._path(keys[-1]), (seed, seed))
+    assert len(scans) == 1  # the initial size
+    assert cache._total_bytes == sum(os.path.getsize(cache._path(cache_key)) for cache_key in keys)
+
+    # putting an existing key replaces its size rather than adding to it
+    cache.put(keys[-1], melody, analyzer.analyze_melody(melody))
+    os.utime(cache._path(keys[-1]), (3, 3))
+    assert cache._total_bytes == sum(os.path.getsize(cache._path(cache_key)) for cache_key in keys)
+
+    cache.max_bytes = cache._total_bytes - 1
+    path = melody_file(tmp_path / 'new.mid', seed=9)
+    melody = read_midi(path)
+    cache.put(cache.key_for(path, 'mido'), melody, analyzer.analyze_melody(melody))
+    assert len(scans) == 2
+    assert cache._total_bytes <= cache.max_bytes
+    assert not os.path.exists(cache._path(keys[0]))
+
+
+def test_entries_being_written_are_not_entries(tmp_path, melody_file, monkeypatch):
+    cache = AnalysisCache(str(tmp_path / 'cache'))
+    path = melody_file(tmp_path / 'a.mid', seed=1)
+    melody = read_midi(path)
+    analysis = MelodyAnalyzer().analyze_melody(melody)
+
+    def fail(f, **arrays):
+        assert os.listdir(cache.directory) and cache._entries() == []
+        raise OSError('disk full')
+
+    monkeypatch.setattr(np, 'savez', fail)
+    with pytest.raises(OSError):
+        cache.put(cache.key_for(path, 'mido'), melody, analysis)
+    assert os.listdir(cache.directory) == []
@@ -0,0 +1,79 @@
+import mido
+import numpy as np
+from music21 import converter
+
+from melody_harmonizer.core.analysis import MelodyAnalyzer
+from melody_harmonizer.core.harmonizer import MelodyHarmonizer
+from melody_harmonizer.utils.midi_utils import read_arrangement, read_midi, stream_arrangement
+
+TICKS = 480
+
+# (onset, duration, pitch) in quarter lengths
+MELODY = [(0, 1, 72), (1, 1, 76), (2, 2, 79), (4, 1, 77), (5, 1, 81), (6, 2, 79)]
+CHORDS = [(0, 4, p) for p in (48, 52, 55)] + [(4, 4, p) for p in (53, 57, 60)]
+DRUMS = [(beat, 0.5, 36) for beat in range(8)]
+
+
+def _track(name, channel, notes, program=0):
+    events = []
+    for onset, duration, pitch in notes:
+        events.append((int((onset + duration) * TICKS), 0, mido.Message('note_off', channel=channel, note=pitch)))
+        events.append((int(onset * TICKS), 1, mido.Message('note_on', channel=channel, note=pitch, velocity=80)))
+    track = mido.MidiTrack([mido.MetaMessage('track_name', name=name),
+                            mido.Message('program_change', channel=channel, program=program)])
+    tick = 0
+    for at, _, message in sorted(events, key=lambda event: event[:2]):
+        track.append(message.copy(time=at - tick))
+        tick = at
+    return track
+
+
+def _band_file(path):
+    """Accompaniment first, then the melody, then drums."""
+    midi_file = mido.MidiFile(ticks_per_beat=TICKS)
+    midi_file.tracks += [_track('Piano', 1, CHORDS), _track('Lead', 0, MELODY, program=73), _track('Drums', 9, DRUMS)]
+    midi_file.save(str(path))
+    return str(path)
+
+
+def test_parts_are_kept_apart(tmp_path):
+    path = _band_file(tmp_path / 'band.mid')
+    arrangement = read_arrangement(path)
+    assert [(part.name, part.channel, part.program) for part in arrangement.parts] == [('Piano', 1, 0), ('Lead', 0, 73)]
+    assert arrangement.melody_part() == 1
+
+    melody = arrangement.skyline([1]).note_array
+    assert melody['pitch'].tolist() == [pitch for _, _, pitch in MELODY]
+    assert melody['duration'].tolist() == [duration for _, duration, _ in MELODY]
+    chords = arrangement.notes([0])
+    assert sorted(zip(chords['onset'].tolist(), chords['pitch'].tolist())) == sorted((o, p) for o, _, p in CHORDS)
+
+    # the score parts music21 reads are the same parts
+    parsed = stream_arrangement(converter.parse(path))
+    assert [part.name for part in parsed.parts] == ['Piano', 'Lead']
+    assert np.array_equal(parsed.skyline([parsed.melody_part()]).note_array, melody)
+    assert np.array_equal(parsed.notes([0]), chords)
+
+
+def test_analyze_arrangement(tmp_path):
+    path = _band_file(tmp_path / 'band.mid')
+    arrangement = read_arrangement(path)
+    analyzer = MelodyAnalyzer()
+
+    analysis = analyzer.analyze_arrangement(arrangement, 'lead', workers=2)
+    assert analysis.melody_parts == [1]
+    assert analysis.melody.note_array['pitch'].tolist() == [pitch for _, _, pitch in MELODY]
+    assert sorted(analysis.context['pitch'].tolist()) == sorted(p for _, _, p in CHORDS)
+    assert analysis.melody.key.tonic.name == 'C'
+    assert sorted(analysis.parts) == [0, 1]
+
+    # the melody is the highest voice throughout, so the skyline of every part is the melody too
+    skyline = analyzer.analyze_arrangement(arrangement, 'skyline', analyze_parts=False)
+    assert skyline.melody.note_array['pitch'].tolist() == [pitch for _, _, pitch in MELODY]
+    assert read_midi(path).note_array['pitch'].tolist() == [pitch for _, _, pitch in MELODY]
+    assert len(skyline.context) == 0
+
+    for loader in ('mido', 'music21'):
+        score = MelodyHarmonizer().harmonize_arrangement(path, output_path=str(tmp_path / f'{loader}.mid'),
+                                                         loader=loader)
+        assert len(score.parts) == 2
@@ -0,0 +1,59 @@
+import copy
+
+import pytest
+
+from benchmarks.run_benchmarks import STAGES, compare, median_report, run_benchmarks
+from melody_harmonizer.utils.synthetic import synthetic_melody
+
+
+def test_synthetic_melody_is_reproducible():
+    first = synthetic_melody(200, 'dense', seed=3).note_array
+    second = synthetic_melody(200, 'dense', seed=3).note_array
+    assert (first == second).all()
+    assert len(first) == 200
+
+
+def test_report_covers_every_stage():
+    report = run_benchmarks([40], ['medium'], ['pop'], repeat=1)
+    stages = report['cases']['40-medium-pop-medium']
+    assert set(stages) == set(STAGES)
+    assert all(result['seconds'] > 0 and result['peak_kib'] > 0 for result in stages.values())
+
+
+def test_compare_flags_regressions_only_beyond_tolerance():
+    report = run_benchmarks([40], ['sparse'], ['jazz'], repeat=1)
+    assert compare(report, report) == []
+
+    slower = copy.deepcopy(report)
+    slower['cases']['40-sparse-jazz-medium']['voicing']['seconds'] *= 2
+    slower['cases']['40-sparse-jazz-medium']['voicing']['seconds'] += 0.01
+    regressions = compare(slower, report, tolerance=0.25)
+    assert len(regressions) == 1 and 'voicing: seconds' in regressions[0]
+
+
+def _report(seconds, peak_kib, calibration):
+    return {'python': '3', 'calibration_seconds': calibration,
+            'cases': {'case': {'stage': {'seconds': seconds, 'throughput': 100 / seconds,
+                                         'unit': 'notes/s', 'peak_kib': peak_kib}}}}
+
+
+def test_compare_ignores_small_excesses():
+    assert compare(_report(0.004, 1500, 1.0), _report(0.001, 500, 1.0)) == []
+    assert len(compare(_report(0.010, 1500, 1.0), _report(0.001, 500, 1.0))) == 1
+    assert len(compare(_report(0.004, 3000, 1.0), _report(0.001, 500, 1.0))) == 1
+
+
+def test_compare_scales_baseline_times_by_calibration():
+    # twice as slow a machine may take twice as long, but not use more memory
+    assert compare(_report(2.0, 500, 2.0), _report(1.0, 500, 1.0)) == []
+    assert len(compare(_report(2.0, 500, 1.0), _report(1.0, 500, 1.0))) == 1
+    assert len(compare(_report(2.0, 3000, 2.0), _report(1.0, 500, 2.0))) == 2
+
+
+def test_median_report():
+    reports = [_report(seconds, seconds * 1000, seconds / 10) for seconds in (0.3, 0.1, 0.2)]
+    median = median_report(reports)
+    assert median['calibration_seconds'] == pytest.approx(0.02)
+    assert median['cases']['case']['stage']['seconds'] == 0.2
+    assert median['cases']['case']['stage']['peak_kib'] == 200
+    assert median['cases']['case']['stage']['throughput'] == pytest.approx(500)
@@ -0,0 +1,59 @@
+from music21 import chord
+
+from melody_harmonizer.core.voice_leading import lattice_cache, transition_cache
+from melody_harmonizer.core.voicing import VoicingGenerator, voicing_cache
+from melody_harmonizer.utils.cache import LRUCache
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = LRUCache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1  # now b is the oldest
+    cache.put('c', 3)
+    assert len(cache) == 2
+    assert cache.get('b') is None and cache.get('b', 'gone') == 'gone'
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+
+    cache.put('a', 10)  # replacing a value refreshes it
+    cache.put('d', 4)
+    assert cache.get('c') is None and cache.get('a') == 10
+
+    cache.resize(1)
+    assert len(cache) == 1 and cache.get('a') == 10  # the most recently used survives
+
+
+def test_counters_and_get_or_compute():
+    cache = LRUCache(maxsize=8)
+    computed = []
+
+    def compute():
+        computed.append(1)
+        return len(computed)
+
+    assert cache.get_or_compute('x', compute) == 1
+    assert cache.get_or_compute('x', compute) == 1
+    assert cache.get_or_compute('y', lambda: None) is None
+    assert cache.get_or_compute('y', compute) is None  # None is a value, not a miss
+    assert computed == [1]
+    assert cache.info() == {'hits': 2, 'misses': 2, 'size': 2, 'maxsize': 8}
+
+    cache.clear()
+    assert cache.info() == {'hits': 0, 'misses': 0, 'size': 0, 'maxsize': 8}
+
+
+def test_cache_info_reports_the_voicing_caches():
+    for cache in (voicing_cache, lattice_cache, transition_cache):
+        cache.clear()
+    generator = VoicingGenerator()
+    progression = [chord.Chord(names) for names in (['C4', 'E4', 'G4'], ['F4', 'A4', 'C5'], ['G4', 'B4', 'D5'])]
+
+    generator.apply_voicing_midi(progression, 'pop')
+    first = generator.cache_info()
+    assert set(first) == {'voicings', 'lattices', 'transitions'}
+    assert first['voicings']['misses'] == 3 and first['voicings']['size'] == 3
+
+    generator.apply_voicing_midi(progression, 'pop')
+    second = generator.cache_info()
+    assert second['voicings']['hits'] == first['voicings']['hits'] + 3
+    assert second['voicings']['size'] == 3
@@ -0,0 +1,46 @@
+import pytest
+from music21 import key, roman
+
+from melody_harmonizer.utils.chord_tables import ChordTable
+from melody_harmonizer.utils.music_theory import MAJOR_TONICS, MINOR_TONICS
+
+# One numeral per chord quality: major, minor, diminished, augmented triads and
+# dominant, minor, major and half-diminished sevenths
+NUMERALS = ['I', 'ii', 'viio', 'III+', 'V7', 'ii7', 'IM7', 'viiø7']
+
+
+@pytest.mark.parametrize('numeral', NUMERALS)
+@pytest.mark.parametrize('key_name', ['C', 'E-', 'f#', 'b-'])
+def test_entries_match_music21(numeral, key_name):
+    entry = ChordTable().get(numeral, key_name)
+    numeral_obj = roman.RomanNumeral(numeral, key.Key(key_name))
+
+    assert {pc for pc in range(12) if entry.contains(pc)} == set(numeral_obj.pitchClasses)
+    assert entry.mask == sum(1 << pc for pc in set(numeral_obj.pitchClasses))
+    assert entry.midi == tuple(p.midi for p in numeral_obj.pitches)
+    assert entry.root == numeral_obj.root().midi
+    assert [p.nameWithOctave for p in entry.to_chord().pitches] == [p.nameWithOctave for p in numeral_obj.pitches]
+
+
+def test_lookups():
+    table = ChordTable()
+    dominant = table.get('V7', 'C')  # G3 B3 D4 F4
+    assert [pc for pc in range(12) if dominant.contains(pc)] == [2, 5, 7, 11]
+    assert dominant.near(dominant.midi[0]) and dominant.near(dominant.midi[0] - 2)
+    assert not dominant.near(dominant.midi[0] - 3)
+    assert dominant.near(dominant.midi[-1] + 3, semitones=3) and not dominant.near(dominant.midi[-1] + 3)
+
+    # a key object and its name find the same entry, built once
+    assert table.get('V7', key.Key('C')) is dominant and len(table) == 1
+    seventh = table.get('I', 'C').to_chord(add_seventh=True)
+    assert [p.name for p in seventh.pitches] == ['C', 'E', 'G', 'B-']
+
+
+def test_build_resolves_every_key():
+    assert len(set(MAJOR_TONICS + MINOR_TONICS)) == 24
+    table = ChordTable()
+    table.build(['I', 'V7', 'I'])
+    assert len(table) == 2 * 24
+    for key_name in MAJOR_TONICS + MINOR_TONICS:
+        assert table.get('I', key_name).root % 12 == key.Key(key_name).tonic.pitchClass
+    assert len(table) == 2 * 24
@@ -0,0 +1,56 @@
+import json
+import os
+
+import pytest
+
+from melody_harmonizer.cli import MANIFEST_NAME, main, run
+
+
+def _write_melodies(melody_file, directory, count):
+    for i in range(count):
+        subdirectory = directory / f'set{i % 2}'
+        subdirectory.mkdir(exist_ok=True)
+        melody_file(subdirectory / f'm{i}.mid', seed=i, length=24)
+
+
+def test_outputs_mirror_the_input_tree_and_runs_resume(tmp_path, melody_file):
+    melodies, outputs = tmp_path / 'in', tmp_path / 'out'
+    melodies.mkdir()
+    _write_melodies(melody_file, melodies, 4)
+
+    first = run(str(melodies), str(outputs), workers=1)
+    assert (first.harmonized, first.failed, first.skipped) == (4, 0, 0)
+    assert os.path.exists(outputs / 'set1' / 'm3.mid')
+    assert 'voicing' in first.stages
+
+    # a changed input is redone, the others are skipped
+    os.utime(melodies / 'set0' / 'm0.mid', ns=(0, 0))
+    second = run(str(melodies), str(outputs), workers=1)
+    assert (second.harmonized, second.skipped) == (1, 3)
+
+    # other settings start over
+    third = run(str(melodies), str(outputs), style='jazz', workers=1)
+    assert third.harmonized == 4
+
+    with open(outputs / MANIFEST_NAME) as f:
+        assert len(f.readlines()) == 9
+
+
+def test_failures_are_reported_and_retried(tmp_path, capsys, melody_file):
+    melodies, outputs = tmp_path / 'in', tmp_path / 'out'
+    melodies.mkdir()
+    _write_melodies(melody_file, melodies, 1)
+    (melodies / 'broken.mid').write_bytes(b'not a midi file')
+
+    assert main([str(melodies), str(outputs), '--workers', '1']) == 1
+    assert 'FAILED broken.mid' in capsys.readouterr().err
+    assert main([str(melodies), str(outputs), '--workers', '1']) == 1
+    records = [json.loads(line) for line in open(outputs / MANIFEST_NAME)]
+    assert [record['input'] for record in records] == ['broken.mid', 'set0/m0.mid', 'broken.mid']
+
+
+def test_unknown_styles_are_rejected(tmp_path, capsys):
+    with pytest.raises(SystemExit):
+        main([str(tmp_path), str(tmp_path / 'out'), '--style', 'jaz'])
+    assert "invalid choice: 'jaz'" in capsys.readouterr().err
+    assert not (tmp_path / 'out').exists()
@@ -0,0 +1,91 @@
+import io
+import os
+
+import numpy as np
+import pytest
+
+from melody_harmonizer.core.harmonizer import MelodyHarmonizer
+from melody_harmonizer.utils.corpus import CorpusWriter, MelodyCorpus, import_midi_directory
+from melody_harmonizer.utils.midi_utils import read_midi
+from melody_harmonizer.utils.synthetic import synthetic_melody
+
+
+def test_corpus_round_trip(tmp_path):
+    melodies = [synthetic_melody(16 + 8 * i, time_signature=(3, 4) if i == 1 else (4, 4), seed=i) for i in range(3)]
+    with CorpusWriter(str(tmp_path / 'corpus')) as writer:
+        for i, melody in enumerate(melodies):
+            writer.add(f'set/m{i}', melody)
+
+    corpus = MelodyCorpus(str(tmp_path / 'corpus'))
+    assert len(corpus) == 3 and corpus.names == ['set/m0', 'set/m1', 'set/m2']
+    for melody, stored in zip(melodies, corpus):
+        assert np.array_equal(stored.note_array, melody.note_array)
+        assert stored.time_signature == melody.time_signature
+        assert (stored.ticks_per_beat, stored.tempo) == (melody.ticks_per_beat, melody.tempo)
+        assert np.shares_memory(stored.note_array, corpus.notes)  # a slice of the mapping, not a copy
+
+
+def test_imported_corpus_matches_the_files(tmp_path, melody_file):
+    source = tmp_path / 'midi'
+    (source / 'sub').mkdir(parents=True)
+    paths = [melody_file(source / 'a.mid', seed=1), melody_file(source / 'sub' / 'b.mid', seed=2)]
+    (source / 'broken.mid').write_bytes(b'not a midi file')
+
+    report = import_midi_directory(str(source), str(tmp_path / 'corpus'))
+    assert report.imported == 2 and [os.path.basename(path) for path, _ in report.failed] == ['broken.mid']
+    corpus = MelodyCorpus(str(tmp_path / 'corpus'))
+    assert corpus.names == ['a', 'sub/b']
+    for path, stored in zip(paths, corpus):
+        assert np.array_equal(stored.note_array, read_midi(path).note_array)
+
+    results = list(MelodyHarmonizer().harmonize_corpus(corpus, output_dir=str(tmp_path / 'out'), workers=1))
+    assert all(result.ok for result in results)
+    assert os.path.exists(tmp_path / 'out' / 'sub' / 'b.mid')
+
+
+def _midi_bytes(harmonizer, path, style):
+    buffer = io.BytesIO()
+    harmonizer.harmonize_to_midi(path, buffer, style, loader='mido')
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_harmonize_styles_matches_single_style_runs(tmp_path, melody_file, workers):
+    path = melody_file(tmp_path / 'tune.mid', seed=4)
+    harmonizer = MelodyHarmonizer()
+    styles = ['pop', 'jazz', 'nonexistent', 'blues']
+    results = harmonizer.harmonize_styles(path, styles, output_dir=str(tmp_path / 'out'), workers=workers,
+                                          loader='mido')
+
+    assert set(results) == {(style, 'medium') for style in styles}
+    failed = results['nonexistent', 'medium']
+    assert not failed.ok and 'Unknown style' in failed.error
+    for style in ('pop', 'jazz', 'blues'):
+        result = results[style, 'medium']
+        assert result.ok and result.output_path == str(tmp_path / 'out' / f'tune_{style}_medium.mid')
+        with open(result.output_path, 'rb') as f:
+            assert f.read() == _midi_bytes(harmonizer, path, style)
+
+
+def test_harmonize_many_in_a_pool_matches_serial_runs(tmp_path, melody_file):
+    paths = [melody_file(tmp_path / f'tune{i}.mid', seed=i) for i in range(4)]
+    corrupt = tmp_path / 'corrupt.mid'
+    corrupt.write_bytes(b'MThd not really')
+    missing = str(tmp_path / 'missing.mid')
+    melody_paths = paths[:2] + [str(corrupt), missing] + paths[2:]
+
+    harmonizer = MelodyHarmonizer()
+    serial = {result.melody_path: result
+              for result in harmonizer.harmonize_many(melody_paths, output_dir=str(tmp_path / 'serial'),
+                                                      workers=1, loader='mido')}
+    pooled = {result.melody_path: result
+              for result in harmonizer.harmonize_many(melody_paths, output_dir=str(tmp_path / 'pooled'),
+                                                      workers=2, loader='mido')}
+
+    assert set(pooled) == set(serial) == set(melody_paths)
+    for bad in (str(corrupt), missing):
+        assert not pooled[bad].ok and not serial[bad].ok
+    for path in paths:
+        assert pooled[path].ok
+        with open(pooled[path].output_path, 'rb') as f, open(serial[path].output_path, 'rb') as g:
+            assert f.read() == g.read()
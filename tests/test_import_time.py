@@ -0,0 +1,50 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cold-start budget for a batch worker: importing the harmonizer and building
+# one, without touching any music (numpy and mido are still loaded eagerly).
+# Wall-clock checks fail on a loaded machine, so this one only runs on request.
+IMPORT_BUDGET_SECONDS = float(os.environ.get('MELODY_HARMONIZER_IMPORT_BUDGET', 0.75))
+
+# Heavy modules that must not be imported until they are used
+DEFERRED_MODULES = ('music21', 'tkinter')
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+%s
+elapsed = time.perf_counter() - start
+print(json.dumps({'elapsed': elapsed, 'loaded': [m for m in %r if m in sys.modules]}))
+"""
+
+_HARMONIZER = """
+from melody_harmonizer.core.harmonizer import MelodyHarmonizer
+import melody_harmonizer.core.streaming
+MelodyHarmonizer()
+"""
+
+
+def _probe_import(code: str) -> dict:
+    """Run code in a fresh interpreter and report how long it took and which heavy modules it loaded."""
+    output = subprocess.run([sys.executable, '-c', _PROBE % (code, DEFERRED_MODULES)], cwd=REPO_ROOT,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize('code', ['import melody_harmonizer', _HARMONIZER])
+def test_heavy_dependencies_are_not_imported(code):
+    assert _probe_import(code)['loaded'] == []
+
+
+@pytest.mark.skipif(not os.environ.get('MELODY_HARMONIZER_TIMING_TESTS'),
+                    reason='set MELODY_HARMONIZER_TIMING_TESTS=1 to check the import time')
+def test_import_time_within_budget():
+    # best of three, so one slow cold file-system read does not fail the test
+    elapsed = min(_probe_import(_HARMONIZER)['elapsed'] for _ in range(3))
+    assert elapsed < IMPORT_BUDGET_SECONDS, f"import took {elapsed:.3f}s (budget {IMPORT_BUDGET_SECONDS}s)"
@@ -0,0 +1,31 @@
+import io
+
+import mido
+import numpy as np
+
+from melody_harmonizer.utils.midi_utils import HARMONY_CHANNEL, read_arrangement, write_midi
+from melody_harmonizer.utils.synthetic import synthetic_melody
+
+
+def test_written_files_read_back(tmp_path):
+    melody = synthetic_melody(32, seed=5)
+    harmony = [(0.0, 4.0, (48, 55, 64)), (4.0, 2.0, (53, 57, 60)), (6.0, 2.0, (55, 59, 62))]
+    path = str(tmp_path / 'out.mid')
+    write_midi(path, melody.note_array, harmony, (3, 4), tempo=400000)
+
+    # the same bytes go to file objects
+    buffer = io.BytesIO()
+    write_midi(buffer, melody.note_array, harmony, (3, 4), tempo=400000)
+    assert buffer.getvalue() == open(path, 'rb').read()
+
+    arrangement = read_arrangement(path)
+    assert arrangement.time_signature == (3, 4) and arrangement.tempo == 400000
+    pitched = melody.note_array[~melody.note_array['is_rest']]
+    melody_notes = arrangement.notes([0])
+    assert np.array_equal(melody_notes['pitch'], pitched['pitch'])
+    assert np.allclose(melody_notes['onset'], pitched['onset'])
+
+    chords = arrangement.notes([1])
+    assert sorted(chords['pitch'].tolist()) == sorted(p for _, _, voicing in harmony for p in voicing)
+    assert arrangement.parts[1].channel == HARMONY_CHANNEL
+    assert len(mido.MidiFile(path).tracks) == 2
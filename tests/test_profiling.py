@@ -0,0 +1,51 @@
+import gc
+import io
+
+from melody_harmonizer.core.harmonizer import MelodyHarmonizer
+from melody_harmonizer.utils.profiling import PipelineProfiler
+
+STAGES = {'load', 'analyze', 'segment', 'progression', 'generate_harmony', 'voicing', 'score', 'write'}
+
+
+def test_profiler_records_every_pipeline_stage(tmp_path, melody_file):
+    path = melody_file(tmp_path / 'tune.mid', seed=2)
+    harmonizer = MelodyHarmonizer()
+    calls = []
+    profiler = harmonizer.enable_profiling(hooks=[lambda *call: calls.append(call)])
+
+    gc.disable()  # a collection inside a stage could make its net block growth negative
+    try:
+        harmonizer.harmonize(path, loader='mido')
+        harmonizer.harmonize_to_midi(path, io.BytesIO(), loader='mido')
+        harmonizer.harmonize_styles(path, ['pop', 'jazz'], loader='mido')
+    finally:
+        gc.enable()
+
+    report = profiler.report()
+    assert report['runs'] == report['sampled_runs'] == 5  # harmonize_styles: one shared pass, one per style
+    assert set(report['stages']) == STAGES
+    for name, stats in report['stages'].items():
+        assert stats['calls'] >= 1
+        assert 0 <= stats['mean_seconds'] <= stats['max_seconds'] <= stats['total_seconds']
+        assert stats['allocated_blocks'] >= 0
+    assert report['stages']['analyze']['allocated_blocks'] > 0
+
+    # the hooks saw exactly what the report adds up
+    hook_calls = len(calls)
+    assert hook_calls == sum(stats['calls'] for stats in report['stages'].values())
+    for name, stats in report['stages'].items():
+        assert sum(seconds for stage, seconds, _ in calls if stage == name) == stats['total_seconds']
+        assert sum(blocks for stage, _, blocks in calls if stage == name) == stats['allocated_blocks']
+    assert name in profiler.format_report()
+
+    # once profiling is disabled, neither the profiler nor its hooks see any more stages
+    harmonizer.disable_profiling()
+    harmonizer.harmonize(path, loader='mido')
+    assert profiler.report() == report and len(calls) == hook_calls
+
+
+def test_unsampled_runs_record_nothing(tmp_path, melody_file):
+    path = melody_file(tmp_path / 'tune.mid', seed=2)
+    harmonizer = MelodyHarmonizer(profiler=PipelineProfiler(sample_rate=0.0))
+    harmonizer.harmonize_to_midi(path, io.BytesIO(), loader='mido')
+    assert harmonizer.profiler.report() == {'runs': 1, 'sampled_runs': 0, 'stages': {}}
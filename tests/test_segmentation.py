@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+from music21 import meter
+
+from melody_harmonizer.core.segmentation import HARMONIC_RHYTHMS, WINDOW_DTYPE, segment_melody, window_length
+from melody_harmonizer.utils.note_array import NOTE_DTYPE, REST_PITCH
+
+
+def _notes(*rows):
+    """Note array from (onset, duration, pitch, beat strength) rows; pitch None is a rest."""
+    array = np.zeros(len(rows), dtype=NOTE_DTYPE)
+    for record, (onset, duration, pitch, strength) in zip(array, rows):
+        record['onset'], record['duration'], record['beat_strength'] = onset, duration, strength
+        record['pitch'] = REST_PITCH if pitch is None else pitch
+        record['is_rest'] = pitch is None
+    return array
+
+
+@pytest.mark.parametrize('time_sig, lengths', [
+    ('4/4', {'simple': 4.0, 'medium': 2.0, 'complex': 1.0}),
+    ('3/4', {'simple': 3.0, 'medium': 3.0, 'complex': 1.0}),  # odd beat count: no half bars
+    ('6/8', {'simple': 3.0, 'medium': 1.5, 'complex': 1.5}),
+])
+def test_window_length_for_every_harmonic_rhythm(time_sig, lengths):
+    time_sig = meter.TimeSignature(time_sig)
+    assert {complexity: window_length(time_sig, rhythm) for complexity, rhythm in HARMONIC_RHYTHMS.items()} == lengths
+    with pytest.raises(ValueError):
+        window_length(time_sig, 'fortnight')
+
+
+def test_segment_melody_weights_notes_by_duration_and_strength():
+    notes = _notes((0, 1, 60, 1.0),      # C4 on the downbeat
+                   (1, 1, 64, 0.25),     # E4
+                   (2, 0.5, 67, 0.5),    # G4 in the middle of the bar
+                   (2.5, 0.5, None, 0),  # rest
+                   (3, 2, 74, 0.25),     # D5, held over into the third window
+                   (5, 1, 76, 0.25))     # E5
+    windows = segment_melody(notes, 2.0)
+
+    assert windows.dtype == WINDOW_DTYPE
+    assert windows['start'].tolist() == [0, 2, 4]
+    assert windows['duration'].tolist() == [2, 2, 2]
+
+    expected = np.zeros((3, 12))
+    expected[0, 0] = 1 * 2.0     # duration x (1 + beat strength)
+    expected[0, 4] = 1 * 1.25
+    expected[1, 7] = 0.5 * 1.5
+    expected[1, 2] = 1 * 1.25    # D5 counts in both windows it sounds in
+    expected[2, 2] = 1 * 1.25
+    expected[2, 4] = 1 * 1.25
+    assert np.allclose(windows['weights'], expected)
+
+    # heaviest note of each window; D5 and E5 tie in the last one, and the earlier wins
+    assert windows['pitch'].tolist() == [60, 74, 74]
+
+
+def test_segment_melody_silence():
+    assert len(segment_melody(np.zeros(0, dtype=NOTE_DTYPE), 2.0)) == 0
+
+    windows = segment_melody(_notes((0, 3, None, 1.0)), 2.0)
+    assert windows['pitch'].tolist() == [REST_PITCH, REST_PITCH]
+    assert windows['duration'].tolist() == [2, 1]  # the last window stops where the melody does
+    assert not windows['weights'].any()
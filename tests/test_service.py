@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+from melody_harmonizer.core.service import HarmonizationJob, HarmonizationService
+
+
+def test_identical_jobs_in_flight_run_once(tmp_path, melody_file):
+    first = melody_file(tmp_path / 'a.mid', seed=1)
+    copy = tmp_path / 'copy.mid'
+    copy.write_bytes((tmp_path / 'a.mid').read_bytes())
+    other = melody_file(tmp_path / 'b.mid', seed=2)
+
+    async def run():
+        async with HarmonizationService(workers=1, max_pending=1) as service:
+            results = await asyncio.gather(
+                service.submit(HarmonizationJob(first, 'jazz')),
+                service.submit(HarmonizationJob(str(copy), 'jazz')),
+                service.submit(HarmonizationJob(other, 'jazz')),
+            )
+            return results, service.stats()
+
+    (a, a_copy, b), stats = asyncio.run(run())
+    assert a == a_copy and a != b
+    assert a.startswith(b'MThd')
+    assert stats['completed'] == 2 and stats['deduplicated'] == 1
+    assert stats['queue_depth'] == 0 and stats['in_flight'] == 0
+    assert 0 < stats['latency']['p50'] <= stats['latency']['p99']
+
+
+def test_failures_reach_the_caller(tmp_path):
+    bad = tmp_path / 'bad.mid'
+    bad.write_bytes(b'not a midi file')
+
+    async def run():
+        async with HarmonizationService(workers=1) as service:
+            with pytest.raises(Exception):
+                await service.submit(HarmonizationJob(str(bad)))
+            return service.stats()
+
+    assert asyncio.run(run())['failed'] == 1
+
+
+def test_submissions_beyond_the_queue_limit_are_rejected(tmp_path, melody_file):
+    paths = [melody_file(tmp_path / f'{i}.mid', seed=i) for i in range(4)]
+
+    async def run():
+        async with HarmonizationService(workers=1, max_pending=1, max_queued=2) as service:
+            results = await asyncio.gather(*(service.submit(HarmonizationJob(path)) for path in paths),
+                                           return_exceptions=True)
+            return results, service.stats()
+
+    results, stats = asyncio.run(run())
+    # one running, two waiting; the last file to be hashed finds the queue full
+    assert sum(isinstance(result, asyncio.QueueFull) for result in results) == 1
+    assert stats['completed'] == 3 and stats['queue_depth'] == 0
@@ -0,0 +1,100 @@
+import os
+import threading
+import time
+
+import mido
+import pytest
+
+from melody_harmonizer.core.streaming import StreamingHarmonizer
+from melody_harmonizer.utils.midi_utils import HARMONY_CHANNEL, LoopbackPort
+
+# four bars in C major, one note per beat
+MELODY = [60, 64, 67, 64, 65, 69, 72, 69, 67, 71, 74, 71, 72, 67, 64, 60]
+
+# Wall-clock assertions fail on a loaded machine, so they only run on request
+timing = pytest.mark.skipif(not os.environ.get('MELODY_HARMONIZER_TIMING_TESTS'),
+                            reason='set MELODY_HARMONIZER_TIMING_TESTS=1 to check real-time latency')
+
+
+def _melody_messages(beat_seconds=0.5):
+    messages = []
+    for i, pitch in enumerate(MELODY):
+        messages.append(mido.Message('note_on', note=pitch, velocity=80, time=0 if i == 0 else beat_seconds / 2))
+        messages.append(mido.Message('note_off', note=pitch, time=beat_seconds / 2))
+    return messages
+
+
+def _play(harmonizer):
+    """Feed the melody through process(); returns the messages emitted for every input message."""
+    return [(message, harmonizer.process(message)) for message in _melody_messages()]
+
+
+def test_process_emits_chords_under_the_melody():
+    harmonizer = StreamingHarmonizer('pop', tempo=120)
+    sounding = set()
+    chords = 0
+    for message, out in _play(harmonizer):
+        if not out:
+            continue
+        # a chord change releases the previous chord, then plays one containing the new note
+        released = {m.note for m in out if m.type == 'note_off'}
+        played = {m.note for m in out if m.type == 'note_on'}
+        assert released == sounding
+        assert message.note % 12 in {p % 12 for p in played}
+        assert all(m.channel == HARMONY_CHANNEL for m in out)
+        sounding = played
+        chords += 1
+
+    assert chords >= 4  # at least one chord per bar
+    assert harmonizer.analysis.key == (0, 'major')
+    # every note_on is timed
+    assert len(harmonizer.latencies) == len(MELODY)
+    stats = harmonizer.latency_stats()
+    assert 0 <= stats['median'] <= stats['max']
+
+
+def test_over_budget_counts_events_above_the_budget():
+    assert StreamingHarmonizer('pop', latency_budget=float('inf')).latency_stats()['over_budget'] == 0
+
+    harmonizer = StreamingHarmonizer('pop', latency_budget=0.0)
+    _play(harmonizer)
+    assert harmonizer.latency_stats()['over_budget'] == len(MELODY)
+
+    harmonizer = StreamingHarmonizer('pop', latency_budget=float('inf'))
+    _play(harmonizer)
+    assert harmonizer.latency_stats()['over_budget'] == 0
+
+
+@timing
+def test_process_within_latency_budget():
+    harmonizer = StreamingHarmonizer('pop', tempo=120)
+    _play(harmonizer)
+    stats = harmonizer.latency_stats()
+    assert stats['over_budget'] == 0 and stats['max'] < harmonizer.latency_budget
+
+
+def test_run_through_loopback_ports():
+    harmonizer = StreamingHarmonizer('jazz', tempo=600)  # a beat every 0.1s
+    input_port, output_port = LoopbackPort(), LoopbackPort()
+    done = threading.Event()
+
+    def play():
+        for message in _melody_messages(beat_seconds=0.1)[:16]:  # two bars
+            time.sleep(message.time)
+            input_port.send(message.copy(time=0))
+        time.sleep(0.05)
+        done.set()
+
+    player = threading.Thread(target=play)
+    player.start()
+    harmonizer.run(input_port, output_port, should_stop=done.is_set)
+    player.join()
+
+    out = list(output_port.iter_pending())
+    assert all(m.channel == HARMONY_CHANNEL for m in out)
+    chords = [m for m in out if m.type == 'note_on']
+    assert chords and chords[0].note < MELODY[0]
+    # every chord note is released, the last ones by all_notes_off when run stops
+    assert sorted(m.note for m in chords) == sorted(m.note for m in out if m.type == 'note_off')
+    assert out[-1].type == 'note_off'
+    assert len(harmonizer.latencies) == 8  # one per note_on
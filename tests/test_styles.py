@@ -0,0 +1,86 @@
+import json
+from dataclasses import replace
+
+import pytest
+
+from melody_harmonizer.core.streaming import StreamingHarmonizer
+from melody_harmonizer.core.voicing import VoicingGenerator
+from melody_harmonizer.styles import style_pack
+from melody_harmonizer.styles.style_pack import (get_style, load_style_packs, register_style, save_style_packs,
+                                                 style_extensions, style_names, voicing_configs)
+
+
+def test_unknown_styles_are_rejected():
+    assert get_style('jazz').name == 'jazz'
+    with pytest.raises(ValueError, match='registered styles: ' + ', '.join(style_names())):
+        get_style('jaz')
+
+
+def test_extensions_are_chord_degrees():
+    blues = get_style('blues')
+    assert blues.extension_intervals('dominant') == [7, 9]
+    assert blues.to_dict()['extensions'] == {'dominant': [7, 9], 'major': [7], 'minor': [7]}
+
+
+@pytest.fixture
+def registry():
+    """Restore the style registry (and its shared views) after the test."""
+    views = [style_pack._registry, style_pack._voicing_configs, style_pack._style_extensions]
+    style_names()  # load the built-in styles first
+    saved = [dict(view) for view in views]
+    yield
+    for view, contents in zip(views, saved):
+        view.clear()
+        view.update(contents)
+
+
+def test_register_style(registry):
+    jazz = get_style('jazz')
+    custom = replace(jazz, name='custom', major=('I', 'IV'), extensions=())
+    register_style(custom)
+    assert get_style('custom') is custom and 'custom' in style_names()
+    assert VoicingGenerator().config_for('custom') is custom.voicing
+
+    with pytest.raises(ValueError, match="'custom' is already registered"):
+        register_style(replace(custom, major=('I', 'V')), replace_existing=False)
+    assert get_style('custom') is custom
+
+    # replacing a style replaces its views too, dropping extensions it no longer has
+    register_style(replace(custom, extensions=jazz.extensions))
+    assert style_extensions()['custom'] == style_extensions()['jazz']
+    tighter = replace(custom, voicing=replace(custom.voicing, max_spacing=7))
+    register_style(tighter)
+    assert get_style('custom') is tighter and voicing_configs()['custom'].max_spacing == 7
+    assert 'custom' not in style_extensions()
+
+
+def test_style_packs_round_trip_through_json(tmp_path, registry):
+    packs = [replace(get_style(name), name=f'saved-{name}') for name in ('pop', 'blues')]
+    path = str(tmp_path / 'styles.json')
+    save_style_packs(path, packs)
+
+    assert load_style_packs(path, register=False) == packs
+    assert 'saved-pop' not in style_names()
+    load_style_packs(path)
+    assert [get_style(pack.name) for pack in packs] == packs
+
+
+def test_packs_inherit_from_based_on(tmp_path, registry):
+    path = tmp_path / 'styles.json'
+    path.write_text(json.dumps([{'name': 'cool', 'based_on': 'jazz', 'major': ['I7', 'IV7'],
+                                 'voicing': {'preferred_range': [50, 70]}}]))
+    (cool,) = load_style_packs(str(path))
+    jazz = get_style('jazz')
+    assert cool.major == ('I7', 'IV7') and cool.minor == jazz.minor
+    assert cool.extensions == jazz.extensions
+    assert cool.voicing == replace(jazz.voicing, preferred_range=(50, 70))
+
+
+def test_voicing_rejects_unknown_styles():
+    generator = VoicingGenerator()
+    with pytest.raises(ValueError, match='Unknown style'):
+        generator.config_for('jaz')
+    with pytest.raises(ValueError, match='Unknown style'):
+        generator.validate([(48, 52, 55)], style='jaz')
+    with pytest.raises(ValueError, match='Unknown style'):
+        StreamingHarmonizer('jaz')
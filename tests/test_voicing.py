@@ -0,0 +1,131 @@
+import itertools
+
+import pytest
+from music21 import chord, note
+
+from melody_harmonizer.core import voicing
+from melody_harmonizer.core.harmonizer import MelodyHarmonizer
+from melody_harmonizer.core.validation import repair_voicings, validate_voicings, violation_counts, voicing_matrix
+from melody_harmonizer.core.voice_leading import (candidate_voicings, solve_voice_leading, transition_cost,
+                                                 voicing_cost, voicing_lattice)
+from melody_harmonizer.core.voicing import VoicingConfig, VoicingGenerator, chord_to_midi
+from melody_harmonizer.styles.progressions import get_style_progression
+from melody_harmonizer.utils.synthetic import synthetic_melody
+
+
+def test_validator_flags_parallels_crossing_and_spacing():
+    config = VoicingConfig()
+    progression = [(48, 55, 64), (50, 57, 65), None, (60, 58, 80)]
+    report = validate_voicings(voicing_matrix(progression), config)
+    counts = violation_counts(report)
+    assert counts['fifths'] == 1 and counts['crossing'] == 1 and counts['spacing'] == 1
+    fifths = report[report['kind'] == 'fifths'][0]
+    assert (fifths['chord'], fifths['lower'], fifths['upper']) == (1, 0, 1)
+
+
+def test_repair_removes_parallel_fifths():
+    config = VoicingConfig()
+    repaired, remaining = repair_voicings([(48, 55, 64), (50, 57, 65)], config)
+    assert len(remaining) == 0
+    assert repaired[0] == (48, 55, 64)
+    assert {p % 12 for p in repaired[1]} == {2, 5, 9} and repaired[1][0] % 12 == 2
+
+
+def test_voiced_progressions_are_repaired(monkeypatch):
+    solved = []
+    solve = voicing.solve_voice_leading
+    monkeypatch.setattr(voicing, 'solve_voice_leading', lambda *args: solved.append(solve(*args)) or solved[-1])
+
+    harmonizer = MelodyHarmonizer()
+    generator, config = harmonizer.voicing_generator, harmonizer.voicing_generator.style_configs['blues']
+    before = after = 0
+    for seed in range(4):
+        analysis = harmonizer.analyzer.analyze_melody(synthetic_melody(64, seed=seed))
+        harmony = list(harmonizer._generate_harmony(analysis, get_style_progression('blues', analysis.key), 'complex'))
+        voiced = [v for v in generator.apply_voicing_midi(harmony, 'blues') if v is not None]
+        before += len(validate_voicings(voicing_matrix(solved[-1]), config))
+        after += len(generator.validate(voiced, 'blues'))
+        assert after <= before
+    assert after < before
+
+
+def test_full_beam_finds_the_cheapest_voicing_path():
+    config = VoicingConfig(preferred_range=(40, 84), max_spacing=16)
+    chords = [((48, 52, 55), 48), ((53, 57, 60), 53), ((55, 59, 62, 65), 55), ((48, 52, 55), 48)]
+    melody = [72, None, 74, 72]
+    candidates = [candidate_voicings(pitches, root, config, m) for (pitches, root), m in zip(chords, melody)]
+
+    def total(path):
+        return (sum(voicing_cost(v, config, m) for v, m in zip(path, melody))
+                + sum(transition_cost(a, b, config) for a, b in zip(path, path[1:])))
+
+    best = min(total(path) for path in itertools.product(*candidates))
+    full = max(len(c) for c in candidates)
+    assert total(solve_voice_leading(candidates, config, melody, beam_width=full)) == pytest.approx(best)
+    assert total(solve_voice_leading(candidates, config, melody, beam_width=1)) >= best - 1e-9
+
+
+def test_beam_width_must_be_positive():
+    with pytest.raises(ValueError):
+        VoicingConfig(beam_width=0)
+    with pytest.raises(ValueError):
+        solve_voice_leading([[(48, 52, 55)]], VoicingConfig(), beam_width=0)
+
+
+def test_integer_voicing_matches_music21_voicing():
+    generator = VoicingGenerator()
+    chords = [['C4', 'E4', 'G4'], ['D3', 'F3', 'A3'], ['G2', 'B2', 'D3', 'F3'], ['A4', 'C5', 'E5'], ['F#3', 'A#3', 'C#4']]
+    for style, config in generator.style_configs.items():
+        for names in chords:
+            for melody in (None, 'E5', 'B4'):
+                ch = chord.Chord(names)
+                pitches, root, _ = chord_to_midi(ch)
+                chord_type = generator.determine_chord_type(ch)
+                assert generator.determine_chord_type_midi(pitches, root) == chord_type
+
+                extended = generator.add_extensions(chord.Chord(names), chord_type, style)
+                assert (tuple(p.midi for p in extended.pitches)
+                        == generator.add_extensions_midi(pitches, chord_type, style))
+
+                melody_note = note.Note(melody) if melody else None
+                voiced = generator.generate_voicing(chord.Chord(names), config, melody_note)
+                assert (tuple(p.midi for p in voiced.pitches)
+                        == generator.generate_voicing_midi(pitches, root, config, melody_note and melody_note.pitch.midi))
+
+        progression = [chord.Chord(names) for names in chords]
+        voiced = generator.apply_voicing(progression, style)
+        assert [tuple(p.midi for p in ch.pitches) for ch in voiced] == generator.apply_voicing_midi(progression, style)
+
+
+def _enumerate_voicings(pitches, root, config, melody_midi=None):
+    """Every allowed voicing by brute force, in bass-then-upper-octaves order."""
+    low, high = config.preferred_range
+    if melody_midi is not None:
+        high = min(high, melody_midi)
+    root_class = root % 12
+    upper_classes = sorted({p % 12 for p in pitches} - {root_class})
+    bass_options = range(low + (root_class - low) % 12, high + 1, 12)
+    upper_options = [range(low + (pc - low) % 12, high + 1, 12) for pc in upper_classes]
+    voicings = []
+    for bass in bass_options:
+        for upper in itertools.product(*upper_options):
+            voicing = (bass,) + tuple(sorted(upper))
+            if all(config.min_spacing <= b - a <= config.max_spacing for a, b in zip(voicing, voicing[1:])):
+                voicings.append(voicing)
+    return voicings
+
+
+def test_lattice_lookups_match_enumeration():
+    configs = [VoicingConfig(), VoicingConfig(preferred_range=(40, 84), max_spacing=16, min_spacing=1)]
+    shapes = [((48, 52, 55), 48), ((50, 53, 57, 60), 50), ((55, 59, 62, 65, 69), 55), ((54, 58), 54)]
+    for config in configs:
+        for pitches, root in shapes:
+            for melody_midi in (None, 60, 67, 71, 79, 30):
+                expected = _enumerate_voicings(pitches, root, config, melody_midi)
+                assert candidate_voicings(pitches, root, config, melody_midi) == expected
+
+            root_class = root % 12
+            lattice = voicing_lattice(root_class, tuple(sorted({p % 12 for p in pitches} - {root_class})), config)
+            for bass in {v[0] for v in _enumerate_voicings(pitches, root, config)}:
+                expected = [v for v in _enumerate_voicings(pitches, root, config, 72) if v[0] == bass]
+                assert lattice.select(72, bass) == expected